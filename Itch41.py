@@ -60,8 +60,28 @@ class Field(object):
     Stock                    =  "Stock"
     TradingState             =  "TradingState"
 
+lengthPrefix = struct.Struct( '>H' )
+
+priceFields = ( Field.Price,    Field.CrossPrice, \
+                Field.FarPrice, Field.NearPrice,  \
+                Field.CurrentReferencePrice )
+
+
+class UnknownMessagePolicy(Enum):
+    Raise = 'raise'
+    Skip  = 'skip'
+    Count = 'count'
+
+class UnknownMessageTypeError(ValueError):
+    pass
 
 class ItchMessageFactory:
+    # Message class and codec per raw type byte, filled in by buildRegistry at import time
+    messageClasses = [ None ] * 256
+    codecs = [ None ] * 256
+    unknownMessagePolicy = UnknownMessagePolicy.Raise
+    unknownMessageCounts = { }
+
     @staticmethod
     def createFromArgs( messageArgs ):
         messageType = messageArgs[0]
@@ -71,97 +91,212 @@ class ItchMessageFactory:
 
     @staticmethod
     def fromMessageType( messageType ):
-        for subClass in ItchMessage.__subclasses__():
-            if subClass.__name__ == messageType.name:
-                return subClass()
-            for subClass2 in subClass.__subclasses__():
-                if subClass2.__name__ == messageType.name:
-                    return subClass2()
-        return None
+        messageClass = ItchMessageFactory.messageClasses[ ord( messageType.value ) ]
+        if messageClass is None:
+            return None
+        return messageClass()
 
     @staticmethod
     def createFromBytes(rawMessage):
-        raw = chr( rawMessage[2] )
-        msg = MessageType( raw )
-        message = ItchMessageFactory.fromMessageType( msg )
-#        message.MessageType = chr( rawMessage[2] )
+        messageClass = ItchMessageFactory.messageClasses[ rawMessage[2] ]
+        if messageClass is None:
+            return ItchMessageFactory.unknownMessage( rawMessage )
+        message = messageClass()
         message.fromBytes(rawMessage)
         return message
 
-class ItchMessage:
-    def __init__(self):
-        self.specs = [ ]
-        self.specs.append( [ 0, 1, str, Field.MessageType ] )
+    @staticmethod
+    def createView(buffer, offset=0):
+        codec = ItchMessageFactory.codecs[ buffer[offset + 2] ]
+        if codec is None:
+            return ItchMessageFactory.unknownMessage( buffer[offset:offset + 3] )
+        return ItchMessageView( buffer, offset, codec )
 
-    def isPriceField(self, field):
-        if field == Field.Price    or field == Field.CrossPrice or \
-           field == Field.FarPrice or field == Field.NearPrice  or \
-           field == Field.CurrentReferencePrice:
-            return True
-        return False
+    @staticmethod
+    def unknownMessage(rawMessage):
+        typeByte = rawMessage[2]
+        policy = ItchMessageFactory.unknownMessagePolicy
+        if policy == UnknownMessagePolicy.Raise:
+            raise UnknownMessageTypeError("Unknown message type byte: {0:#04x}".format(typeByte))
+        if policy == UnknownMessagePolicy.Count:
+            counts = ItchMessageFactory.unknownMessageCounts
+            counts[typeByte] = counts.get(typeByte, 0) + 1
+        return None
 
-    def fromArgs(self, args):
-        self.messageLength = self.specs[len(self.specs)-1][0] + self.specs[len(self.specs)-1][1]
-        endianStyle = 'big'
+    @staticmethod
+    def setUnknownMessagePolicy(policy):
+        ItchMessageFactory.unknownMessagePolicy = UnknownMessagePolicy(policy)
+        ItchMessageFactory.unknownMessageCounts = { }
+
+    @staticmethod
+    def buildRegistry():
+        registry = [ None ] * 256
+        pending = ItchMessage.__subclasses__()
+        while pending:
+            subClass = pending.pop()
+            pending.extend( subClass.__subclasses__() )
+            if subClass.__name__ in MessageType.__members__:
+                registry[ ord( MessageType[ subClass.__name__ ].value ) ] = subClass
+        return registry
+
+class ItchCodec:
+    """ Precompiled struct layout for one Itch 4.1 message type.
+
+        Built once per message class from its spec table, so a whole message
+        (including the 2 byte length prefix) decodes with a single unpack_from
+        call, and a single field can be read without slicing rawMessage.
+    """
+    intFormats = { 2: 'h', 4: 'i', 8: 'q' }
+
+    def __init__(self, specs, messageType=None):
+        self.specs = sorted( specs, key=lambda spec: spec[0] )
+        self.typeCode = messageType.encode() if messageType else None
+        self.fields = tuple( spec[3] for spec in self.specs )
+        # MessageType is always first and is a class constant, not an attribute
+        self.attrFields = self.fields[1:]
+        self.accessors = { }
+        self.attrConverters = [ ]
+
+        layout = '>h'
+        offset = 0
+        for spec in self.specs:
+            if spec[0] > offset:
+                layout += '{}x'.format( spec[0] - offset )
+            fieldFormat = self.fieldFormat( spec )
+            layout += fieldFormat
+            offset = spec[0] + spec[1]
+            attrConverter = ItchCodec.attrConverter( spec )
+            self.accessors[ spec[3] ] = ( struct.Struct( '>' + fieldFormat ), 2 + spec[0],
+                                          ItchCodec.valueConverter( spec ), attrConverter )
+            if spec[3] != Field.MessageType:
+                self.attrConverters.append( attrConverter )
+        self.messageLength = offset
+        self.struct = struct.Struct( layout )
+
+    @staticmethod
+    def fieldFormat(spec):
+        if spec[2] is int:
+            return ItchCodec.intFormats[ spec[1] ]
+        return '{}s'.format( spec[1] )
+
+    @staticmethod
+    def attrConverter(spec):
+        # Conversions applied when populating attributes in fromBytes
+        if spec[2] is str:
+            if spec[3] == Field.Stock:
+                return lambda val: val.decode().strip()
+            return bytes.decode
+        if spec[3] == Field.Price:
+            return lambda val: val / 10000
+        return None
 
-        self.rawMessage = bytearray()
-        self.rawMessage.extend( self.messageLength.to_bytes(2, byteorder=endianStyle))
-        self.rawMessage.extend( self.MessageType.encode() )
-        counter = 0
+    @staticmethod
+    def valueConverter(spec):
+        # Conversions applied by getValue
+        if spec[2] is str:
+            if spec[1] == 1:
+                return bytes.decode
+            return lambda val: val.decode().strip()
+        if spec[3] in priceFields:
+            return lambda val: val / 10000
+        return None
+
+    def unpack(self, rawMessage, offset=0):
+        return self.struct.unpack_from( rawMessage, offset )
+
+    def getValue(self, rawMessage, fieldName, offset=0):
+        accessor = self.accessors.get( fieldName )
+        if accessor is None:
+            return ""
+        fieldStruct, start, convert, _ = accessor
+        val = fieldStruct.unpack_from( rawMessage, offset + start )[0]
+        if convert is None:
+            return val
+        return convert( val )
+
+    def getAttr(self, rawMessage, fieldName, offset=0):
+        # Same value fromBytes would store in the attribute, or KeyError
+        fieldStruct, start, _, convert = self.accessors[ fieldName ]
+        val = fieldStruct.unpack_from( rawMessage, offset + start )[0]
+        if convert is None:
+            return val
+        return convert( val )
+
+    def encodeValues(self, fields):
+        """ Struct values for a message from a { Field: value } dict, as passed to
+            createFromArgs: float prices are scaled by 10000 and strings padded.
+        """
+        values = [ self.typeCode ]
         for spec in self.specs[1:]:
-            val = args[1][ spec[3] ]
+            val = fields[ spec[3] ]
             if spec[2] is int:
-                self.__setattr__(spec[3], val)
-                if spec[1] == 4:
-                    if type( val ) is float:
-                        val *= 10000
-                        val = int( val )
-                    byteVer = ( val ).to_bytes(4, byteorder=endianStyle)
-                elif spec[1] == 8:
-                    byteVer = ( val ).to_bytes(8, byteorder=endianStyle)
-                self.rawMessage.extend( byteVer )
-            elif spec[2] is str:
+                if type( val ) is float:
+                    val *= 10000
+                    val = int( val )
+            else:
                 if type( val ) is MessageType:
-                    byteVer = str( val.value ).encode()
-                    self.__setattr__(spec[3], val.value)
-                else:
-                    strValue = val
-                    if spec[3] == Field.Stock:
-                        strValue = val + (8 - len( val ) ) * ' '
-                    elif spec[3] == Field.Mpid:
-                        strValue = val + (4 - len( val ) ) * ' '
-                    self.__setattr__(spec[3], val)
-                    byteVer = str( strValue ).encode()
-                self.rawMessage.extend( byteVer )
-            counter += 1
+                    val = val.value
+                val = str( val ).ljust( spec[1] ).encode()
+            values.append( val )
+        return values
+
+    def pack(self, values):
+        return self.struct.pack( self.messageLength, *values )
+
+    def packInto(self, buffer, offset, values):
+        self.struct.pack_into( buffer, offset, self.messageLength, *values )
+
+class ItchMessageMeta(type):
+    """ Gives every message class __slots__ for its spec fields and a codec.
+
+        Spec tables live on the class, so nothing is rebuilt per instance and
+        messages carry no per-instance __dict__.
+    """
+    def __new__(mcs, name, bases, namespace):
+        if '__slots__' not in namespace:
+            inherited = set()
+            for base in bases:
+                for spec in getattr( base, 'specs', [ ] ):
+                    inherited.add( spec[3] )
+            namespace['__slots__'] = tuple( spec[3] for spec in namespace['specs']
+                                            if spec[3] not in inherited )
+        cls = super().__new__( mcs, name, bases, namespace )
+        cls._codec = ItchCodec( cls.specs, namespace.get( 'MessageType' ) )
+        return cls
+
+class ItchMessage(metaclass=ItchMessageMeta):
+    # MessageType is a class constant on each message class rather than a slot
+    __slots__ = ( 'rawMessage', 'messageLength' )
+    specs = [
+        [ 0, 1, str, Field.MessageType ],
+    ]
+
+    def codec(self):
+        return self._codec
+
+    def isPriceField(self, field):
+        return field in priceFields
+
+    def fromArgs(self, args):
+        codec = self.codec()
+        self.messageLength = codec.messageLength
+
+        fields = args[1]
+        for field in codec.attrFields:
+            val = fields[ field ]
+            if type( val ) is MessageType:
+                val = val.value
+            self.__setattr__(field, val)
+        self.rawMessage = bytearray( codec.pack( codec.encodeValues( fields ) ) )
 
     def fromBytes(self, rawBytesWithLen):
         self.rawMessage = rawBytesWithLen
-        messageLength = struct.unpack("!h", self.rawMessage[0:2])[0]
-        #self.MessageType = MessageType.SystemEvent.value
-        for spec in self.specs:
-            rawBytes = self.rawMessage[ 2 + spec[0] : 2 + spec[0] + spec[1] ]
-
-            if spec[2] is int:
-                if spec[1] == 2:
-                    dispVal = struct.unpack("!h", rawBytes)[0]
-                elif spec[1] == 4:
-                    dispVal = struct.unpack("!i", rawBytes)[0]
-                    if spec[3] == Field.Price:
-                        dispVal /= 10000
-                elif spec[1] == 8:
-                    dispVal = struct.unpack("!q", rawBytes)[0]
-                self.__setattr__(spec[3], dispVal)
-            elif spec[2] is str:
-                dispVal = rawBytes.decode()
-                if spec[3] == Field.MessageType:
-                    dispVal = MessageType(dispVal)
-                if spec[3] == Field.MessageType:
-                    self.__setattr__(spec[3], self.MessageType)
-                elif spec[3] == Field.Stock:
-                    self.__setattr__(spec[3], dispVal.strip())
-                else:
-                    self.__setattr__(spec[3], dispVal)
+        codec = self.codec()
+        values = codec.unpack( rawBytesWithLen )
+        for field, convert, val in zip( codec.attrFields, codec.attrConverters, values[2:] ):
+            if convert is not None:
+                val = convert( val )
+            self.__setattr__(field, val)
 
     def dumpRawBytes(self):
         print("--- Dumping raw message bytes ---")
@@ -173,22 +308,18 @@ class ItchMessage:
 
     def dumpPretty(self):
         print("--- Pretty Dump")
-        messageLength = struct.unpack("!h", self.rawMessage[0:2])[0]
+        codec = self.codec()
+        values = codec.unpack( self.rawMessage )
+        messageLength = values[0]
         print("--- Length of message: {}".format(messageLength))
-        for spec in self.specs:
+        for spec, dispVal in zip( codec.specs, values[1:] ):
             rawBytes = self.rawMessage[ 2 + spec[0] : 2 + spec[0] + spec[1] ]
 
             if spec[2] is int:
-                if spec[1] == 2:
-                    dispVal = struct.unpack("!h", rawBytes)[0]
-                elif spec[1] == 4:
-                    dispVal = struct.unpack("!i", rawBytes)[0]
-                    if spec[3] == Field.Price:
-                        dispVal /= 10000
-                elif spec[1] == 8:
-                    dispVal = struct.unpack("!q", rawBytes)[0]
+                if spec[3] == Field.Price:
+                    dispVal /= 10000
             elif spec[2] is str:
-                dispVal = rawBytes.decode()
+                dispVal = dispVal.decode()
                 if spec[3] == Field.MessageType:
                     dispVal = MessageType(dispVal)
             convRawBytes = [ "{0:#0{1}x}".format(x, 4) for x in rawBytes ]
@@ -213,40 +344,58 @@ class ItchMessage:
         fileOut.close()
 
     def getValue(self, fieldName):
-        for spec in self.specs:
-            if spec[3] == fieldName:
-                start = spec[0] + 2
-                len = spec[1]
-                if spec[2] is int:
-                    #print("INT")
-                    if len == 2:
-                        val = struct.unpack("!h", self.rawMessage[start:start+len])[0]
-                    elif len == 4:
-                        val = struct.unpack("!i", self.rawMessage[start:start+len])[0]
-                    elif len == 8:
-                        val = struct.unpack("!q", self.rawMessage[start:start+len])[0]
-                    if self.isPriceField(spec[3]):
-                        val /= 10000
-                elif spec[2] is str:
-                    if len == 1:
-                        val = struct.unpack("!c", self.rawMessage[start:start+len])[0].decode()
-                    else:
-                        val = self.rawMessage[start:start+len].decode().strip()
-                return val
-        return ""
+        return self.codec().getValue( self.rawMessage, fieldName )
+
+class ItchMessageView:
+    """ Lazy, zero-copy view of one length prefixed message inside a shared buffer.
+
+        Fields are read on attribute access using the same Field names and values
+        as the ItchMessage attributes, and nothing is decoded until asked for.
+        The view is only valid while the underlying buffer is; call detach() to
+        keep it longer.
+    """
+    __slots__ = ( 'buffer', 'offset', 'codec' )
+
+    def __init__(self, buffer, offset, codec):
+        self.buffer = buffer
+        self.offset = offset
+        self.codec = codec
+
+    def __getattr__(self, fieldName):
+        try:
+            return self.codec.getAttr( self.buffer, fieldName, self.offset )
+        except KeyError:
+            raise AttributeError( fieldName ) from None
+
+    def __len__(self):
+        return 2 + lengthPrefix.unpack_from( self.buffer, self.offset )[0]
+
+    def getValue(self, fieldName):
+        return self.codec.getValue( self.buffer, fieldName, self.offset )
+
+    def rawBytes(self):
+        return bytes( self.buffer[ self.offset : self.offset + len(self) ] )
+
+    def detach(self):
+        self.buffer = self.rawBytes()
+        self.offset = 0
+        return self
+
+    def toMessage(self):
+        return ItchMessageFactory.createFromBytes( self.rawBytes() )
 
 class TimeStamp(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.TimeStamp.value
-        self.specs.append( [ 1, 4, int, Field.Seconds ] )
+    MessageType = MessageType.TimeStamp.value
+    specs = ItchMessage.specs + [
+        [ 1, 4, int, Field.Seconds ],
+    ]
 
 class SystemEvent(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.SystemEvent.value
-        self.specs.append( [ 1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [ 5, 1, str, Field.EventCode ] )
+    MessageType = MessageType.SystemEvent.value
+    specs = ItchMessage.specs + [
+        [ 1, 4, int, Field.NanoSeconds ],
+        [ 5, 1, str, Field.EventCode ],
+    ]
     # System Event Codes - Daily
     # 'O' - Start of Messages
     # 'S' - Start of System hours
@@ -261,11 +410,10 @@ class SystemEvent(ItchMessage):
     # 'B' - Emergency Market Condition - Resumption
 
 class StockDirectory(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.StockDirectory.value
-        self.specs.append( [  1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [  5, 8, str, Field.Stock] )
+    MessageType = MessageType.StockDirectory.value
+    specs = ItchMessage.specs + [
+        [  1, 4, int, Field.NanoSeconds ],
+        [  5, 8, str, Field.Stock],
         # Market Category
         # 'N' - New York Stock Exchange
         # 'A' - NYSE Amex
@@ -274,7 +422,7 @@ class StockDirectory(ItchMessage):
         # 'G' - NASDAQ Global Global Market
         # 'S' - NASDAQ Global Capital Market
         # 'Z' - BATS BZX Exchange
-        self.specs.append( [ 13, 1, str, Field.MarketCategory] )
+        [ 13, 1, str, Field.MarketCategory],
         # Financial Status Indicator
         # 'D' - Deficient
         # 'E' - Delinquent
@@ -284,180 +432,184 @@ class StockDirectory(ItchMessage):
         # 'H' - Deficient and Delinquent
         # 'J' - Delinquent and Bankrupt
         # 'K' - Deficient, Delinquent and Bankrupt
-        self.specs.append( [ 14, 1, str, Field.FinancialStatus ] )
-        self.specs.append( [ 15, 4, int, Field.RoundLotSize ] )
+        [ 14, 1, str, Field.FinancialStatus ],
+        [ 15, 4, int, Field.RoundLotSize ],
         # 'Y' or 'N'
-        self.specs.append( [ 19, 1, str, Field.RoundLotsOnly ] )
+        [ 19, 1, str, Field.RoundLotsOnly ],
+    ]
 
 class StockTradingAction(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.StockTradingAction.value
-        self.specs.append( [  1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [  5, 8, str, Field.Stock] )
+    MessageType = MessageType.StockTradingAction.value
+    specs = ItchMessage.specs + [
+        [  1, 4, int, Field.NanoSeconds ],
+        [  5, 8, str, Field.Stock],
         # Trading State
         # 'H' - Halted across all US equity markets/SROs
         # 'P' - Paused across all US equity markets/SROs (NASDA-listed securities only)
         # 'Q' - Quotation only period for cross-SRO halt or pause
         # 'T' - Trading on NASDAQ
-        self.specs.append( [ 13, 1, str, Field.TradingState ] )
-        self.specs.append( [ 14, 1, str, Field.Reserved] )
-        self.specs.append( [ 15, 4, str, Field.Reason ] )
+        [ 13, 1, str, Field.TradingState ],
+        [ 14, 1, str, Field.Reserved],
+        [ 15, 4, str, Field.Reason ],
+    ]
 
 class RegSHORestriction(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.RegSHORestriction.value
-        self.specs.append( [  1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [  5, 8, str, Field.Stock] )
+    MessageType = MessageType.RegSHORestriction.value
+    specs = ItchMessage.specs + [
+        [  1, 4, int, Field.NanoSeconds ],
+        [  5, 8, str, Field.Stock],
         # Reg SHO Short Sale Price TEst
         # '0' - No price test in place
         # '1' - Reg SHO Short Sale Price Test Restriction in effect
         # '2' - Reg SHO Short Sale Price Test Restriction remains in effect
-        self.specs.append( [ 13, 1, str, Field.RegSHOAction ] )
- 
+        [ 13, 1, str, Field.RegSHOAction ],
+    ]
+
 class MarketParticipantPosition(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.MarketParticipantPosition.value
-        self.specs.append( [  1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [  5, 4, str, Field.Mpid ] )
-        self.specs.append( [  9, 8, str, Field.Stock ] )
+    MessageType = MessageType.MarketParticipantPosition.value
+    specs = ItchMessage.specs + [
+        [  1, 4, int, Field.NanoSeconds ],
+        [  5, 4, str, Field.Mpid ],
+        [  9, 8, str, Field.Stock ],
         # Primary Market Maker
         # 'Y' - primary market maker
         # 'N' - non-primary market maker
-        self.specs.append( [ 17, 1, str, Field.PrimaryMarketMaker] )      
+        [ 17, 1, str, Field.PrimaryMarketMaker],
         # Market Maker Mode
         # 'N' - normal
         # 'P' - passive
         # 'S' - syndicate
         # 'R' - pre-syndicate
         # 'L' - penalty
-        self.specs.append( [ 18, 1, str, Field.MarketMakerMode] )
+        [ 18, 1, str, Field.MarketMakerMode],
         # Market Participant State
         # 'A' - Active
         # 'E' - Excused/Withdrawn
         # 'S' - Suspended
         # 'D' - Deleted
-        self.specs.append( [ 19, 1, str, Field.MarketParticipantState] )
+        [ 19, 1, str, Field.MarketParticipantState],
+    ]
 
 class AddOrder(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.AddOrder.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, int, Field.OrderRefNum ] )
-        self.specs.append( [  13, 1, str, Field.Side ] )
-        self.specs.append( [  14, 4, int, Field.Shares ] )
-        self.specs.append( [  18, 8, str, Field.Stock ] )
-        self.specs.append( [  26, 4, int, Field.Price ] )
+    MessageType = MessageType.AddOrder.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, int, Field.OrderRefNum ],
+        [  13, 1, str, Field.Side ],
+        [  14, 4, int, Field.Shares ],
+        [  18, 8, str, Field.Stock ],
+        [  26, 4, int, Field.Price ],
+    ]
 
 class AddOrderWithMPID(AddOrder):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.AddOrderWithMPID.value
-        self.specs.append( [  30, 4, str, Field.Mpid ] )
+    MessageType = MessageType.AddOrderWithMPID.value
+    specs = AddOrder.specs + [
+        [  30, 4, str, Field.Mpid ],
+    ]
 
 class OrderExecuted(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.OrderExecuted.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, int, Field.OrderRefNum ] )
-        self.specs.append( [  13, 4, int, Field.Shares ] )
-        self.specs.append( [  17, 8, int, Field.MatchNum ] )
+    MessageType = MessageType.OrderExecuted.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, int, Field.OrderRefNum ],
+        [  13, 4, int, Field.Shares ],
+        [  17, 8, int, Field.MatchNum ],
+    ]
 
 class OrderExecutedWithPrice(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.OrderExecutedWithPrice.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, int, Field.OrderRefNum ] )
-        self.specs.append( [  13, 4, int, Field.Shares ] )
-        self.specs.append( [  17, 8, int, Field.MatchNum ] )
-        self.specs.append( [  25, 1, str, Field.Printable ] )
-        self.specs.append( [  26, 4, int, Field.Price ] )
+    MessageType = MessageType.OrderExecutedWithPrice.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, int, Field.OrderRefNum ],
+        [  13, 4, int, Field.Shares ],
+        [  17, 8, int, Field.MatchNum ],
+        [  25, 1, str, Field.Printable ],
+        [  26, 4, int, Field.Price ],
+    ]
 
 class OrderCancel(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.OrderCancel.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, int, Field.OrderRefNum ] )
-        self.specs.append( [  13, 4, int, Field.Shares ] )
+    MessageType = MessageType.OrderCancel.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, int, Field.OrderRefNum ],
+        [  13, 4, int, Field.Shares ],
+    ]
 
 class OrderDelete(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.OrderDelete.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, int, Field.OrderRefNum ] )
+    MessageType = MessageType.OrderDelete.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, int, Field.OrderRefNum ],
+    ]
 
 class OrderReplace(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.OrderReplace.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, int, Field.OrderRefNum ] )
-        self.specs.append( [  13, 8, int, Field.NewOrderRefNum ] )
-        self.specs.append( [  21, 4, int, Field.Shares ] )
-        self.specs.append( [  25, 4, int, Field.Price ] )
+    MessageType = MessageType.OrderReplace.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, int, Field.OrderRefNum ],
+        [  13, 8, int, Field.NewOrderRefNum ],
+        [  21, 4, int, Field.Shares ],
+        [  25, 4, int, Field.Price ],
+    ]
 
 class TradeNonCross(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.TradeNonCross.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, int, Field.OrderRefNum ] )
-        self.specs.append( [  13, 1, str, Field.Side ] )
-        self.specs.append( [  14, 4, int, Field.Shares ] )
-        self.specs.append( [  18, 8, str, Field.Stock ] )
-        self.specs.append( [  26, 4, int, Field.Price ] )
-        self.specs.append( [  30, 8, int, Field.MatchNum ] )
+    MessageType = MessageType.TradeNonCross.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, int, Field.OrderRefNum ],
+        [  13, 1, str, Field.Side ],
+        [  14, 4, int, Field.Shares ],
+        [  18, 8, str, Field.Stock ],
+        [  26, 4, int, Field.Price ],
+        [  30, 8, int, Field.MatchNum ],
+    ]
 
 class CrossTrade(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.CrossTrade.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, int, Field.Shares ] )
-        self.specs.append( [  13, 8, str, Field.Stock ] )
-        self.specs.append( [  21, 4, int, Field.CrossPrice ] )
-        self.specs.append( [  25, 8, int, Field.MatchNum ] )
+    MessageType = MessageType.CrossTrade.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, int, Field.Shares ],
+        [  13, 8, str, Field.Stock ],
+        [  21, 4, int, Field.CrossPrice ],
+        [  25, 8, int, Field.MatchNum ],
         # Cross Type
         # 'O' - NASDAQ Opening Cross
         # 'C' - NASDAQ Closing Cross
         # 'H' - Cross for IPO and halted/paused securities
         # 'I' - NASDAQ Cross Network: Intraday Cross and Post-Close Cross
-        self.specs.append( [  33, 1, str, Field.CrossType ] )
+        [  33, 1, str, Field.CrossType ],
+    ]
 
 class BrokenTrade(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.BrokenTrade.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, int, Field.MatchNum ] )
+    MessageType = MessageType.BrokenTrade.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, int, Field.MatchNum ],
+    ]
 
 class NetOrderImbalance(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.NetOrderImbalance.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, int, Field.PairedShares ] )
-        self.specs.append( [  13, 8, int, Field.ImbalanceShares ] )
-        self.specs.append( [  21, 1, str, Field.ImbalanceDirection ] )
-        self.specs.append( [  22, 8, str, Field.Stock ] )
-        self.specs.append( [  30, 4, int, Field.FarPrice ] )
-        self.specs.append( [  34, 4, int, Field.NearPrice ] )
-        self.specs.append( [  38, 4, int, Field.CurrentReferencePrice] )
-        self.specs.append( [  42, 1, str, Field.CrossType ] )
-        self.specs.append( [  43, 1, str, Field.PriceVariationIndicator ] )
+    MessageType = MessageType.NetOrderImbalance.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, int, Field.PairedShares ],
+        [  13, 8, int, Field.ImbalanceShares ],
+        [  21, 1, str, Field.ImbalanceDirection ],
+        [  22, 8, str, Field.Stock ],
+        [  30, 4, int, Field.FarPrice ],
+        [  34, 4, int, Field.NearPrice ],
+        [  38, 4, int, Field.CurrentReferencePrice],
+        [  42, 1, str, Field.CrossType ],
+        [  43, 1, str, Field.PriceVariationIndicator ],
+    ]
 
 class RetailInterestMessage(ItchMessage):
-    def __init__(self):
-        super().__init__()
-        self.MessageType = MessageType.RetailInterestMessage.value
-        self.specs.append( [   1, 4, int, Field.NanoSeconds ] )
-        self.specs.append( [   5, 8, str, Field.Stock ] )
-        self.specs.append( [  13, 1, str, Field.InterestFlag ] )
-
+    MessageType = MessageType.RetailInterestMessage.value
+    specs = ItchMessage.specs + [
+        [   1, 4, int, Field.NanoSeconds ],
+        [   5, 8, str, Field.Stock ],
+        [  13, 1, str, Field.InterestFlag ],
+    ]
+
+ItchMessageFactory.messageClasses = ItchMessageFactory.buildRegistry()
+ItchMessageFactory.codecs = [ messageClass._codec if messageClass else None
+                              for messageClass in ItchMessageFactory.messageClasses ]
@@ -634,6 +634,175 @@ class Create_Itch41_Messages_From_RawBytes(unittest.TestCase):
         self.assertEqual(      24.46, message.Price                  )
         self.assertEqual(       1938, message.MatchNum               )
 
+class Itch41_Codec_Test(unittest.TestCase):
+    """ Tests for the precompiled per message type struct codecs """
+
+    def test_codec_is_shared_per_class(self):
+        # GIVEN
+        first = AddOrder()
+        second = AddOrder()
+
+        # WHEN
+        codec = first.codec()
+
+        # THEN
+        self.assertIs(   codec, second.codec() )
+        self.assertIsNot( codec, AddOrderWithMPID().codec() )
+        self.assertEqual(   30, codec.messageLength )
+        self.assertEqual(   32, codec.struct.size )
+
+    def test_messages_are_slotted(self):
+        # GIVEN
+        message = AddOrderWithMPID()
+
+        # THEN
+        self.assertFalse( hasattr( message, '__dict__' ) )
+        self.assertIs(    AddOrderWithMPID.specs, message.specs )
+        self.assertEqual( ( Field.Mpid, ), AddOrderWithMPID.__slots__ )
+        self.assertEqual(  'F', message.MessageType )
+        with self.assertRaises( AttributeError ):
+            message.Unknown = 1
+
+    def test_roundtrip_OrderReplace(self):
+        # GIVEN
+        messageArgs = [ MessageType.OrderReplace, {
+                                Field.NanoSeconds    :      175,
+                                Field.OrderRefNum    :     1006,
+                                Field.NewOrderRefNum :     1007,
+                                Field.Shares         :      500,
+                                Field.Price          : 123.2501
+                             } ]
+
+        # WHEN
+        created = ItchMessageFactory.createFromArgs( messageArgs )
+        message = ItchMessageFactory.createFromBytes( created.rawMessage )
+
+        # THEN
+        self.assertEqual(       'U', message.MessageType )
+        self.assertEqual(      1007, message.NewOrderRefNum )
+        self.assertEqual(  123.2501, message.Price )
+        self.assertEqual(  123.2501, message.getValue( Field.Price ) )
+        self.assertEqual(       500, message.getValue( Field.Shares ) )
+        self.assertEqual(        "", message.getValue( Field.Stock ) )
+
+    def test_getValue_strips_padded_strings(self):
+        # GIVEN
+        messageArgs = [ MessageType.AddOrderWithMPID, {
+                                Field.NanoSeconds : 101,
+                                Field.OrderRefNum : 1001,
+                                Field.Side : 'S',
+                                Field.Shares : 300,
+                                Field.Stock : "IBM",
+                                Field.Price : 10.5,
+                                Field.Mpid : "AB"
+                             } ]
+
+        # WHEN
+        message = ItchMessageFactory.createFromArgs( messageArgs )
+
+        # THEN
+        self.assertEqual(   36, len( message.rawMessage ) )
+        self.assertEqual(  'S', message.getValue( Field.Side ) )
+        self.assertEqual( "IBM", message.getValue( Field.Stock ) )
+        self.assertEqual(  "AB", message.getValue( Field.Mpid ) )
+        self.assertEqual(  10.5, message.getValue( Field.Price ) )
+
+
+class Itch41_Dispatch_Test(unittest.TestCase):
+    """ Tests for the type byte dispatch table in ItchMessageFactory """
+
+    def tearDown(self):
+        ItchMessageFactory.setUnknownMessagePolicy( UnknownMessagePolicy.Raise )
+
+    def test_registry_covers_every_message_type(self):
+        for messageType in MessageType:
+            messageClass = ItchMessageFactory.messageClasses[ ord( messageType.value ) ]
+            self.assertEqual( messageType.name, messageClass.__name__ )
+
+    def test_unknown_type_raises_by_default(self):
+        # GIVEN
+        rawMessage = bytearray( [ 0x00, 0x05, 0x7a, 0x00, 0x00, 0x58, 0xb7 ] )
+
+        # WHEN / THEN
+        with self.assertRaises( UnknownMessageTypeError ):
+            ItchMessageFactory.createFromBytes( rawMessage )
+
+    def test_unknown_type_skip(self):
+        # GIVEN
+        rawMessage = bytearray( [ 0x00, 0x05, 0x7a, 0x00, 0x00, 0x58, 0xb7 ] )
+        ItchMessageFactory.setUnknownMessagePolicy( UnknownMessagePolicy.Skip )
+
+        # WHEN
+        message = ItchMessageFactory.createFromBytes( rawMessage )
+
+        # THEN
+        self.assertIsNone( message )
+        self.assertEqual( { }, ItchMessageFactory.unknownMessageCounts )
+
+    def test_unknown_type_count(self):
+        # GIVEN
+        rawMessage = bytearray( [ 0x00, 0x05, 0x7a, 0x00, 0x00, 0x58, 0xb7 ] )
+        ItchMessageFactory.setUnknownMessagePolicy( 'count' )
+
+        # WHEN
+        ItchMessageFactory.createFromBytes( rawMessage )
+        message = ItchMessageFactory.createFromBytes( rawMessage )
+
+        # THEN
+        self.assertIsNone( message )
+        self.assertEqual( { 0x7a: 2 }, ItchMessageFactory.unknownMessageCounts )
+
+
+class Itch41_MessageView_Test(unittest.TestCase):
+    """ Tests for lazy message views over a shared buffer """
+
+    def setUp(self):
+        self.buffer = bytearray()
+        self.buffer.extend( [ 0x00, 0x05, 0x54, 0x00, 0x00, 0x58, 0xb7 ] )
+        self.buffer.extend( [ 0x00, 0x1e, 0x41, 0x0d, 0xbb, 0xd4, 0x0f, 0x00 ] )
+        self.buffer.extend( [ 0x00, 0x00, 0x00, 0x00, 0x00, 0x16, 0xe7, 0x42 ] )
+        self.buffer.extend( [ 0x00, 0x0f, 0x42, 0x3f, 0x4c, 0x47, 0x4c, 0x2b ] )
+        self.buffer.extend( [ 0x20, 0x20, 0x20, 0x20, 0x00, 0x00, 0x00, 0x01 ] )
+
+    def test_view_fields_match_message(self):
+        # GIVEN
+        buffer = memoryview( self.buffer )
+
+        # WHEN
+        view = ItchMessageFactory.createView( buffer, 7 )
+        message = ItchMessageFactory.createFromBytes( self.buffer[7:] )
+
+        # THEN
+        self.assertEqual(        32, len( view ) )
+        for field in message.codec().fields:
+            self.assertEqual( getattr( message, field ), getattr( view, field ) )
+            self.assertEqual( message.getValue( field ), view.getValue( field ) )
+        self.assertEqual(    0.0001, view.Price )
+        self.assertEqual(    "LGL+", view.Stock )
+
+    def test_view_reads_through_buffer_until_detached(self):
+        # GIVEN
+        view = ItchMessageFactory.createView( memoryview( self.buffer ), 0 )
+        self.assertEqual( 0x58b7, view.Seconds )
+
+        # WHEN
+        self.buffer[6] = 0xb8
+        seen = view.Seconds
+        view.detach()
+        self.buffer[6] = 0xb9
+
+        # THEN
+        self.assertEqual( 0x58b8, seen )
+        self.assertEqual( 0x58b8, view.Seconds )
+        self.assertEqual( 0x58b8, view.toMessage().Seconds )
+
+    def test_view_unknown_field(self):
+        view = ItchMessageFactory.createView( self.buffer, 0 )
+        with self.assertRaises( AttributeError ):
+            view.Stock
+        self.assertEqual( "", view.getValue( Field.Stock ) )
+
+
 
 
 
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+from Itch41 import *
+from ItchGenerator import ItchGenerator
+from ItchOrderBook import OrderBookEngine
+from ItchReader import ItchReader
+
+benchmarkSchemaVersion = 1
+sampleDir = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "SamplesMessages" )
+defaultGeneratedMessages = 200000
+defaultRepeat = 5
+defaultMinTime = 0.2
+
+def machineInfo():
+    return {
+        "hostname"       : socket.gethostname(),
+        "platform"       : platform.platform(),
+        "machine"        : platform.machine(),
+        "processor"      : platform.processor(),
+        "cpuCount"       : os.cpu_count(),
+        "python"         : platform.python_version(),
+        "implementation" : platform.python_implementation(),
+    }
+
+def loadFrames(fileName):
+    with ItchReader( fileName ) as reader:
+        return [ bytes( buffer[ offset : offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0] ] )
+                 for buffer, offset in reader.frames() ]
+
+def framesByType(frames):
+    byType = { }
+    for frame in frames:
+        byType.setdefault( chr( frame[2] ), [ ] ).append( frame )
+    return byType
+
+def messageArgs(message):
+    codec = message.codec()
+    return [ MessageType( message.MessageType ), { field: getattr( message, field ) for field in codec.attrFields } ]
+
+def autorange(func, minTime):
+    """ Number of back to back calls of func needed to take at least minTime. """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range( number ):
+            func()
+        if time.perf_counter() - start >= minTime or number >= 1 << 20:
+            return number
+        number *= 2
+
+def measure(func, repeat=defaultRepeat, minTime=defaultMinTime):
+    """ Seconds per call of func for each of repeat samples. """
+    number = autorange( func, minTime )
+    times = [ ]
+    for _ in range( repeat ):
+        start = time.perf_counter()
+        for _ in range( number ):
+            func()
+        times.append( ( time.perf_counter() - start ) / number )
+    return number, times
+
+class BenchmarkSuite:
+    """ Throughput of the decode, encode and book building hot paths.
+
+        Each benchmark is timed repeat times (after autoranging so that a
+        sample lasts at least minTime) and reported with messages/second and
+        bytes/second at the best sample. Per type benchmarks (createFromBytes,
+        createFromArgs, getValue) run over the messages of that type pooled
+        from an input; file benchmarks (scan, parse, orderBook) run per file.
+        Results are plain dicts, see results() and toJson().
+    """
+
+    def __init__(self, repeat=defaultRepeat, minTime=defaultMinTime, only=None):
+        self.repeat = repeat
+        self.minTime = minTime
+        self.only = set( only ) if only else None
+        self.entries = [ ]
+
+    def wanted(self, name):
+        return self.only is None or name in self.only
+
+    def record(self, name, inputName, messageType, func, messages, size):
+        number, times = measure( func, self.repeat, self.minTime )
+        best = min( times )
+        self.entries.append( {
+            "name"              : name,
+            "input"             : inputName,
+            "messageType"       : messageType,
+            "messages"          : messages,
+            "bytes"             : size,
+            "number"            : number,
+            "times"             : times,
+            "best"              : best,
+            "median"            : statistics.median( times ),
+            "messagesPerSecond" : messages / best if best else None,
+            "bytesPerSecond"    : size / best if best else None,
+        } )
+
+    def runTypes(self, inputName, frames):
+        create = ItchMessageFactory.createFromBytes
+        createFromArgs = ItchMessageFactory.createFromArgs
+        for messageType, typeFrames in sorted( framesByType( frames ).items() ):
+            size = sum( len( frame ) for frame in typeFrames )
+            count = len( typeFrames )
+
+            if self.wanted( "createFromBytes" ):
+                def decode():
+                    for frame in typeFrames:
+                        create( frame )
+                self.record( "createFromBytes", inputName, messageType, decode, count, size )
+
+            messages = [ create( frame ) for frame in typeFrames ]
+            if self.wanted( "createFromArgs" ):
+                argsList = [ messageArgs( message ) for message in messages ]
+                def encode():
+                    for args in argsList:
+                        createFromArgs( args )
+                self.record( "createFromArgs", inputName, messageType, encode, count, size )
+
+            if self.wanted( "getValue" ):
+                fields = messages[0].codec().fields
+                def getValues():
+                    for message in messages:
+                        for field in fields:
+                            message.getValue( field )
+                self.record( "getValue", inputName, messageType, getValues, count, size )
+
+    def runFile(self, inputName, fileName, messages):
+        size = os.path.getsize( fileName )
+
+        if self.wanted( "scan" ):
+            def scan():
+                with ItchReader( fileName ) as reader:
+                    for _ in reader.frames():
+                        pass
+            self.record( "scan", inputName, None, scan, messages, size )
+
+        if self.wanted( "parse" ):
+            def parse():
+                with ItchReader( fileName ) as reader:
+                    for _ in reader.messages():
+                        pass
+            self.record( "parse", inputName, None, parse, messages, size )
+
+        if self.wanted( "orderBook" ):
+            def orderBook():
+                OrderBookEngine().applyFile( fileName )
+            self.record( "orderBook", inputName, None, orderBook, messages, size )
+
+    def runInput(self, inputName, fileName):
+        frames = loadFrames( fileName )
+        self.runTypes( inputName, frames )
+        self.runFile( inputName, fileName, len( frames ) )
+
+    def runSamples(self, directory=sampleDir):
+        for fileName in sorted( glob.glob( os.path.join( directory, "*" ) ) ):
+            self.runInput( os.path.basename( fileName ), fileName )
+
+    def runGenerated(self, messageCount=defaultGeneratedMessages, seed=0):
+        with tempfile.TemporaryDirectory() as tempDir:
+            fileName = os.path.join( tempDir, "generated.itch" )
+            ItchGenerator( seed=seed ).writeFile( fileName, messageCount )
+            self.runInput( "generated-{}-{}".format( seed, messageCount ), fileName )
+
+    def results(self):
+        return {
+            "schema"  : benchmarkSchemaVersion,
+            "created" : datetime.datetime.now( datetime.timezone.utc ).isoformat(),
+            "machine" : machineInfo(),
+            "repeat"  : self.repeat,
+            "minTime" : self.minTime,
+            "results" : self.entries,
+        }
+
+    def toJson(self):
+        return json.dumps( self.results(), indent=2 )
+
+def runBenchmarks(samples=True, messageCount=defaultGeneratedMessages, seed=0, repeat=defaultRepeat,
+                  minTime=defaultMinTime, only=None):
+    suite = BenchmarkSuite( repeat, minTime, only )
+    if samples:
+        suite.runSamples()
+    if messageCount:
+        suite.runGenerated( messageCount, seed )
+    return suite.results()
+
+def resultKey(entry):
+    return "{}/{}/{}".format( entry["name"], entry["input"], entry["messageType"] or "*" )
+
+def printSummary(results, stream=sys.stderr):
+    for entry in results["results"]:
+        print( "{:50s} {:>12,.0f} msg/s {:>8.2f} MB/s".format( resultKey( entry ), entry["messagesPerSecond"] or 0,
+                                                             ( entry["bytesPerSecond"] or 0 ) / 1e6 ), file=stream )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="Benchmark Itch 4.1 decode, encode and book building" )
+    parser.add_argument( "--output", help="write JSON results here instead of stdout" )
+    parser.add_argument( "--messages", type=int, default=defaultGeneratedMessages,
+                         help="size of the generated input, 0 to skip it" )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--no-samples", action="store_true", help="skip the SamplesMessages files" )
+    parser.add_argument( "--repeat", type=int, default=defaultRepeat )
+    parser.add_argument( "--min-time", type=float, default=defaultMinTime )
+    parser.add_argument( "--only", nargs="*", help="benchmark names to run, e.g. createFromBytes parse" )
+    args = parser.parse_args()
+
+    results = runBenchmarks( not args.no_samples, args.messages, args.seed, args.repeat, args.min_time, args.only )
+    printSummary( results )
+    if args.output:
+        with open( args.output, 'w' ) as fileOut:
+            fileOut.write( json.dumps( results, indent=2 ) )
+    else:
+        print( json.dumps( results, indent=2 ) )
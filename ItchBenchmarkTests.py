@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import unittest
+
+from ItchBenchmark import *
+
+class ItchBenchmark_Test(unittest.TestCase):
+    """ Tests for the throughput benchmark suite """
+
+    def test_measure_autoranges(self):
+        # GIVEN
+        calls = [ ]
+
+        # WHEN
+        number, times = measure( lambda: calls.append( 1 ), repeat=3, minTime=0.001 )
+
+        # THEN
+        self.assertEqual( len( times ), 3 )
+        self.assertGreaterEqual( number, 1 )
+        self.assertGreater( len( calls ), 3 * number )
+
+    def test_frames_by_type(self):
+        # GIVEN
+        frames = loadFrames( os.path.join( sampleDir, "Itch.test1.dat" ) )
+
+        # WHEN
+        byType = framesByType( frames )
+
+        # THEN
+        self.assertEqual( len( byType['T'] ), 1 )
+        self.assertEqual( len( byType['A'] ), 3 )
+        self.assertEqual( len( byType['E'] ), 1 )
+
+    def test_message_args_round_trip(self):
+        # GIVEN
+        frame = loadFrames( os.path.join( sampleDir, "Itch.test2.dat" ) )[1]
+        message = ItchMessageFactory.createFromBytes( frame )
+
+        # WHEN
+        encoded = ItchMessageFactory.createFromArgs( messageArgs( message ) )
+
+        # THEN
+        self.assertEqual( bytes( encoded.rawMessage ), frame )
+
+    def test_run_benchmarks(self):
+        # GIVEN
+        only = [ "createFromBytes", "createFromArgs", "getValue", "scan", "parse", "orderBook" ]
+
+        # WHEN
+        results = runBenchmarks( samples=False, messageCount=2000, repeat=1, minTime=0, only=only )
+
+        # THEN
+        results = json.loads( json.dumps( results ) )
+        self.assertEqual( results["schema"], benchmarkSchemaVersion )
+        self.assertIn( "hostname", results["machine"] )
+        keys = set( resultKey( entry ) for entry in results["results"] )
+        self.assertIn( "createFromBytes/generated-0-2000/A", keys )
+        self.assertIn( "createFromArgs/generated-0-2000/A", keys )
+        self.assertIn( "getValue/generated-0-2000/R", keys )
+        for name in [ "scan", "parse", "orderBook" ]:
+            self.assertIn( name + "/generated-0-2000/*", keys )
+        for entry in results["results"]:
+            self.assertGreater( entry["messagesPerSecond"], 0 )
+            self.assertGreater( entry["bytesPerSecond"], 0 )
+            self.assertEqual( entry["best"], min( entry["times"] ) )
+
+    def test_only_filters(self):
+        # GIVEN / WHEN
+        results = runBenchmarks( samples=True, messageCount=0, repeat=1, minTime=0, only=[ "scan" ] )
+
+        # THEN
+        self.assertEqual( set( entry["name"] for entry in results["results"] ), { "scan" } )
+        self.assertEqual( len( results["results"] ), len( os.listdir( sampleDir ) ) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+
+import argparse
+import mmap
+import os
+import time
+
+import numpy as np
+
+from Itch41 import *
+from ItchDma import orderDtype, resultWordDtype, unpackOrderWords
+from ItchFilter import orderRefNumOffsets, addOrderBytes
+from ItchFpgaOrderBook import resultOrder, responseRecord, responsesFileNameFor, FpgaSide
+from ItchIndex import IndexedItchFile
+from ItchReader import ItchReader
+
+# The responses file records as a packed big endian numpy record
+responseDtype = np.dtype( { 'names'    : [ 'sequence', 'count' ],
+                            'formats'  : [ '>u8', '>u4' ],
+                            'offsets'  : [ 0, 8 ],
+                            'itemsize' : responseRecord.size } )
+orderFields = orderDtype.names
+defaultChunkOrders = 1 << 20
+defaultContextMessages = 3
+
+class ResultFile:
+    """ Memory mapped result file of three word Fpga-Orders (see
+        ItchFpgaOrderBook.resultOrder): words is a zero copy resultWordDtype
+        array, three per order.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        with open( fileName, 'rb' ) as fileIn:
+            try:
+                self.mapped = mmap.mmap( fileIn.fileno(), 0, access=mmap.ACCESS_READ )
+            except ValueError:
+                # Empty files cannot be mapped
+                self.mapped = b''
+        if len( self.mapped ) % resultOrder.size:
+            self.close()
+            raise ValueError( "{} is not a whole number of {} byte orders".format( fileName, resultOrder.size ) )
+        self.words = np.frombuffer( self.mapped, dtype=resultWordDtype )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len( self.mapped ) // resultOrder.size
+
+    def close(self):
+        self.words = None
+        if isinstance( self.mapped, mmap.mmap ):
+            self.mapped.close()
+
+    def orders(self, start, end):
+        """ Orders start..end as ( side, orderRefNum, price, shares ) tuples. """
+        end = min( end, len( self ) )
+        if start >= end:
+            return [ ]
+        return unpackOrderWords( self.mapped[ start * resultOrder.size : end * resultOrder.size ] ).tolist()
+
+class Responses:
+    """ The responses file of a result file: which feed message each GetAll
+        answered and how many orders it returned, with where they start.
+    """
+
+    def __init__(self, fileName):
+        records = np.fromfile( fileName, dtype=np.uint8 )
+        if len( records ) % responseDtype.itemsize:
+            raise ValueError( "{} is not a whole number of {} byte responses".format( fileName,
+                                                                                     responseDtype.itemsize ) )
+        records = records.view( responseDtype )
+        self.sequences = records['sequence'].astype( np.int64 )
+        self.counts = records['count'].astype( np.int64 )
+        self.ends = np.cumsum( self.counts )
+        self.starts = self.ends - self.counts
+
+    def __len__(self):
+        return len( self.counts )
+
+    def containing(self, orderNumber):
+        """ Number of the response that order orderNumber belongs to; len() past the last order. """
+        # Empty responses hold no orders, so the first response ending past it
+        return int( np.searchsorted( self.ends, orderNumber, side='right' ) )
+
+def firstMismatch(expected, actual, chunkOrders=defaultChunkOrders):
+    """ Number of the first order that differs between two ResultFiles, or None.
+
+        Chunks are compared as raw bytes; only a chunk that differs is
+        compared word by word to find the order.
+    """
+    size = resultOrder.size
+    common = min( len( expected ), len( actual ) )
+    for start in range( 0, common, chunkOrders ):
+        end = min( start + chunkOrders, common )
+        if expected.mapped[ start * size : end * size ] != actual.mapped[ start * size : end * size ]:
+            differs = ( expected.words[ start * 3 : end * 3 ] != actual.words[ start * 3 : end * 3 ] ).reshape( -1, 3 )
+            return start + int( differs.any( axis=1 ).argmax() )
+    if len( expected ) != len( actual ):
+        return common
+    return None
+
+def firstResponseMismatch(expected, actual):
+    """ Number of the first response whose sequence or count differs between two Responses, or None. """
+    common = min( len( expected ), len( actual ) )
+    differs = ( expected.sequences[ :common ] != actual.sequences[ :common ] ) | \
+              ( expected.counts[ :common ] != actual.counts[ :common ] )
+    if differs.any():
+        return int( differs.argmax() )
+    if len( expected ) != len( actual ):
+        return common
+    return None
+
+def formatOrder(order):
+    if order is None:
+        return "nothing"
+    side, orderRefNum, price, shares = order
+    return "{} OrderRefNum={} Price={} ({:.4f}) Shares={}".format(
+               FpgaSide( side ).name if side in FpgaSide._value2member_map_ else side,
+               orderRefNum, price, price / 10000, shares )
+
+class Divergence:
+    """ The first GetAll response, by feed sequence, on which two result files disagree. """
+
+    def __init__(self, response, sequence, expected, actual, position=None):
+        self.response = response
+        self.sequence = sequence
+        # Order tuples of each side's response, None where the response is missing
+        self.expected = expected
+        self.actual = actual
+        self.position = position
+        if position is None and expected is not None and actual is not None:
+            self.position = next( ( position for position, ( left, right ) in enumerate( zip( expected, actual ) )
+                                    if left != right ), min( len( expected ), len( actual ) ) )
+
+    def expectedOrder(self):
+        if self.expected is None or self.position is None or self.position >= len( self.expected ):
+            return None
+        return self.expected[ self.position ]
+
+    def actualOrder(self):
+        if self.actual is None or self.position is None or self.position >= len( self.actual ):
+            return None
+        return self.actual[ self.position ]
+
+    def orderRefNums(self):
+        return sorted( set( order[1] for order in ( self.expectedOrder(), self.actualOrder() ) if order is not None ) )
+
+    def describe(self, expectedName="expected", actualName="actual"):
+        lines = [ "First divergence at GetAll {}, for feed message {}".format( self.response, self.sequence ) ]
+        if self.expected is None or self.actual is None:
+            missing = expectedName if self.expected is None else actualName
+            lines.append( "  {} has no response for this message".format( missing ) )
+            return "\n".join( lines )
+        lines.append( "  {} orders in {}, {} in {}".format( len( self.expected ), expectedName,
+                                                           len( self.actual ), actualName ) )
+        expectedOrder, actualOrder = self.expectedOrder(), self.actualOrder()
+        lines.append( "  book position {}:".format( self.position ) )
+        lines.append( "    {:10s} {}".format( expectedName, formatOrder( expectedOrder ) ) )
+        lines.append( "    {:10s} {}".format( actualName, formatOrder( actualOrder ) ) )
+        if expectedOrder is not None and actualOrder is not None:
+            fields = [ field for field, left, right in zip( orderFields, expectedOrder, actualOrder ) if left != right ]
+            lines.append( "  differing fields: {}".format( ", ".join( fields ) ) )
+        return "\n".join( lines )
+
+def responseOrders(results, responses, response):
+    """ The orders of one response (fewer if the result file stops inside it),
+        or None if the responses file has no such response or the result
+        file stops before it.
+    """
+    if response >= len( responses ):
+        return None
+    start, end = int( responses.starts[ response ] ), int( responses.ends[ response ] )
+    if start >= len( results ) and end > start:
+        return None
+    return results.orders( start, end )
+
+def compareFiles(expectedFileName, actualFileName, chunkOrders=defaultChunkOrders):
+    """ Divergence for the first response on which the files disagree, or None
+        if they are identical. Returns ( divergence, orders compared ).
+
+        The order words of both files are compared in bulk. Responses are
+        cut out of the undelimited words with the expected file's responses
+        file; if the actual file has its own, the two are compared as well
+        and each side is cut with its own. Without one (as read back from the
+        hardware) the actual words are cut at the expected counts, which
+        are right up to the first differing order.
+    """
+    expectedResponses = Responses( responsesFileNameFor( expectedFileName ) )
+    actualResponsesFileName = responsesFileNameFor( actualFileName )
+    actualResponses = Responses( actualResponsesFileName ) if os.path.exists( actualResponsesFileName ) else None
+    with ResultFile( expectedFileName ) as expected, ResultFile( actualFileName ) as actual:
+        orderNumber = firstMismatch( expected, actual, chunkOrders )
+        response = None if orderNumber is None else expectedResponses.containing( orderNumber )
+        if actualResponses is not None:
+            responseMismatch = firstResponseMismatch( expectedResponses, actualResponses )
+            if responseMismatch is not None and ( response is None or responseMismatch < response ):
+                response, orderNumber = responseMismatch, None
+        elif response is not None and response == len( expectedResponses ) > 0:
+            # Extra orders after the last response: without the hardware's
+            # counts they can only belong to it
+            response -= 1
+        if response is None:
+            return None, len( expected )
+
+        expectedOrders = responseOrders( expected, expectedResponses, response )
+        if actualResponses is not None:
+            actualOrders = responseOrders( actual, actualResponses, response )
+            sequences = actualResponses.sequences
+        else:
+            actualOrders = responseOrders( actual, expectedResponses, response )
+            if actualOrders is not None and response == len( expectedResponses ) - 1:
+                actualOrders = actual.orders( int( expectedResponses.starts[ response ] ), len( actual ) )
+            sequences = expectedResponses.sequences
+        if response < len( expectedResponses ):
+            sequences = expectedResponses.sequences
+            compared = int( expectedResponses.starts[ response ] )
+        else:
+            compared = len( expected )
+        position = None
+        if orderNumber is not None and response < len( expectedResponses ):
+            position = orderNumber - int( expectedResponses.starts[ response ] )
+        divergence = Divergence( response, int( sequences[ response ] ), expectedOrders, actualOrders, position )
+        return divergence, compared
+
+def feedContext(feedFileName, sequence, before=defaultContextMessages):
+    """ Messages before..sequence of the feed, through its sidecar index. """
+    first = max( 0, sequence - before )
+    messages = [ ]
+    with IndexedItchFile( feedFileName ) as indexed:
+        for view in indexed.seekMessage( first ):
+            messages.append( ( first + len( messages ), view.toMessage() ) )
+            if first + len( messages ) > sequence:
+                break
+    return messages
+
+def findAddOrders(feedFileName, orderRefNums, endSequence):
+    """ ( message number, AddOrder ) for each of orderRefNums added before endSequence. """
+    wanted = set( orderRefNum.to_bytes( 8, 'big' ) for orderRefNum in orderRefNums )
+    found = [ ]
+    with ItchReader( feedFileName ) as reader:
+        for number, ( buffer, offset ) in enumerate( reader.frames() ):
+            if number > endSequence or len( found ) == len( wanted ):
+                break
+            typeByte = buffer[ offset + 2 ]
+            if typeByte in addOrderBytes:
+                refOffset = offset + orderRefNumOffsets[ typeByte ]
+                if bytes( buffer[ refOffset : refOffset + 8 ] ) in wanted:
+                    found.append( ( number, ItchMessageFactory.createView( buffer, offset ).toMessage() ) )
+    return found
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="Find the first divergence between two order book result files" )
+    parser.add_argument( "software", help="result file from the software book, with its .responses file" )
+    parser.add_argument( "fpga", help="result words read back from the FPGA" )
+    parser.add_argument( "--feed", help="the Itch file both were driven from, for message context" )
+    parser.add_argument( "--context", type=int, default=defaultContextMessages,
+                         help="feed messages to show before the diverging one" )
+    parser.add_argument( "--chunk-orders", type=int, default=defaultChunkOrders )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    divergence, compared = compareFiles( args.software, args.fpga, args.chunk_orders )
+    elapsed = time.perf_counter() - start
+    if divergence is None:
+        print( "Identical: {} orders in {:.3f} s".format( compared, elapsed ) )
+        raise SystemExit( 0 )
+    print( divergence.describe( "software", "fpga" ) )
+    print( "({} matching orders before it, {:.3f} s)".format( compared, elapsed ) )
+    if args.feed:
+        print( "\nFeed messages up to {}:".format( divergence.sequence ) )
+        for number, message in feedContext( args.feed, divergence.sequence, args.context ):
+            print( "message {}".format( number ) )
+            message.dumpPretty()
+        for number, message in findAddOrders( args.feed, divergence.orderRefNums(), divergence.sequence ):
+            print( "\nAdded by message {}".format( number ) )
+            message.dumpPretty()
+    raise SystemExit( 1 )
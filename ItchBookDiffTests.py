@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from Itch41 import *
+from ItchBookDiff import *
+from ItchDma import packOrderWords, unpackOrderWords
+from ItchFpgaOrderBook import resultWords, responseRecord, responsesFileNameFor, runFile
+from ItchGenerator import ItchGenerator
+
+def sellOrders(sequence, count):
+    return [ ( 0, sequence * 100 + index, 1000000 + index, 100 ) for index in range( count ) ]
+
+class ItchBookDiff_Test(unittest.TestCase):
+    """ Tests for the software / FPGA order book result checker """
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        # GetAll responses for feed messages 10, 20, ... with a growing book, one of them empty
+        self.responses = [ ( 10, [ ] ) ] + [ ( sequence, sellOrders( sequence, sequence // 10 ) )
+                                             for sequence in range( 20, 110, 10 ) ]
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def write(self, name, responses, withResponses=True):
+        fileName = os.path.join( self.tempDir.name, name )
+        with open( fileName, 'wb' ) as fileOut:
+            for sequence, orders in responses:
+                fileOut.write( resultWords( orders ) )
+        if withResponses:
+            with open( responsesFileNameFor( fileName ), 'wb' ) as fileOut:
+                for sequence, orders in responses:
+                    fileOut.write( responseRecord.pack( sequence, len( orders ) ) )
+        return fileName
+
+    def compare(self, actualResponses, chunkOrders=4, withResponses=False):
+        return compareFiles( self.write( "software.results", self.responses ),
+                             self.write( "fpga.results", actualResponses, withResponses ), chunkOrders )
+
+    def test_identical(self):
+        # WHEN
+        divergence, compared = self.compare( self.responses )
+
+        # THEN
+        self.assertIsNone( divergence )
+        self.assertEqual( compared, sum( range( 2, 11 ) ) )
+
+    def test_fieldMismatch(self):
+        # GIVEN one share count off in a later chunk
+        actual = [ ( sequence, list( orders ) ) for sequence, orders in self.responses ]
+        side, orderRefNum, price, shares = actual[7][1][3]
+        actual[7][1][3] = ( side, orderRefNum, price, shares + 1 )
+
+        # WHEN
+        divergence, compared = self.compare( actual )
+
+        # THEN the response, position and field are reported
+        self.assertEqual( divergence.sequence, 80 )
+        self.assertEqual( divergence.position, 3 )
+        self.assertEqual( divergence.response, 7 )
+        self.assertEqual( compared, sum( range( 2, 8 ) ) )
+        self.assertEqual( divergence.orderRefNums(), [ orderRefNum ] )
+        self.assertIn( "differing fields: shares", divergence.describe() )
+
+    def test_missingResponse(self):
+        # GIVEN the FPGA never answered the GetAll for message 40
+        actual = [ response for response in self.responses if response[0] != 40 ]
+
+        # WHEN the words alone are compared
+        divergence, compared = self.compare( actual )
+
+        # THEN the response that was skipped is where the words part
+        self.assertEqual( divergence.sequence, 40 )
+        self.assertEqual( divergence.expected, self.responses[3][1] )
+        self.assertEqual( divergence.actual, self.responses[4][1][ :4 ] )
+        self.assertEqual( divergence.position, 0 )
+
+        # AND with responses files on both sides, they are compared too
+        divergence, compared = self.compare( actual, withResponses=True )
+        self.assertEqual( divergence.response, 3 )
+        self.assertEqual( divergence.sequence, 40 )
+        self.assertEqual( divergence.actual, self.responses[4][1] )
+        self.assertIn( "4 orders in expected, 5 in actual", divergence.describe() )
+
+    def test_emptyResponseMismatch(self):
+        # GIVEN the FPGA answered the first GetAll, on an empty book, with an order
+        actual = [ ( 10, [ ( 1, 99, 5, 5 ) ] ) ] + self.responses[ 1: ]
+
+        # WHEN
+        divergence, compared = self.compare( actual, withResponses=True )
+
+        # THEN
+        self.assertEqual( divergence.sequence, 10 )
+        self.assertEqual( divergence.expected, [ ] )
+        self.assertEqual( divergence.actualOrder(), ( 1, 99, 5, 5 ) )
+
+    def test_extraOrder(self):
+        # GIVEN the FPGA book held an order the software book does not
+        actual = [ ( sequence, list( orders ) ) for sequence, orders in self.responses ]
+        actual[2][1].append( ( 1, 99, 5, 5 ) )
+
+        # WHEN
+        divergence, compared = self.compare( actual )
+
+        # THEN without the hardware's counts it shows where the next response should start
+        self.assertEqual( divergence.sequence, 40 )
+        self.assertEqual( divergence.position, 0 )
+        self.assertEqual( divergence.actualOrder(), ( 1, 99, 5, 5 ) )
+
+        # AND with them the longer response is the difference
+        divergence, compared = self.compare( actual, withResponses=True )
+        self.assertEqual( divergence.sequence, 30 )
+        self.assertEqual( divergence.position, 3 )
+        self.assertIsNone( divergence.expectedOrder() )
+        self.assertEqual( divergence.actualOrder(), ( 1, 99, 5, 5 ) )
+        self.assertIn( "3 orders in expected, 4 in actual", divergence.describe() )
+
+    def test_extraOrdersAtTheEnd(self):
+        # GIVEN an FPGA run that wrote one order too many at the end
+        actual = self.responses[ :-1 ] + [ ( 100, self.responses[-1][1] + [ ( 1, 99, 5, 5 ) ] ) ]
+
+        # WHEN
+        divergence, compared = self.compare( actual )
+
+        # THEN
+        self.assertEqual( divergence.sequence, 100 )
+        self.assertEqual( divergence.position, 10 )
+        self.assertEqual( divergence.actualOrder(), ( 1, 99, 5, 5 ) )
+
+    def test_truncated(self):
+        # GIVEN an FPGA run that stopped early
+        divergence, compared = self.compare( self.responses[ :-1 ] )
+
+        # THEN
+        self.assertEqual( divergence.sequence, 100 )
+        self.assertIsNone( divergence.actual )
+        self.assertIn( "actual has no response", divergence.describe() )
+        self.assertEqual( compared, sum( range( 2, 10 ) ) )
+
+    def test_readsDeserializeLayout(self):
+        # GIVEN words packed as Host-OrderBook-Deserialize-Results.vi reads them
+        orders = self.responses[-1][1]
+        fileName = os.path.join( self.tempDir.name, "words.results" )
+        packOrderWords( orders ).tofile( fileName )
+
+        # WHEN / THEN
+        with ResultFile( fileName ) as results:
+            self.assertEqual( len( results ), len( orders ) )
+            self.assertEqual( results.orders( 0, len( orders ) ), orders )
+            self.assertEqual( results.words.reshape( -1, 3 )[ 1 ].tolist(),
+                              [ orders[1][0], orders[1][1], ( orders[1][2] << 32 ) | orders[1][3] ] )
+
+    def test_badFile(self):
+        fileName = os.path.join( self.tempDir.name, "bad.results" )
+        with open( fileName, 'wb' ) as fileOut:
+            fileOut.write( b'\x00' * 25 )
+        with self.assertRaises( ValueError ):
+            ResultFile( fileName )
+
+    def test_feedContext(self):
+        # GIVEN the model's results for a generated feed, with one price changed
+        feedName = os.path.join( self.tempDir.name, "feed.itch" )
+        softwareName = os.path.join( self.tempDir.name, "software.results" )
+        fpgaName = os.path.join( self.tempDir.name, "fpga.results" )
+        generator = ItchGenerator( seed=9, symbolCount=2 )
+        generator.writeFile( feedName, 2000 )
+        stock = generator.symbols[0].decode().strip()
+        runFile( feedName, stock, softwareName, side='S', getAllEvery=100, depth=4096 )
+        orders = unpackOrderWords( np.fromfile( softwareName, dtype=np.uint8 ) )
+        orders['price'][ len( orders ) // 2 ] += 1
+        packOrderWords( orders ).tofile( fpgaName )
+
+        # WHEN
+        divergence, compared = compareFiles( softwareName, fpgaName )
+        context = feedContext( feedName, divergence.sequence, before=2 )
+        adds = findAddOrders( feedName, divergence.orderRefNums(), divergence.sequence )
+
+        # THEN the feed message that triggered the GetAll ends the context
+        self.assertEqual( [ number for number, message in context ],
+                          [ divergence.sequence - 2, divergence.sequence - 1, divergence.sequence ] )
+        self.assertEqual( context[-1][1].Stock, stock )
+
+        # AND the diverging order's AddOrder is found
+        self.assertEqual( len( adds ), 1 )
+        self.assertEqual( adds[0][1].OrderRefNum, divergence.orderRefNums()[0] )
+        self.assertLess( adds[0][0], divergence.sequence )
+
+if __name__ == '__main__':
+    unittest.main()
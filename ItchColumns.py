@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import array
+import mmap
+
+import numpy as np
+
+from Itch41 import *
+
+gatherChunkSize = 1 << 16
+
+numpyIntFormats = { 2: '>u2', 4: '>u4', 8: '>u8' }
+
+def dtypeFor(messageClass):
+    """ Structured dtype for one message class, derived from its spec table.
+
+        Records include the 2 byte length prefix (as padding), so a record is
+        byte for byte the framed message. Prices stay in their raw fixed point
+        form with 4 implied decimals.
+    """
+    names = [ ]
+    formats = [ ]
+    offsets = [ ]
+    for spec in messageClass._codec.specs:
+        names.append( spec[3] )
+        if spec[2] is int:
+            formats.append( numpyIntFormats[ spec[1] ] )
+        else:
+            formats.append( 'S{}'.format( spec[1] ) )
+        offsets.append( 2 + spec[0] )
+    return np.dtype( { 'names': names, 'formats': formats, 'offsets': offsets,
+                       'itemsize': 2 + messageClass._codec.messageLength } )
+
+dtypes = { messageType: dtypeFor( ItchMessageFactory.messageClasses[ ord( messageType.value ) ] )
+           for messageType in MessageType }
+
+def collectOffsets(buffer, messageTypes=None):
+    """ One pass over the framing, returning message offsets per type byte. """
+    wanted = None
+    if messageTypes is not None:
+        wanted = set( ord( messageType.value ) for messageType in messageTypes )
+    expected = [ codec.messageLength if codec else None for codec in ItchMessageFactory.codecs ]
+    offsets = { }
+    unpackLength = lengthPrefix.unpack_from
+    end = len( buffer )
+    offset = 0
+    while offset + 3 <= end:
+        length = unpackLength( buffer, offset )[0]
+        typeByte = buffer[ offset + 2 ]
+        if wanted is None or typeByte in wanted:
+            if expected[ typeByte ] is None:
+                ItchMessageFactory.unknownMessage( buffer[ offset : offset + 3 ] )
+            elif expected[ typeByte ] != length:
+                raise ValueError( "Message of type {!r} at byte offset {} has length {}, expected {}".format(
+                                  chr( typeByte ), offset, length, expected[ typeByte ] ) )
+            else:
+                typeOffsets = offsets.get( typeByte )
+                if typeOffsets is None:
+                    typeOffsets = offsets[ typeByte ] = array.array( 'q' )
+                typeOffsets.append( offset )
+        offset += 2 + length
+    if offset != end:
+        raise ValueError( "Truncated message at byte offset {}".format( offset ) )
+    return { typeByte: np.frombuffer( typeOffsets, dtype=np.int64 )
+             for typeByte, typeOffsets in offsets.items() }
+
+def gatherRecords(raw, offsets, dtype):
+    records = np.empty( len( offsets ), dtype=dtype )
+    recordBytes = records.view( np.uint8 ).reshape( len( offsets ), dtype.itemsize )
+    columns = np.arange( dtype.itemsize, dtype=np.int64 )
+    for start in range( 0, len( offsets ), gatherChunkSize ):
+        chunk = offsets[ start : start + gatherChunkSize ]
+        recordBytes[ start : start + len( chunk ) ] = raw[ chunk[ :, None ] + columns ]
+    return records
+
+def decodeBuffer(buffer, messageTypes=None):
+    """ Decodes a buffer of framed messages into one structured array per MessageType. """
+    raw = np.frombuffer( buffer, dtype=np.uint8 )
+    columns = { }
+    for typeByte, offsets in collectOffsets( buffer, messageTypes ).items():
+        messageType = MessageType( chr( typeByte ) )
+        columns[ messageType ] = gatherRecords( raw, offsets, dtypes[ messageType ] )
+    return columns
+
+def decodeFile(fileName, messageTypes=None):
+    with open( fileName, 'rb' ) as fileIn:
+        try:
+            mapped = mmap.mmap( fileIn.fileno(), 0, access=mmap.ACCESS_READ )
+        except ValueError:
+            # Empty files cannot be mapped
+            return { }
+        try:
+            return decodeBuffer( mapped, messageTypes )
+        finally:
+            mapped.close()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import os
+import unittest
+
+import numpy as np
+
+from Itch41 import *
+from ItchColumns import *
+
+samplesDir = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "SamplesMessages" )
+
+class ItchColumns_Test(unittest.TestCase):
+    """ Tests for bulk decoding of framed messages into structured arrays """
+
+    def test_dtypes_follow_spec_tables(self):
+        # GIVEN
+        dtype = dtypes[ MessageType.AddOrderWithMPID ]
+
+        # THEN
+        self.assertEqual( 36, dtype.itemsize )
+        self.assertEqual( [ spec[3] for spec in AddOrderWithMPID.specs ], list( dtype.names ) )
+        self.assertEqual( ( np.dtype( '>u8' ), 2 + 5 ), dtype.fields[ Field.OrderRefNum ] )
+        self.assertEqual( ( np.dtype( 'S8' ), 2 + 18 ), dtype.fields[ Field.Stock ] )
+
+    def test_decode_file_matches_messages(self):
+        # WHEN
+        columns = decodeFile( os.path.join( samplesDir, "Itch.test2.dat" ) )
+
+        # THEN
+        self.assertEqual( { MessageType.TimeStamp, MessageType.AddOrder,
+                            MessageType.OrderReplace, MessageType.OrderExecuted }, set( columns ) )
+        addOrders = columns[ MessageType.AddOrder ]
+        self.assertEqual( [ 10, 20, 30 ], addOrders[ Field.OrderRefNum ].tolist() )
+        self.assertEqual( [ 225, 325, 425 ], addOrders[ Field.Shares ].tolist() )
+        self.assertEqual( [ b"AAPL    " ] * 3, addOrders[ Field.Stock ].tolist() )
+        self.assertEqual( 1005200, columns[ MessageType.OrderReplace ][ Field.Price ][0] )
+        self.assertEqual(    2000, columns[ MessageType.TimeStamp ][ Field.Seconds ][0] )
+
+    def test_decode_selected_types(self):
+        # GIVEN
+        with open( os.path.join( samplesDir, "T.5.itch" ), 'rb' ) as fileIn:
+            data = fileIn.read()
+
+        # WHEN
+        columns = decodeBuffer( data, [ MessageType.MarketParticipantPosition ] )
+
+        # THEN
+        self.assertEqual( [ MessageType.MarketParticipantPosition ], list( columns ) )
+        positions = columns[ MessageType.MarketParticipantPosition ]
+        self.assertEqual( b"ATDF", positions[ Field.Mpid ][0] )
+        self.assertEqual( b"AAPL    ", positions[ Field.Stock ][0] )
+
+    def test_wrong_length_raises(self):
+        # GIVEN
+        data = bytes( [ 0x00, 0x04, 0x54, 0x00, 0x00, 0x58 ] )
+
+        # WHEN / THEN
+        with self.assertRaises( ValueError ):
+            decodeBuffer( data )
+
+if __name__ == "__main__":
+    unittest.main()
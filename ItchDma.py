@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+import argparse
+import mmap
+import time
+
+import numpy as np
+
+from Itch41 import *
+
+# Host <-> FPGA DMA framing for the test harnesses.
+#
+# Words are big endian: the first stream byte is the most significant byte
+# of its word, which is the order Fpga-Get-Integer8/32/64.vi shift bytes in.
+# A frame is what the host hands to one FIFO write, at most frameWords
+# words, as a numpy array of the word dtype.
+wordDtypes = { 8: np.dtype( '>u1' ), 32: np.dtype( '>u4' ), 64: np.dtype( '>u8' ) }
+defaultWordBits = 8
+defaultFrameWords = 4096
+
+# TH-TEST_OUT is a U64 FIFO. Fpga-ItchParser-TestHarness.vi writes each
+# OrderBookCommand as four words: Operation, Side, OrderRefNum, and Price
+# joined above Shares. Order book results are three words per Fpga-Order,
+# as Tests/OrderBook/Host-OrderBook-Deserialize-Results.vi reads them:
+# Side, OrderRefNum, then Price in the high half above Shares.
+commandDtype = np.dtype( [ ( 'operation', np.uint16 ), ( 'side', np.uint16 ), ( 'orderRefNum', np.uint64 ),
+                           ( 'price', np.uint32 ), ( 'shares', np.uint32 ) ] )
+orderDtype = np.dtype( [ ( 'side', np.uint16 ), ( 'orderRefNum', np.uint64 ),
+                         ( 'price', np.uint32 ), ( 'shares', np.uint32 ) ] )
+resultWordDtype = wordDtypes[ 64 ]
+
+def wordDtype(wordBits):
+    try:
+        return wordDtypes[ wordBits ]
+    except KeyError:
+        raise ValueError( "Unsupported DMA word size: {} bits".format( wordBits ) ) from None
+
+def messageRuns(buffer, frameBytes):
+    """ ( start, end ) byte ranges of whole messages, each at most frameBytes long. """
+    unpackLength = lengthPrefix.unpack_from
+    size = len( buffer )
+    start = offset = 0
+    while offset + 2 <= size:
+        nextOffset = offset + 2 + unpackLength( buffer, offset )[0]
+        if nextOffset > size:
+            break
+        if nextOffset - start > frameBytes:
+            if offset == start:
+                raise ValueError( "Message at byte offset {} does not fit in a {} byte frame".format(
+                                  offset, frameBytes ) )
+            yield start, offset
+            start = offset
+        offset = nextOffset
+    if offset != size:
+        raise ValueError( "Truncated message at byte offset {}".format( offset ) )
+    if offset > start:
+        yield start, offset
+
+def messagesEnd(buffer, offset, end):
+    """ Offset just past the last whole message in buffer[offset:end] before
+        a zero length prefix (padding) or the end.
+    """
+    unpackLength = lengthPrefix.unpack_from
+    while offset + 2 <= end:
+        length = unpackLength( buffer, offset )[0]
+        if length == 0 or offset + 2 + length > end:
+            break
+        offset += 2 + length
+    return offset
+
+def packFrames(buffer, wordBits=defaultWordBits, frameWords=defaultFrameWords, alignMessages=False):
+    """ Splits a buffer of length prefixed messages into DMA frames.
+
+        By default the stream is cut every frameWords words, so a message may
+        straddle two frames as it would in the FIFO. Every frame is then a
+        view into buffer, except the last when it has to be zero padded to a
+        whole word.
+
+        With alignMessages each frame holds whole messages only and is zero
+        padded to exactly frameWords words, so frames can be handled on
+        their own and a file of them can be split again. These frames are
+        copies. A message longer than a frame raises ValueError.
+
+        Padding is zero bytes. No Itch message has length zero, so a zero
+        length prefix where a message would start marks padding.
+    """
+    dtype = wordDtype( wordBits )
+    frameBytes = frameWords * dtype.itemsize
+    raw = np.frombuffer( buffer, dtype=np.uint8 )
+    if alignMessages:
+        for start, end in messageRuns( buffer, frameBytes ):
+            frame = np.zeros( frameWords, dtype=dtype )
+            frame.view( np.uint8 )[ : end - start ] = raw[ start : end ]
+            yield frame
+        return
+    for start in range( 0, len( raw ), frameBytes ):
+        chunk = raw[ start : start + frameBytes ]
+        if len( chunk ) % dtype.itemsize:
+            frame = np.zeros( -( -len( chunk ) // dtype.itemsize ), dtype=dtype )
+            frame.view( np.uint8 )[ : len( chunk ) ] = chunk
+            yield frame
+        else:
+            yield chunk.view( dtype )
+
+def unpackFrames(frames, alignMessages=False):
+    """ The length prefixed message stream carried by frames from packFrames(),
+        with the padding removed, as bytes.
+    """
+    if alignMessages:
+        stream = bytearray()
+        for frame in frames:
+            frameBytes = memoryview( frame ).cast( 'B' )
+            end = messagesEnd( frameBytes, 0, len( frameBytes ) )
+            if any( frameBytes[ end: ] ):
+                raise ValueError( "Message at byte offset {} does not fit its frame".format( len( stream ) + end ) )
+            stream += frameBytes[ :end ]
+        return bytes( stream )
+    stream = b''.join( memoryview( frame ).cast( 'B' ) for frame in frames )
+    end = messagesEnd( stream, 0, len( stream ) )
+    if any( stream[ end: ] ):
+        raise ValueError( "Truncated message at byte offset {}".format( end ) )
+    return stream[ :end ]
+
+def unpackCommandWords(words):
+    """ Structured commandDtype records from TH-TEST_OUT words of the parser harness. """
+    words = np.frombuffer( words, dtype=resultWordDtype ).reshape( -1, 4 )
+    commands = np.empty( len( words ), dtype=commandDtype )
+    commands['operation'] = words[ :, 0 ]
+    commands['side'] = words[ :, 1 ]
+    commands['orderRefNum'] = words[ :, 2 ]
+    commands['price'] = words[ :, 3 ] >> 32
+    commands['shares'] = words[ :, 3 ] & 0xFFFFFFFF
+    return commands
+
+def packCommandWords(commands):
+    """ TH-TEST_OUT words for commandDtype records (or tuples), as the harness writes them. """
+    commands = np.asarray( commands, dtype=commandDtype ) if not isinstance( commands, np.ndarray ) else commands
+    words = np.empty( ( len( commands ), 4 ), dtype=resultWordDtype )
+    words[ :, 0 ] = commands['operation']
+    words[ :, 1 ] = commands['side']
+    words[ :, 2 ] = commands['orderRefNum']
+    words[ :, 3 ] = ( commands['price'].astype( np.uint64 ) << 32 ) | commands['shares']
+    return words.reshape( -1 )
+
+def unpackOrderWords(words):
+    """ Structured orderDtype records from three word Fpga-Order results. """
+    words = np.frombuffer( words, dtype=resultWordDtype ).reshape( -1, 3 )
+    orders = np.empty( len( words ), dtype=orderDtype )
+    orders['side'] = words[ :, 0 ]
+    orders['orderRefNum'] = words[ :, 1 ]
+    orders['price'] = words[ :, 2 ] >> 32
+    orders['shares'] = words[ :, 2 ] & 0xFFFFFFFF
+    return orders
+
+def packOrderWords(orders):
+    """ Three words per Fpga-Order ( side, orderRefNum, price, shares ). """
+    orders = np.asarray( orders, dtype=orderDtype ) if not isinstance( orders, np.ndarray ) else orders
+    words = np.empty( ( len( orders ), 3 ), dtype=resultWordDtype )
+    words[ :, 0 ] = orders['side']
+    words[ :, 1 ] = orders['orderRefNum']
+    words[ :, 2 ] = ( orders['price'].astype( np.uint64 ) << 32 ) | orders['shares']
+    return words.reshape( -1 )
+
+def mapFile(fileName):
+    with open( fileName, 'rb' ) as fileIn:
+        try:
+            return mmap.mmap( fileIn.fileno(), 0, access=mmap.ACCESS_READ )
+        except ValueError:
+            # Empty files cannot be mapped
+            return None
+
+def packFile(fileName, outputName, wordBits=defaultWordBits, frameWords=defaultFrameWords, alignMessages=False):
+    """ Writes fileName as DMA frames to outputName; returns ( frames, bytes written ). """
+    mapped = mapFile( fileName )
+    frameCount = byteCount = 0
+    with open( outputName, 'wb' ) as fileOut:
+        if mapped is None:
+            return 0, 0
+        try:
+            for frame in packFrames( mapped, wordBits, frameWords, alignMessages ):
+                fileOut.write( frame )
+                frameCount += 1
+                byteCount += frame.nbytes
+                del frame
+        finally:
+            mapped.close()
+    return frameCount, byteCount
+
+def unpackFile(fileName, outputName, wordBits=defaultWordBits, frameWords=defaultFrameWords, alignMessages=False):
+    """ Inverse of packFile(); returns the number of message bytes written. """
+    mapped = mapFile( fileName )
+    if mapped is None:
+        open( outputName, 'wb' ).close()
+        return 0
+    try:
+        frameBytes = frameWords * wordDtype( wordBits ).itemsize
+        if len( mapped ) % wordDtype( wordBits ).itemsize:
+            raise ValueError( "{} is not a whole number of {} bit words".format( fileName, wordBits ) )
+        buffer = memoryview( mapped )
+        frames = [ buffer[ start : start + frameBytes ] for start in range( 0, len( buffer ), frameBytes ) ]
+        stream = unpackFrames( frames, alignMessages )
+        del frames, buffer
+    finally:
+        mapped.close()
+    with open( outputName, 'wb' ) as fileOut:
+        fileOut.write( stream )
+    return len( stream )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="Pack an Itch 4.1 file into FPGA DMA frames, or unpack them" )
+    parser.add_argument( "fileName" )
+    parser.add_argument( "output" )
+    parser.add_argument( "--word-bits", type=int, choices=sorted( wordDtypes ), default=defaultWordBits )
+    parser.add_argument( "--frame-words", type=int, default=defaultFrameWords )
+    parser.add_argument( "--align-messages", action="store_true", help="keep messages whole within each frame" )
+    parser.add_argument( "--unpack", action="store_true", help="turn DMA frames back into an Itch file" )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.unpack:
+        size = unpackFile( args.fileName, args.output, args.word_bits, args.frame_words, args.align_messages )
+        print( "Wrote {} message bytes to {}".format( size, args.output ) )
+    else:
+        frameCount, size = packFile( args.fileName, args.output, args.word_bits, args.frame_words, args.align_messages )
+        print( "Wrote {} frames, {} bytes to {}".format( frameCount, size, args.output ) )
+    print( "{:.3f} s".format( time.perf_counter() - start ) )
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from Itch41 import *
+from ItchDma import *
+from ItchFpgaOrderBook import FpgaOrderBook, FpgaOperation, FpgaSide
+
+samplesDir = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "SamplesMessages" )
+
+def sample(name):
+    with open( os.path.join( samplesDir, name ), 'rb' ) as fileIn:
+        return fileIn.read()
+
+class ItchDma_Test(unittest.TestCase):
+    """ Tests for the FPGA DMA frame packer and result unpacker """
+
+    def test_roundTrip(self):
+        for name in sorted( os.listdir( samplesDir ) ):
+            stream = sample( name )
+            for wordBits in ( 8, 32, 64 ):
+                for alignMessages in ( False, True ):
+                    with self.subTest( name=name, wordBits=wordBits, alignMessages=alignMessages ):
+                        # WHEN a sample is packed into small frames and unpacked
+                        frameWords = 64 // wordDtypes[ wordBits ].itemsize
+                        frames = list( packFrames( stream, wordBits, frameWords, alignMessages ) )
+
+                        # THEN every frame is whole words of the right size
+                        for frame in frames:
+                            self.assertEqual( frame.dtype, wordDtypes[ wordBits ] )
+                            self.assertLessEqual( len( frame ), frameWords )
+
+                        # AND the messages come back unchanged
+                        self.assertEqual( unpackFrames( frames, alignMessages ), stream )
+
+    def test_wordOrder(self):
+        # GIVEN the 7 byte TimeStamp sample: 00 05 54 00 00 58 b7
+        stream = sample( "T.itch" )
+
+        # WHEN
+        words = list( packFrames( stream, 32 ) )
+
+        # THEN the first byte is the most significant, and the tail is zero padded
+        self.assertEqual( [ int( word ) for frame in words for word in frame ], [ 0x00055400, 0x0058b700 ] )
+
+    def test_streamFramesAreViews(self):
+        # GIVEN a stream cut into 16 byte frames
+        stream = sample( "T.50.itch" )
+        frames = list( packFrames( stream, 64, 2 ) )
+
+        # THEN full frames share memory with the input and only the padded tail is a copy
+        self.assertEqual( len( frames ), -( -len( stream ) // 16 ) )
+        self.assertTrue( all( np.shares_memory( frame, np.frombuffer( stream, np.uint8 ) ) for frame in frames[ :-1 ] ) )
+        self.assertEqual( b''.join( frame.tobytes() for frame in frames ), stream + bytes( -len( stream ) % 8 ) )
+
+    def test_alignedFrames(self):
+        # GIVEN ten 7 byte TimeStamp messages and 16 byte frames
+        stream = b''.join( ItchMessageFactory.createFromArgs( [ MessageType.TimeStamp, { Field.Seconds: second } ] ).rawMessage
+                           for second in range( 10 ) )
+
+        # WHEN
+        frames = list( packFrames( stream, 32, 4, alignMessages=True ) )
+
+        # THEN each frame is full size and holds two whole messages then padding
+        self.assertEqual( len( frames ), 5 )
+        for frame in frames:
+            self.assertEqual( len( frame ), 4 )
+            self.assertEqual( frame.tobytes()[ 14: ], b'\x00\x00' )
+
+    def test_errors(self):
+        stream = sample( "Itch.test1.dat" )
+        # A message longer than a frame
+        with self.assertRaises( ValueError ):
+            list( packFrames( stream, 8, 16, alignMessages=True ) )
+        # A truncated stream
+        with self.assertRaises( ValueError ):
+            list( packFrames( stream[ :-1 ], 8, 4096, alignMessages=True ) )
+        # Padding can complete a message cut short by less than a word, not by more
+        with self.assertRaises( ValueError ):
+            unpackFrames( packFrames( stream[ :-9 ], 64, 4 ) )
+        with self.assertRaises( ValueError ):
+            list( packFrames( stream, 16 ) )
+
+    def test_commandWords(self):
+        # GIVEN an AddOrder command as the parser harness writes it
+        words = packCommandWords( [ ( 2, 1, 0x0102030405060708, 1000000, 300 ) ] )
+
+        # THEN it is Operation, Side, OrderRefNum, Price:Shares
+        self.assertEqual( words.tolist(), [ 2, 1, 0x0102030405060708, ( 1000000 << 32 ) | 300 ] )
+
+        # AND unpacks from the raw FIFO bytes
+        commands = unpackCommandWords( words.tobytes() )
+        self.assertEqual( commands.tolist(), [ ( 2, 1, 0x0102030405060708, 1000000, 300 ) ] )
+
+    def test_orderWordLayout(self):
+        # GIVEN an order as Host-OrderBook-Deserialize-Results.vi splits it
+        orders = [ ( 1, 0x0102030405060708, 1000000, 300 ), ( 0, 7, 0xFFFFFFFF, 0xFFFFFFFF ) ]
+
+        # WHEN
+        words = packOrderWords( orders )
+
+        # THEN each is Side, OrderRefNum, Price:Shares
+        self.assertEqual( words.tolist(), [ 1, 0x0102030405060708, ( 1000000 << 32 ) | 300,
+                                            0, 7, 0xFFFFFFFFFFFFFFFF ] )
+        self.assertEqual( words.tobytes()[ :24 ], bytes.fromhex( "0000000000000001" "0102030405060708"
+                                                                 "000F42400000012C" ) )
+        self.assertEqual( unpackOrderWords( words.tobytes() ).tolist(), orders )
+
+    def test_orderWords(self):
+        # GIVEN a GetAll response from the order book model
+        book = FpgaOrderBook()
+        for orderRefNum, price in enumerate( ( 105, 101, 103 ) ):
+            book.execute( FpgaOperation.AddOrder, FpgaSide.Sell, orderRefNum, price * 10000, 100 + orderRefNum )
+        orders = book.execute( FpgaOperation.GetAll )
+
+        # WHEN it is packed into result words and unpacked again
+        words = packOrderWords( orders )
+
+        # THEN
+        self.assertEqual( len( words ), 3 * len( orders ) )
+        self.assertEqual( unpackOrderWords( words.tobytes() ).tolist(), orders )
+
+    def test_packFile(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            fileName = os.path.join( samplesDir, "Itch.test2.dat" )
+            packedName = os.path.join( tempDir, "packed.bin" )
+            unpackedName = os.path.join( tempDir, "unpacked.itch" )
+            for alignMessages in ( False, True ):
+                # WHEN a file is packed and unpacked through files
+                frameCount, size = packFile( fileName, packedName, 64, 8, alignMessages )
+                unpackFile( packedName, unpackedName, 64, 8, alignMessages )
+
+                # THEN
+                self.assertEqual( os.path.getsize( packedName ), size )
+                self.assertGreater( frameCount, 1 )
+                with open( unpackedName, 'rb' ) as fileIn:
+                    self.assertEqual( fileIn.read(), sample( "Itch.test2.dat" ) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import struct
+
+from Itch41 import *
+
+rawStock = struct.Struct( '8s' )
+rawOrderRefNum = struct.Struct( '>q' )
+rawShares = struct.Struct( '>i' )
+
+def fieldOffsets(fieldName):
+    """ Offset of fieldName within the framed message (length prefix included),
+        per raw type byte, taken from the spec tables; None where absent.
+    """
+    offsets = [ None ] * 256
+    for typeByte, codec in enumerate( ItchMessageFactory.codecs ):
+        if codec is not None and fieldName in codec.accessors:
+            offsets[ typeByte ] = codec.accessors[ fieldName ][1]
+    return offsets
+
+stockOffsets = fieldOffsets( Field.Stock )
+orderRefNumOffsets = fieldOffsets( Field.OrderRefNum )
+newOrderRefNumOffsets = fieldOffsets( Field.NewOrderRefNum )
+sharesOffsets = fieldOffsets( Field.Shares )
+
+addOrderBytes = ( ord( MessageType.AddOrder.value ), ord( MessageType.AddOrderWithMPID.value ) )
+orderReplaceByte = ord( MessageType.OrderReplace.value )
+orderDeleteByte = ord( MessageType.OrderDelete.value )
+
+class RawFilter:
+    """ Accepts or rejects framed messages from their raw bytes, before decoding.
+
+        Messages are first gated on their type byte. With symbols given, any
+        message carrying a Stock field is compared on the 8 byte padded field at
+        its per type offset. Order level messages without a Stock field
+        (OrderExecuted, OrderCancel, OrderDelete, OrderReplace, ...) are kept
+        only if their OrderRefNum belongs to an accepted add, following
+        OrderReplace to the new OrderRefNum. An order stops being tracked once
+        it is deleted or its remaining shares are executed or cancelled, so
+        the tracked set stays the size of the live book. Messages with neither field
+        (TimeStamp, SystemEvent, BrokenTrade) pass on their type alone.
+
+        Call as rawFilter(buffer, offset); suitable for ItchReader.views and
+        ItchReader.messages.
+    """
+
+    def __init__(self, messageTypes=None, symbols=None):
+        self.allowedTypes = bytearray( 256 )
+        for messageType in ( messageTypes if messageTypes is not None else MessageType ):
+            self.allowedTypes[ ord( messageType.value ) ] = 1
+        self.symbols = None if symbols is None else set( symbol.ljust( 8 ).encode() for symbol in symbols )
+        # orderRefNum -> remaining shares of each tracked order
+        self.liveOrders = { }
+
+    def __call__(self, buffer, offset):
+        typeByte = buffer[ offset + 2 ]
+        if self.symbols is None:
+            return self.allowedTypes[ typeByte ] == 1
+
+        stockOffset = stockOffsets[ typeByte ]
+        if stockOffset is not None:
+            if rawStock.unpack_from( buffer, offset + stockOffset )[0] not in self.symbols:
+                return False
+            if typeByte in addOrderBytes:
+                # Tracked even when the add itself is not wanted, so its executions are followed
+                orderRefNum = rawOrderRefNum.unpack_from( buffer, offset + orderRefNumOffsets[ typeByte ] )[0]
+                self.liveOrders[ orderRefNum ] = rawShares.unpack_from( buffer, offset + sharesOffsets[ typeByte ] )[0]
+            return self.allowedTypes[ typeByte ] == 1
+
+        refOffset = orderRefNumOffsets[ typeByte ]
+        if refOffset is not None:
+            orderRefNum = rawOrderRefNum.unpack_from( buffer, offset + refOffset )[0]
+            remaining = self.liveOrders.get( orderRefNum )
+            if remaining is None:
+                return False
+            if typeByte == orderReplaceByte:
+                del self.liveOrders[ orderRefNum ]
+                newOrderRefNum = rawOrderRefNum.unpack_from( buffer, offset + newOrderRefNumOffsets[ typeByte ] )[0]
+                self.liveOrders[ newOrderRefNum ] = rawShares.unpack_from( buffer, offset + sharesOffsets[ typeByte ] )[0]
+            elif typeByte == orderDeleteByte:
+                del self.liveOrders[ orderRefNum ]
+            else:
+                # OrderExecuted, OrderExecutedWithPrice and OrderCancel
+                remaining -= rawShares.unpack_from( buffer, offset + sharesOffsets[ typeByte ] )[0]
+                if remaining > 0:
+                    self.liveOrders[ orderRefNum ] = remaining
+                else:
+                    del self.liveOrders[ orderRefNum ]
+        return self.allowedTypes[ typeByte ] == 1
+
+    def frames(self, frames):
+        for buffer, offset in frames:
+            if self( buffer, offset ):
+                yield buffer, offset
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+
+from Itch41 import *
+from ItchFilter import *
+from ItchReader import ItchReader
+from ItchTestHelpers import frame, addOrder
+
+class ItchFilter_Test(unittest.TestCase):
+    """ Tests for filtering messages on raw bytes before decoding """
+
+    def setUp(self):
+        self.data = b"".join( [
+            frame( MessageType.TimeStamp, Seconds=100 ),
+            addOrder( 1, "AAPL" ),
+            addOrder( 2, "MSFT" ),
+            frame( MessageType.CrossTrade, NanoSeconds=2, Shares=10, Stock="AAPL", CrossPrice=1.0,
+                   MatchNum=1, CrossType='O' ),
+            frame( MessageType.NetOrderImbalance, NanoSeconds=3, PairedShares=1, ImbalanceShares=2,
+                   ImbalanceDirection='B', Stock="MSFT", FarPrice=1.0, NearPrice=1.0,
+                   CurrentReferencePrice=1.0, CrossType='O', PriceVariationIndicator='L' ),
+            frame( MessageType.OrderExecuted, NanoSeconds=4, OrderRefNum=1, Shares=50, MatchNum=2 ),
+            frame( MessageType.OrderExecuted, NanoSeconds=5, OrderRefNum=2, Shares=50, MatchNum=3 ),
+            frame( MessageType.OrderReplace, NanoSeconds=6, OrderRefNum=1, NewOrderRefNum=3, Shares=10, Price=11.0 ),
+            frame( MessageType.OrderCancel, NanoSeconds=7, OrderRefNum=3, Shares=5 ),
+            frame( MessageType.OrderDelete, NanoSeconds=8, OrderRefNum=3 ),
+            frame( MessageType.OrderDelete, NanoSeconds=9, OrderRefNum=3 ),
+        ] )
+
+    def filtered(self, rawFilter):
+        reader = ItchReader( io.BytesIO( self.data ) )
+        return [ ( view.MessageType, view.getValue( Field.NanoSeconds ) ) for view in reader.views( rawFilter ) ]
+
+    def test_offsets_come_from_spec_tables(self):
+        self.assertEqual( 2 + 18, stockOffsets[ ord( 'A' ) ] )
+        self.assertEqual( 2 + 13, stockOffsets[ ord( 'Q' ) ] )
+        self.assertEqual( 2 + 22, stockOffsets[ ord( 'I' ) ] )
+        self.assertIsNone( stockOffsets[ ord( 'E' ) ] )
+
+    def test_filter_by_symbol_follows_orders(self):
+        # WHEN
+        messages = self.filtered( RawFilter( symbols=[ "AAPL" ] ) )
+
+        # THEN
+        self.assertEqual( [ ( 'T', "" ), ( 'A', 1 ), ( 'Q', 2 ), ( 'E', 4 ), ( 'U', 6 ), ( 'X', 7 ), ( 'D', 8 ) ],
+                          messages )
+
+    def test_filter_by_type_and_symbol(self):
+        # WHEN
+        messages = self.filtered( RawFilter( messageTypes=[ MessageType.OrderExecuted ], symbols=[ "MSFT" ] ) )
+
+        # THEN
+        self.assertEqual( [ ( 'E', 5 ) ], messages )
+
+    def test_filter_by_type_only(self):
+        # WHEN
+        messages = self.filtered( RawFilter( messageTypes=[ MessageType.OrderDelete, MessageType.TimeStamp ] ) )
+
+        # THEN
+        self.assertEqual( [ ( 'T', "" ), ( 'D', 8 ), ( 'D', 9 ) ], messages )
+
+    def test_filled_orders_stop_being_tracked(self):
+        # GIVEN
+        self.data += b"".join( [
+            addOrder( 4, "AAPL" ),
+            frame( MessageType.OrderExecuted, NanoSeconds=10, OrderRefNum=4, Shares=60, MatchNum=4 ),
+            frame( MessageType.OrderCancel, NanoSeconds=11, OrderRefNum=4, Shares=40 ),
+            frame( MessageType.OrderExecuted, NanoSeconds=12, OrderRefNum=4, Shares=1, MatchNum=5 ),
+        ] )
+        rawFilter = RawFilter( symbols=[ "AAPL" ] )
+
+        # WHEN
+        messages = self.filtered( rawFilter )
+
+        # THEN
+        self.assertEqual( [ ( 'A', 1 ), ( 'E', 10 ), ( 'X', 11 ) ], messages[ -3: ] )
+        self.assertEqual( { }, rawFilter.liveOrders )
+
+if __name__ == "__main__":
+    unittest.main()
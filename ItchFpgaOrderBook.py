@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+
+import argparse
+import bisect
+import enum
+import struct
+import time
+
+from Itch41 import *
+from ItchFilter import addOrderBytes
+from ItchOrderBook import padStock
+from ItchReader import ItchReader
+
+# Software model of Fpga/OrderBook/Fpga-OrderBook.vi and its typedefs.
+#
+# Types, from the FIFO DataType strings in MarketData_02.lvproj:
+#   Fpga-OrderBook-Command.ctl: { Operation enum U16, Cluster }
+#   Fpga-Order.ctl (Cluster):   { Side enum U16, OrderRefNum U64, Price U32, Shares U32 }
+# Records are the LabVIEW flattened form of those clusters: big endian, in
+# cluster order, no padding.
+orderBookCommand = struct.Struct( '>HHQII' )
+fpgaOrder = struct.Struct( '>HQII' )
+
+# Result file: the U64 words Host-OrderBook-TestHarness.vi reads back and
+# Tests/OrderBook/Host-OrderBook-Deserialize-Results.vi splits into
+# Fpga-Orders, three per order: Side, OrderRefNum, and Price in the high
+# half of the last word above Shares. Responses follow each other with no
+# delimiter. These are the bytes ItchDma.packOrderWords() writes.
+resultOrder = struct.Struct( '>QQII' )
+
+# Responses file, beside the result file: one record per GetAll with the
+# feed message number that triggered it and the number of orders it
+# returned, so the undelimited result words can be lined up with the feed
+responseRecord = struct.Struct( '>QI' )
+
+defaultMemoryDepth = 1024
+
+class FpgaOperation(enum.IntEnum):
+    Noop = 0
+    GetAll = 1
+    AddOrder = 2
+    DeleteOrder = 3
+
+class FpgaSide(enum.IntEnum):
+    Sell = 0
+    Buy = 1
+
+itchSides = { b'S': FpgaSide.Sell, b'B': FpgaSide.Buy }
+
+class FpgaBookOverflowError(OverflowError):
+    pass
+
+def fpgaOrderFor(side, orderRefNum, price, shares):
+    """ An Fpga-Order tuple with every field cut to its hardware width. """
+    return ( side & 0xFFFF, orderRefNum & 0xFFFFFFFFFFFFFFFF, price & 0xFFFFFFFF, shares & 0xFFFFFFFF )
+
+def comesBefore(carried, stored):
+    # The AddOrder compare: a Sell is written ahead of a strictly higher
+    # price, anything else ahead of a strictly lower one
+    if carried[0] == FpgaSide.Sell:
+        return carried[2] < stored[2]
+    return carried[2] > stored[2]
+
+def insertReference(memory, order):
+    """ AddOrder exactly as the state machine runs it: walk the book from
+        the start address carrying an order, and wherever the carried order
+        comes before the stored one, write it there and carry the stored one
+        on. The last carried order lands at start address + length.
+
+        Ties never swap, so when an order is inserted every run of equal
+        prices after it has its first order moved to the end of the run.
+    """
+    carried = order
+    for address, stored in enumerate( memory ):
+        if comesBefore( carried, stored ):
+            memory[ address ] = carried
+            carried = stored
+    memory.append( carried )
+
+class SortedSide:
+    """ The same book as insertReference() while every order in it has one
+        side, in O(log) per AddOrder instead of a walk over the whole memory.
+
+        Orders are kept per price level, in memory order. The walk rotates a
+        level left by one whenever an order is inserted ahead of it, so each
+        level remembers how many inserts ahead of it it has already applied,
+        and a sparse Fenwick tree over the 32 bit key space counts inserts
+        below any key. Rotations are applied when a level is appended to or
+        read out.
+    """
+
+    def __init__(self, side):
+        self.side = side
+        self.keys = [ ]
+        self.levels = { }
+        self.tree = { }
+
+    def keyFor(self, price):
+        # Memory order is ascending key on both sides
+        return price if self.side == FpgaSide.Sell else 0xFFFFFFFF - price
+
+    def insertsBelow(self, key):
+        tree = self.tree
+        count = 0
+        while key > 0:
+            count += tree.get( key, 0 )
+            key &= key - 1
+        return count
+
+    def countInsert(self, key):
+        tree = self.tree
+        index = key + 1
+        while index <= 1 << 32:
+            tree[ index ] = tree.get( index, 0 ) + 1
+            index += index & -index
+
+    def levelOrders(self, key):
+        level = self.levels[ key ]
+        applied = self.insertsBelow( key )
+        orders = level[0]
+        rotate = ( applied - level[1] ) % len( orders )
+        if rotate:
+            orders[:] = orders[ rotate: ] + orders[ :rotate ]
+        level[1] = applied
+        return orders
+
+    def insert(self, order):
+        key = self.keyFor( order[2] )
+        if key in self.levels:
+            self.levelOrders( key ).append( order )
+        else:
+            self.levels[ key ] = [ [ order ], self.insertsBelow( key ) ]
+            bisect.insort( self.keys, key )
+        self.countInsert( key )
+
+    def orders(self):
+        memory = [ ]
+        for key in self.keys:
+            memory.extend( self.levelOrders( key ) )
+        return memory
+
+class FpgaOrderBook:
+    """ Bit accurate model of the FPGA order book behind TS-ORDERBOOK_in / _out.
+
+        execute() takes one Fpga-OrderBook-Command and returns the Fpga-Order
+        tuples ( side, orderRefNum, price, shares ) the hardware writes to
+        TS-ORDERBOOK_out: the whole memory from the start address for GetAll,
+        nothing otherwise. AddOrder inserts as insertReference() describes.
+        DeleteOrder is in the Operation enum but falls into the VI's
+        "Noop, Default" case, so it does nothing, as in hardware.
+
+        The VI does not guard the memory size; inserting past depth raises
+        FpgaBookOverflowError rather than guessing what the block RAM does.
+    """
+
+    def __init__(self, depth=defaultMemoryDepth):
+        self.depth = depth
+        self.length = 0
+        # A SortedSide while the book is one sided, then the plain memory list
+        self.sorted = None
+        self.memory = None
+        self.counts = [ 0 ] * len( FpgaOperation )
+
+    def execute(self, operation, side=0, orderRefNum=0, price=0, shares=0):
+        operation &= 0xFFFF
+        if operation < len( self.counts ):
+            self.counts[ operation ] += 1
+        if operation == FpgaOperation.AddOrder:
+            self.addOrder( fpgaOrderFor( side, orderRefNum, price, shares ) )
+        elif operation == FpgaOperation.GetAll:
+            return self.getAll()
+        return [ ]
+
+    def executeFlattened(self, command):
+        return self.execute( *orderBookCommand.unpack( command ) )
+
+    def addOrder(self, order):
+        if self.length == self.depth:
+            raise FpgaBookOverflowError( "Order book memory of {} orders is full".format( self.depth ) )
+        self.length += 1
+        if self.memory is not None:
+            insertReference( self.memory, order )
+        elif self.sorted is None:
+            self.sorted = SortedSide( order[0] )
+            self.sorted.insert( order )
+        elif self.sorted.side == order[0]:
+            self.sorted.insert( order )
+        else:
+            # Both sides in one memory: only the literal walk is exact
+            self.memory = self.sorted.orders()
+            self.sorted = None
+            insertReference( self.memory, order )
+
+    def getAll(self):
+        if self.memory is not None:
+            return list( self.memory )
+        if self.sorted is not None:
+            return self.sorted.orders()
+        return [ ]
+
+def commandsFromFrames(frames, stock, side=None, getAllEvery=None):
+    """ ( message number, command ) pairs driving one book from a feed.
+
+        Every AddOrder / AddOrderWithMPID for stock (and side, 'B' or 'S', if
+        given) becomes an AddOrder command with the raw fixed point price.
+        A GetAll follows every getAllEvery adds and the last message.
+        Message numbers count every frame from 0.
+    """
+    rawStock = padStock( stock )
+    wantedSide = None if side is None else side.encode()
+    unpackAdd = AddOrder._codec.struct.unpack_from
+    adds = 0
+    number = -1
+    for number, ( buffer, offset ) in enumerate( frames ):
+        if buffer[ offset + 2 ] not in addOrderBytes:
+            continue
+        _, _, _, orderRefNum, orderSide, shares, addStock, price = unpackAdd( buffer, offset )
+        if addStock != rawStock or ( wantedSide is not None and orderSide != wantedSide ):
+            continue
+        yield number, ( FpgaOperation.AddOrder, itchSides[ orderSide ], orderRefNum, price, shares )
+        adds += 1
+        if getAllEvery and adds % getAllEvery == 0:
+            yield number, ( FpgaOperation.GetAll, 0, 0, 0, 0 )
+    if number >= 0:
+        yield number, ( FpgaOperation.GetAll, 0, 0, 0, 0 )
+
+def responsesFileNameFor(resultFileName):
+    return resultFileName + '.responses'
+
+def resultWords(orders):
+    """ Result file bytes for one GetAll response. """
+    pack = resultOrder.pack
+    return b''.join( [ pack( *order ) for order in orders ] )
+
+def runFile(fileName, stock, resultFileName, side=None, getAllEvery=None, depth=defaultMemoryDepth):
+    """ Drives an FpgaOrderBook from fileName and writes the result file and
+        its responses file.
+
+        Returns the book, whose counts hold the commands executed per operation.
+    """
+    book = FpgaOrderBook( depth )
+    execute = book.execute
+    with ItchReader( fileName ) as reader, open( resultFileName, 'wb' ) as resultOut, \
+         open( responsesFileNameFor( resultFileName ), 'wb' ) as responsesOut:
+        for number, command in commandsFromFrames( reader.frames(), stock, side, getAllEvery ):
+            if command[0] == FpgaOperation.GetAll:
+                orders = execute( *command )
+                resultOut.write( resultWords( orders ) )
+                responsesOut.write( responseRecord.pack( number, len( orders ) ) )
+            else:
+                execute( *command )
+    return book
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="Run an Itch 4.1 file through the FPGA order book model" )
+    parser.add_argument( "fileName" )
+    parser.add_argument( "--stock", required=True )
+    parser.add_argument( "--side", choices=[ 'B', 'S' ], help="only feed this side (the hardware keeps one memory)" )
+    parser.add_argument( "--get-all-every", type=int, default=None, help="GetAll after this many AddOrders" )
+    parser.add_argument( "--depth", type=int, default=defaultMemoryDepth, help="order book memory size" )
+    parser.add_argument( "--output", default="FpgaOrderBook.results" )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    book = runFile( args.fileName, args.stock, args.output, args.side, args.get_all_every, args.depth )
+    elapsed = time.perf_counter() - start
+    print( "{} AddOrder, {} GetAll commands in {:.3f} s; {} orders in the book; results in {} and {}".format(
+               book.counts[ FpgaOperation.AddOrder ], book.counts[ FpgaOperation.GetAll ], elapsed,
+               book.length, args.output, responsesFileNameFor( args.output ) ) )
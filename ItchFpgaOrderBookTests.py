@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import tempfile
+import unittest
+
+from Itch41 import *
+from ItchFpgaOrderBook import *
+from ItchGenerator import ItchGenerator
+from ItchReader import ItchReader
+
+def sell(orderRefNum, price):
+    return ( FpgaSide.Sell, orderRefNum, price, 100 )
+
+def buy(orderRefNum, price):
+    return ( FpgaSide.Buy, orderRefNum, price, 100 )
+
+class ItchFpgaOrderBook_Test(unittest.TestCase):
+    """ Tests for the software model of the FPGA order book """
+
+    def test_layouts(self):
+        # Flattened Fpga-OrderBook-Command.ctl and Fpga-Order.ctl
+        self.assertEqual( orderBookCommand.size, 2 + 2 + 8 + 4 + 4 )
+        self.assertEqual( fpgaOrder.size, 2 + 8 + 4 + 4 )
+        # Host-OrderBook-Deserialize-Results.vi: three U64 words per order
+        self.assertEqual( resultOrder.size, 3 * 8 )
+        self.assertEqual( resultWords( [ ( FpgaSide.Buy, 0x0102030405060708, 0x0A0B0C0D, 0x01020304 ) ] ),
+                          bytes.fromhex( "0000000000000001" "0102030405060708" "0A0B0C0D01020304" ) )
+
+    def test_insertReference_sell(self):
+        # GIVEN a sell book with two orders at 7
+        memory = [ ]
+        for order in ( sell( 1, 5 ), sell( 2, 7 ), sell( 3, 7 ), sell( 4, 9 ) ):
+            insertReference( memory, order )
+        self.assertEqual( [ order[1] for order in memory ], [ 1, 2, 3, 4 ] )
+
+        # WHEN an order is inserted ahead of them
+        insertReference( memory, sell( 5, 6 ) )
+
+        # THEN prices stay ascending, and the walk moved the first order at 7 behind the second
+        self.assertEqual( [ order[1] for order in memory ], [ 1, 5, 3, 2, 4 ] )
+
+    def test_insertReference_buy(self):
+        # WHEN buys are inserted
+        memory = [ ]
+        for order in ( buy( 1, 5 ), buy( 2, 9 ), buy( 3, 7 ), buy( 4, 9 ) ):
+            insertReference( memory, order )
+
+        # THEN the best (highest) price comes first, and equal prices keep arrival order
+        self.assertEqual( [ order[1] for order in memory ], [ 2, 4, 3, 1 ] )
+
+    def test_sortedSide_matchesReference(self):
+        for side in FpgaSide:
+            for seed in range( 20 ):
+                # GIVEN random orders, some on a handful of prices so there are long ties
+                rng = random.Random( seed )
+                prices = [ rng.randrange( 1 << 32 ) for _ in range( 3 ) ] if seed % 2 else None
+                memory = [ ]
+                sortedSide = SortedSide( side )
+                for orderRefNum in range( rng.randrange( 1, 300 ) ):
+                    price = rng.choice( prices ) if prices else rng.randrange( 1000, 1100 )
+                    order = ( side, orderRefNum, price, rng.randrange( 1, 1000 ) )
+
+                    # WHEN both models insert them
+                    insertReference( memory, order )
+                    sortedSide.insert( order )
+
+                    # THEN the memory contents agree at every step
+                    if rng.random() < 0.2:
+                        self.assertEqual( sortedSide.orders(), memory )
+                self.assertEqual( sortedSide.orders(), memory )
+
+    def test_mixedSides(self):
+        # GIVEN one memory fed both sides, as the hardware allows
+        rng = random.Random( 3 )
+        orders = [ ( rng.choice( list( FpgaSide ) ), number, rng.randrange( 90, 110 ), 1 ) for number in range( 200 ) ]
+        memory = [ ]
+        book = FpgaOrderBook()
+
+        # WHEN
+        for order in orders:
+            insertReference( memory, order )
+            book.execute( FpgaOperation.AddOrder, *order )
+
+        # THEN the book follows the literal walk
+        self.assertEqual( book.execute( FpgaOperation.GetAll ), memory )
+
+    def test_execute(self):
+        # GIVEN a book with two orders
+        book = FpgaOrderBook()
+        book.executeFlattened( orderBookCommand.pack( FpgaOperation.AddOrder, FpgaSide.Sell, 1, 102, 10 ) )
+        book.execute( FpgaOperation.AddOrder, FpgaSide.Sell, 2, 101, 20 )
+
+        # WHEN Noop and DeleteOrder are sent
+        self.assertEqual( book.execute( FpgaOperation.DeleteOrder, FpgaSide.Sell, 1, 102, 10 ), [ ] )
+        self.assertEqual( book.execute( FpgaOperation.Noop ), [ ] )
+
+        # THEN nothing changed, and GetAll reads the memory out in order
+        self.assertEqual( book.execute( FpgaOperation.GetAll ), [ ( 0, 2, 101, 20 ), ( 0, 1, 102, 10 ) ] )
+        self.assertEqual( book.counts, [ 1, 1, 2, 1 ] )
+
+    def test_fieldWidths(self):
+        # GIVEN values wider than the cluster fields
+        book = FpgaOrderBook()
+
+        # WHEN
+        book.execute( FpgaOperation.AddOrder, FpgaSide.Buy, ( 1 << 64 ) + 5, ( 1 << 32 ) + 7, ( 1 << 33 ) + 9 )
+
+        # THEN they are cut to U64 / U32 like the hardware registers
+        self.assertEqual( book.execute( FpgaOperation.GetAll ), [ ( 1, 5, 7, 9 ) ] )
+
+    def test_overflow(self):
+        # GIVEN a full memory
+        book = FpgaOrderBook( depth=2 )
+        book.execute( FpgaOperation.AddOrder, FpgaSide.Sell, 1, 100, 1 )
+        book.execute( FpgaOperation.AddOrder, FpgaSide.Sell, 2, 100, 1 )
+
+        # WHEN / THEN
+        with self.assertRaises( FpgaBookOverflowError ):
+            book.execute( FpgaOperation.AddOrder, FpgaSide.Sell, 3, 100, 1 )
+
+    def test_runFile(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            # GIVEN a generated feed
+            fileName = os.path.join( tempDir, "feed.itch" )
+            resultFileName = os.path.join( tempDir, "book.results" )
+            ItchGenerator( seed=5, symbolCount=3 ).writeFile( fileName, 3000 )
+            adds = [ ]
+            with ItchReader( fileName ) as reader:
+                for number, message in enumerate( reader.messages() ):
+                    if message.MessageType in ( MessageType.AddOrder.value, MessageType.AddOrderWithMPID.value ) \
+                       and message.Side == 'S':
+                        adds.append( ( number, message ) )
+            stock = adds[0][1].Stock
+
+            # WHEN the sell side of one stock is run with a GetAll every 50 adds
+            book = runFile( fileName, stock, resultFileName, side='S', getAllEvery=50, depth=4096 )
+
+            # THEN one GetAll per 50 adds plus one at the end was answered
+            stockAddNumbers = [ number for number, message in adds if message.Stock == stock ]
+            stockAdds = [ message for number, message in adds if message.Stock == stock ]
+            self.assertEqual( book.counts[ FpgaOperation.AddOrder ], len( stockAdds ) )
+            self.assertEqual( book.counts[ FpgaOperation.GetAll ], len( stockAdds ) // 50 + 1 )
+
+            # AND the responses file counts every order written, one more per 50 adds
+            with open( responsesFileNameFor( resultFileName ), 'rb' ) as responsesIn:
+                responses = list( responseRecord.iter_unpack( responsesIn.read() ) )
+            with open( resultFileName, 'rb' ) as resultIn:
+                orders = list( resultOrder.iter_unpack( resultIn.read() ) )
+            self.assertEqual( [ count for number, count in responses ],
+                              [ 50 * getAll for getAll in range( 1, len( responses ) ) ] + [ len( stockAdds ) ] )
+            self.assertEqual( sum( count for number, count in responses ), len( orders ) )
+            self.assertEqual( responses[0][0], stockAddNumbers[49] )
+
+            # AND the last response holds every order, cheapest first
+            last = orders[ -len( stockAdds ): ]
+            self.assertEqual( sorted( order[1] for order in last ),
+                              sorted( message.OrderRefNum for message in stockAdds ) )
+            prices = [ order[2] for order in last ]
+            self.assertEqual( prices, sorted( prices ) )
+
+if __name__ == '__main__':
+    unittest.main()
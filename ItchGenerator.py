@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+import string
+
+import numpy as np
+
+from Itch41 import *
+from ItchWriter import ItchWriter
+
+# Relative weights of order events once the book is populated
+defaultMix = {
+    MessageType.AddOrder               : 45,
+    MessageType.AddOrderWithMPID       :  3,
+    MessageType.OrderExecuted          : 10,
+    MessageType.OrderExecutedWithPrice :  2,
+    MessageType.OrderCancel            :  8,
+    MessageType.OrderDelete            : 24,
+    MessageType.OrderReplace           :  8,
+}
+
+mpids = [ b"NSDQ", b"GSCO", b"MSCO", b"UBSS", b"LEHM", b"ATDF" ]
+
+# Order prices sit up to maxPriceTicks ticks either side of the symbol's base
+# price, and base prices start above that, so every bid stays positive
+priceTick = 100
+maxPriceTicks = 499
+minBasePrice = ( maxPriceTicks + 1 ) * priceTick
+
+# Inter-message gaps and event types are drawn this many at a time
+randomBlockSize = 1 << 16
+
+class ItchGenerator:
+    """ Seedable generator of a consistent synthetic Itch 4.1 day.
+
+        Emits SystemEvent and StockDirectory messages for every symbol, then a
+        stream of order events drawn from mix in which executions, cancels,
+        replaces and deletes only ever refer to live OrderRefNums. A TimeStamp
+        is emitted whenever the clock crosses a second; inter-message gaps
+        follow messagesPerSecond, and with burstProbability a second runs
+        burstMultiplier times faster.
+
+        generate() yields ( codec, values ) pairs ready for
+        ItchWriter.writeValues, so no ItchMessage objects are built. The
+        random draws behind each event are made in numpy blocks; only the
+        live order bookkeeping runs per message.
+    """
+
+    def __init__(self, seed=0, symbolCount=1000, messagesPerSecond=100000, burstProbability=0.05,
+                 burstMultiplier=10, mix=None, startSeconds=34200, minLiveOrders=1000):
+        if symbolCount < 1:
+            raise ValueError( "symbolCount must be at least 1, got {}".format( symbolCount ) )
+        self.random = random.Random( seed )
+        self.blockRandom = np.random.default_rng( self.random.getrandbits( 64 ) )
+        self.messagesPerSecond = messagesPerSecond
+        self.burstProbability = burstProbability
+        self.burstMultiplier = burstMultiplier
+        self.startSeconds = startSeconds
+        self.minLiveOrders = minLiveOrders
+        mix = mix or defaultMix
+        self.mixTypes = list( mix )
+        self.mixCumulativeWeights = np.cumsum( list( mix.values() ), dtype=float )
+        self.mixCumulativeWeights /= self.mixCumulativeWeights[-1]
+        self.symbols = self.makeSymbols( symbolCount )
+        self.basePrices = [ self.random.randrange( minBasePrice, 5000000, priceTick ) for _ in self.symbols ]
+
+        self.codecs = { messageType: ItchMessageFactory.codecs[ ord( messageType.value ) ]
+                        for messageType in MessageType }
+        # live order: [ orderRefNum, symbol index, side, shares, price ]
+        self.liveOrders = [ ]
+        self.livePositions = { }
+        self.nextOrderRefNum = 1
+        self.nextMatchNum = 1
+        self.handlers = {
+            MessageType.AddOrder               : self.addOrder,
+            MessageType.AddOrderWithMPID       : self.addOrderWithMPID,
+            MessageType.OrderExecuted          : self.orderExecuted,
+            MessageType.OrderExecutedWithPrice : self.orderExecutedWithPrice,
+            MessageType.OrderCancel            : self.orderCancel,
+            MessageType.OrderDelete            : self.orderDelete,
+            MessageType.OrderReplace           : self.orderReplace,
+        }
+        self.addOrderCodec = self.codecs[ MessageType.AddOrder ]
+        self.addOrderWithMPIDCodec = self.codecs[ MessageType.AddOrderWithMPID ]
+        self.orderExecutedCodec = self.codecs[ MessageType.OrderExecuted ]
+        self.orderExecutedWithPriceCodec = self.codecs[ MessageType.OrderExecutedWithPrice ]
+        self.orderCancelCodec = self.codecs[ MessageType.OrderCancel ]
+        self.orderDeleteCodec = self.codecs[ MessageType.OrderDelete ]
+        self.orderReplaceCodec = self.codecs[ MessageType.OrderReplace ]
+
+    def makeSymbols(self, count):
+        symbols = set()
+        while len( symbols ) < count:
+            length = self.random.randint( 1, 5 )
+            symbols.add( "".join( self.random.choice( string.ascii_uppercase ) for _ in range( length ) ) )
+        return [ symbol.ljust( 8 ).encode() for symbol in sorted( symbols ) ]
+
+    def message(self, messageType, *values):
+        codec = self.codecs[ messageType ]
+        return codec, ( codec.typeCode, ) + values
+
+    def systemEvent(self, nanoSeconds, eventCode):
+        return self.message( MessageType.SystemEvent, nanoSeconds, eventCode )
+
+    def randomBlock(self):
+        """ randomBlockSize ( gap, event index into mixTypes, draws ) rows, all
+            drawn at once: gap is a standard exponential, and draws is what an
+            event handler may use: ( symbol index, side, shares, price offset,
+            live order pick in [0, 1), partial shares, MPID ).
+        """
+        blockRandom = self.blockRandom
+        size = randomBlockSize
+        gaps = blockRandom.standard_exponential( size ).tolist()
+        picks = np.searchsorted( self.mixCumulativeWeights, blockRandom.random( size ), side='right' ).tolist()
+        draws = zip( blockRandom.integers( 0, len( self.symbols ), size ).tolist(),
+                     np.array( [ b'S', b'B' ] )[ blockRandom.integers( 0, 2, size ) ].tolist(),
+                     ( blockRandom.integers( 1, 50, size ) * 100 ).tolist(),
+                     ( blockRandom.integers( 1, maxPriceTicks + 1, size ) * priceTick ).tolist(),
+                     blockRandom.random( size ).tolist(),
+                     ( blockRandom.integers( 1, 10, size ) * 100 ).tolist(),
+                     np.array( mpids )[ blockRandom.integers( 0, len( mpids ), size ) ].tolist() )
+        return list( zip( gaps, picks, draws ) )
+
+    def generate(self, messageCount):
+        """ Yields messageCount ( codec, values ) pairs. """
+        unsupported = [ messageType for messageType in self.mixTypes if messageType not in self.handlers ]
+        if unsupported:
+            raise ValueError( "Unsupported message type in mix: {}".format( unsupported[0] ) )
+        events = [ self.handlers[ messageType ] for messageType in self.mixTypes ]
+        addOrder = self.addOrder
+        rand = self.random.random
+        liveOrders = self.liveOrders
+        # With no live order there is nothing to execute, cancel, replace or
+        # delete, so at least one is always kept
+        minLiveOrders = max( self.minLiveOrders, 1 )
+        timeStampCodec = self.codecs[ MessageType.TimeStamp ]
+        seconds = self.startSeconds
+        nanoSeconds = 0
+        emitted = 0
+
+        header = [ self.message( MessageType.TimeStamp, seconds ),
+                   self.systemEvent( 0, b'O' ),
+                   self.systemEvent( 0, b'S' ) ]
+        for symbol in self.symbols:
+            header.append( self.message( MessageType.StockDirectory, 0, symbol, b'Q', b' ', 100, b'N' ) )
+        header.append( self.systemEvent( 0, b'Q' ) )
+        for item in header[ : messageCount ]:
+            yield item
+        emitted = len( header[ : messageCount ] )
+
+        nanoSecondsPerGap = 1e9 / self.messagesPerSecond
+        rows = [ ]
+        position = 0
+        while emitted < messageCount:
+            if position == len( rows ):
+                rows = self.randomBlock()
+                position = 0
+            gap, pick, draws = rows[ position ]
+            nanoSeconds += int( gap * nanoSecondsPerGap ) + 1
+            if nanoSeconds >= 1000000000:
+                seconds += nanoSeconds // 1000000000
+                nanoSeconds %= 1000000000
+                nanoSecondsPerGap = 1e9 / self.messagesPerSecond
+                if rand() < self.burstProbability:
+                    nanoSecondsPerGap /= self.burstMultiplier
+                yield timeStampCodec, ( timeStampCodec.typeCode, seconds )
+                emitted += 1
+                if emitted == messageCount:
+                    break
+            if len( liveOrders ) < minLiveOrders:
+                yield addOrder( nanoSeconds, draws )
+            else:
+                yield events[ pick ]( nanoSeconds, draws )
+            position += 1
+            emitted += 1
+
+    def addLive(self, order):
+        self.livePositions[ order[0] ] = len( self.liveOrders )
+        self.liveOrders.append( order )
+
+    def removeLive(self, order):
+        position = self.livePositions.pop( order[0] )
+        last = self.liveOrders.pop()
+        if last is not order:
+            self.liveOrders[ position ] = last
+            self.livePositions[ last[0] ] = position
+
+    def newOrder(self, symbolIndex, side, shares, priceOffset):
+        base = self.basePrices[ symbolIndex ]
+        order = [ self.nextOrderRefNum, symbolIndex, side, shares,
+                  base - priceOffset if side == b'B' else base + priceOffset ]
+        self.nextOrderRefNum += 1
+        self.addLive( order )
+        return order
+
+    def addOrder(self, nanoSeconds, draws):
+        symbolIndex, side, shares, priceOffset = draws[ :4 ]
+        order = self.newOrder( symbolIndex, side, shares, priceOffset )
+        codec = self.addOrderCodec
+        return codec, ( codec.typeCode, nanoSeconds, order[0], side, shares, self.symbols[ symbolIndex ], order[4] )
+
+    def addOrderWithMPID(self, nanoSeconds, draws):
+        symbolIndex, side, shares, priceOffset = draws[ :4 ]
+        order = self.newOrder( symbolIndex, side, shares, priceOffset )
+        codec = self.addOrderWithMPIDCodec
+        return codec, ( codec.typeCode, nanoSeconds, order[0], side, shares, self.symbols[ symbolIndex ], order[4],
+                        draws[6] )
+
+    def liveOrder(self, draws):
+        return self.liveOrders[ int( draws[4] * len( self.liveOrders ) ) ]
+
+    def execution(self, draws):
+        order = self.liveOrder( draws )
+        shares = min( order[3], draws[5] )
+        matchNum = self.nextMatchNum
+        self.nextMatchNum += 1
+        self.reduce( order, shares )
+        return order, shares, matchNum
+
+    def orderExecuted(self, nanoSeconds, draws):
+        order, shares, matchNum = self.execution( draws )
+        codec = self.orderExecutedCodec
+        return codec, ( codec.typeCode, nanoSeconds, order[0], shares, matchNum )
+
+    def orderExecutedWithPrice(self, nanoSeconds, draws):
+        order, shares, matchNum = self.execution( draws )
+        codec = self.orderExecutedWithPriceCodec
+        return codec, ( codec.typeCode, nanoSeconds, order[0], shares, matchNum, b'Y', order[4] )
+
+    def orderCancel(self, nanoSeconds, draws):
+        order = self.liveOrder( draws )
+        shares = min( order[3], draws[5] )
+        self.reduce( order, shares )
+        codec = self.orderCancelCodec
+        return codec, ( codec.typeCode, nanoSeconds, order[0], shares )
+
+    def orderDelete(self, nanoSeconds, draws):
+        order = self.liveOrder( draws )
+        self.removeLive( order )
+        codec = self.orderDeleteCodec
+        return codec, ( codec.typeCode, nanoSeconds, order[0] )
+
+    def orderReplace(self, nanoSeconds, draws):
+        order = self.liveOrder( draws )
+        self.removeLive( order )
+        replacement = self.newOrder( order[1], order[2], draws[2], draws[3] )
+        codec = self.orderReplaceCodec
+        return codec, ( codec.typeCode, nanoSeconds, order[0], replacement[0], replacement[3], replacement[4] )
+
+    def reduce(self, order, shares):
+        order[3] -= shares
+        if order[3] == 0:
+            self.removeLive( order )
+
+    def writeFile(self, fileName, messageCount):
+        with ItchWriter( fileName ) as writer:
+            writeValues = writer.writeValues
+            for codec, values in self.generate( messageCount ):
+                writeValues( codec, values )
+        return writer.bytesWritten
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="Generate a synthetic Itch 4.1 file" )
+    parser.add_argument( "fileName" )
+    parser.add_argument( "messageCount", type=int )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--symbols", type=int, default=1000 )
+    parser.add_argument( "--rate", type=int, default=100000, help="messages per second of feed time" )
+    parser.add_argument( "--burst-probability", type=float, default=0.05 )
+    parser.add_argument( "--burst-multiplier", type=float, default=10 )
+    args = parser.parse_args()
+    generator = ItchGenerator( args.seed, args.symbols, args.rate, args.burst_probability, args.burst_multiplier )
+    written = generator.writeFile( args.fileName, args.messageCount )
+    print( "Wrote {} messages, {} bytes to file: {}".format( args.messageCount, written, args.fileName ) )
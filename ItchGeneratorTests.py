@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+import collections
+import os
+import tempfile
+import unittest
+
+from Itch41 import *
+from ItchGenerator import *
+from ItchOrderBook import OrderBookEngine
+from ItchReader import ItchReader
+
+class ItchGenerator_Test(unittest.TestCase):
+    """ Tests for the synthetic Itch 4.1 load generator """
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join( self.tempDir.name, "generated.itch" )
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def readTypes(self, fileName):
+        with ItchReader( fileName ) as reader:
+            return [ message.MessageType for message in reader.messages() ]
+
+    def test_same_seed_same_bytes(self):
+        # GIVEN
+        otherFileName = os.path.join( self.tempDir.name, "other.itch" )
+
+        # WHEN
+        ItchGenerator( seed=7, symbolCount=20 ).writeFile( self.fileName, 5000 )
+        ItchGenerator( seed=7, symbolCount=20 ).writeFile( otherFileName, 5000 )
+
+        # THEN
+        with open( self.fileName, 'rb' ) as first, open( otherFileName, 'rb' ) as second:
+            self.assertEqual( first.read(), second.read() )
+
+    def test_different_seed_different_bytes(self):
+        # GIVEN
+        otherFileName = os.path.join( self.tempDir.name, "other.itch" )
+
+        # WHEN
+        ItchGenerator( seed=1, symbolCount=20 ).writeFile( self.fileName, 2000 )
+        ItchGenerator( seed=2, symbolCount=20 ).writeFile( otherFileName, 2000 )
+
+        # THEN
+        with open( self.fileName, 'rb' ) as first, open( otherFileName, 'rb' ) as second:
+            self.assertNotEqual( first.read(), second.read() )
+
+    def test_header_and_message_count(self):
+        # GIVEN
+        generator = ItchGenerator( seed=3, symbolCount=50 )
+
+        # WHEN
+        generator.writeFile( self.fileName, 3000 )
+        types = self.readTypes( self.fileName )
+
+        # THEN
+        self.assertEqual( len( types ), 3000 )
+        self.assertEqual( types[ : 3 ], [ 'T', 'S', 'S' ] )
+        self.assertEqual( types[ 3 : 53 ], [ 'R' ] * 50 )
+        self.assertEqual( types[ 53 ], 'S' )
+        self.assertEqual( len( set( generator.symbols ) ), 50 )
+
+    def test_truncated_count(self):
+        # GIVEN
+        generator = ItchGenerator( seed=3, symbolCount=50 )
+
+        # WHEN
+        generated = list( generator.generate( 10 ) )
+
+        # THEN
+        self.assertEqual( len( generated ), 10 )
+
+    def test_timestamps_every_second(self):
+        # GIVEN
+        generator = ItchGenerator( seed=4, symbolCount=10, messagesPerSecond=1000, burstProbability=0 )
+
+        # WHEN
+        generator.writeFile( self.fileName, 5000 )
+        with ItchReader( self.fileName ) as reader:
+            seconds = [ message.Seconds for message in reader.messages()
+                        if message.MessageType == MessageType.TimeStamp.value ]
+
+        # THEN
+        self.assertEqual( seconds[0], 34200 )
+        self.assertGreater( len( seconds ), 3 )
+        self.assertEqual( seconds, sorted( set( seconds ) ) )
+
+    def test_events_only_touch_live_orders(self):
+        # GIVEN
+        generator = ItchGenerator( seed=5, symbolCount=30, minLiveOrders=200 )
+        live = { }
+
+        # WHEN
+        generator.writeFile( self.fileName, 20000 )
+
+        # THEN
+        with ItchReader( self.fileName ) as reader:
+            for message in reader.messages():
+                messageType = message.MessageType
+                if messageType in ( 'A', 'F' ):
+                    self.assertNotIn( message.OrderRefNum, live )
+                    live[ message.OrderRefNum ] = message.Shares
+                elif messageType in ( 'E', 'C', 'X' ):
+                    self.assertLessEqual( message.Shares, live[ message.OrderRefNum ] )
+                    live[ message.OrderRefNum ] -= message.Shares
+                    if live[ message.OrderRefNum ] == 0:
+                        del live[ message.OrderRefNum ]
+                elif messageType == 'D':
+                    del live[ message.OrderRefNum ]
+                elif messageType == 'U':
+                    del live[ message.OrderRefNum ]
+                    live[ message.NewOrderRefNum ] = message.Shares
+        self.assertEqual( live, { order[0]: order[3] for order in generator.liveOrders } )
+
+    def test_book_matches_live_orders(self):
+        # GIVEN
+        generator = ItchGenerator( seed=6, symbolCount=30 )
+        generator.writeFile( self.fileName, 20000 )
+
+        # WHEN
+        engine = OrderBookEngine()
+        engine.applyFile( self.fileName )
+
+        # THEN
+        self.assertEqual( len( engine.orders ), len( generator.liveOrders ) )
+        for order in generator.liveOrders:
+            self.assertEqual( engine.orders[ order[0] ][2], order[3] )
+
+    def test_mix_is_respected(self):
+        # GIVEN
+        mix = { MessageType.AddOrder: 1, MessageType.OrderDelete: 1 }
+        generator = ItchGenerator( seed=8, symbolCount=5, mix=mix, minLiveOrders=10 )
+
+        # WHEN
+        generator.writeFile( self.fileName, 4000 )
+        counts = collections.Counter( self.readTypes( self.fileName ) )
+
+        # THEN
+        self.assertEqual( set( counts ) - { 'T', 'S', 'R' }, { 'A', 'D' } )
+
+    def test_prices_are_positive(self):
+        # GIVEN
+        generator = ItchGenerator( seed=0, symbolCount=2000 )
+        priceTypes = { MessageType.AddOrder, MessageType.AddOrderWithMPID, MessageType.OrderReplace }
+        priceCodecs = set( generator.codecs[ messageType ] for messageType in priceTypes )
+
+        # WHEN
+        prices = [ values[ codec.fields.index( Field.Price ) ]
+                   for codec, values in generator.generate( 50000 ) if codec in priceCodecs ]
+
+        # THEN
+        self.assertGreater( len( prices ), 10000 )
+        self.assertGreater( min( prices ), 0 )
+
+    def test_no_live_orders_falls_back_to_add(self):
+        # GIVEN
+        mix = { MessageType.OrderDelete: 1 }
+        generator = ItchGenerator( seed=10, symbolCount=5, mix=mix, minLiveOrders=0 )
+
+        # WHEN
+        types = [ values[0] for codec, values in generator.generate( 1000 ) ]
+
+        # THEN
+        orderTypes = [ messageType for messageType in types[ 9: ] if messageType != b'T' ]
+        self.assertEqual( [ b'A', b'D' ] * 10, orderTypes[ :20 ] )
+
+    def test_unsupported_mix_type(self):
+        # GIVEN
+        generator = ItchGenerator( seed=9, symbolCount=5, mix={ MessageType.BrokenTrade: 1 }, minLiveOrders=1 )
+
+        # WHEN / THEN
+        with self.assertRaises( ValueError ):
+            list( generator.generate( 100 ) )
+
+    def test_no_symbols_raises(self):
+        with self.assertRaises( ValueError ):
+            ItchGenerator( seed=11, symbolCount=0 )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import argparse
+import mmap
+import os
+import struct
+
+from Itch41 import *
+from ItchReader import ItchReader
+
+# Sidecar index layout (little endian, fixed width so it can be memory mapped):
+#   header: magic, version, interval, data file size, data file mtime (ns), entry count
+#   entry:  byte offset, message number, TimeStamp seconds in effect at that message
+indexMagic = b'ITCHIDX1'
+indexVersion = 1
+indexHeader = struct.Struct( '<8sIIQQQ' )
+indexEntry = struct.Struct( '<QQI4x' )
+defaultInterval = 4096
+
+class StaleIndexError(ValueError):
+    pass
+
+def indexFileNameFor(fileName):
+    return fileName + '.idx'
+
+def parseTime(value):
+    """ Seconds past midnight from an int or an "HH:MM[:SS]" string. """
+    if isinstance( value, int ):
+        return value
+    parts = [ int( part ) for part in value.split( ':' ) ]
+    parts += [ 0 ] * ( 3 - len( parts ) )
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+def buildIndex(fileName, indexFileName=None, interval=defaultInterval):
+    """ Writes a sidecar index with every interval'th message of fileName. """
+    if fileName.endswith( '.gz' ):
+        raise ValueError( "Cannot index a compressed file: {}".format( fileName ) )
+    indexFileName = indexFileName or indexFileNameFor( fileName )
+    stat = os.stat( fileName )
+    secondsAccessor = TimeStamp._codec.accessors[ Field.Seconds ]
+    secondsStruct, secondsStart = secondsAccessor[0], secondsAccessor[1]
+    timeStampByte = ord( MessageType.TimeStamp.value )
+
+    count = 0
+    seconds = 0
+    with open( indexFileName, 'wb' ) as indexOut, ItchReader( fileName ) as reader:
+        indexOut.write( bytes( indexHeader.size ) )
+        entries = bytearray()
+        number = 0
+        for buffer, offset in reader.frames():
+            if buffer[ offset + 2 ] == timeStampByte:
+                seconds = secondsStruct.unpack_from( buffer, offset + secondsStart )[0]
+            if number % interval == 0:
+                entries += indexEntry.pack( offset, number, seconds )
+                count += 1
+                if len( entries ) >= 1 << 20:
+                    indexOut.write( entries )
+                    entries.clear()
+            number += 1
+        indexOut.write( entries )
+        indexOut.seek( 0 )
+        indexOut.write( indexHeader.pack( indexMagic, indexVersion, interval,
+                                          stat.st_size, stat.st_mtime_ns, count ) )
+    return indexFileName
+
+class ItchIndex:
+    """ Memory mapped view of a sidecar index file. """
+
+    def __init__(self, indexFileName):
+        with open( indexFileName, 'rb' ) as indexIn:
+            self.mapped = mmap.mmap( indexIn.fileno(), 0, access=mmap.ACCESS_READ )
+        magic, version, self.interval, self.fileSize, self.mtimeNs, self.count = \
+            indexHeader.unpack_from( self.mapped, 0 )
+        if magic != indexMagic or version != indexVersion:
+            self.mapped.close()
+            raise ValueError( "Not an Itch index file: {}".format( indexFileName ) )
+
+    def close(self):
+        self.mapped.close()
+
+    def isStaleFor(self, fileName):
+        stat = os.stat( fileName )
+        return stat.st_size != self.fileSize or stat.st_mtime_ns != self.mtimeNs
+
+    def entry(self, position):
+        return indexEntry.unpack_from( self.mapped, indexHeader.size + position * indexEntry.size )
+
+    def entryForMessage(self, number):
+        return self.entry( min( number // self.interval, self.count - 1 ) )
+
+    def entryBeforeTime(self, seconds):
+        # Last entry whose TimeStamp is still before seconds
+        low, high = 0, self.count
+        while low < high:
+            middle = ( low + high ) // 2
+            if self.entry( middle )[2] < seconds:
+                low = middle + 1
+            else:
+                high = middle
+        return self.entry( max( low - 1, 0 ) )
+
+class IndexedItchFile:
+    """ Random access into an Itch file by message number or TimeStamp seconds.
+
+        The sidecar index is rebuilt when missing or stale (file size or mtime
+        changed) unless rebuild is False, in which case StaleIndexError is raised.
+    """
+
+    def __init__(self, fileName, indexFileName=None, interval=defaultInterval, rebuild=True):
+        self.fileName = fileName
+        indexFileName = indexFileName or indexFileNameFor( fileName )
+        index = None
+        if os.path.exists( indexFileName ):
+            index = ItchIndex( indexFileName )
+            if index.isStaleFor( fileName ):
+                index.close()
+                index = None
+        if index is None:
+            if not rebuild:
+                raise StaleIndexError( "Index missing or stale for {}".format( fileName ) )
+            buildIndex( fileName, indexFileName, interval )
+            index = ItchIndex( indexFileName )
+        self.index = index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.index.close()
+
+    def viewsFrom(self, offset):
+        with open( self.fileName, 'rb' ) as fileIn:
+            fileIn.seek( offset )
+            for view in ItchReader( fileIn ):
+                yield view
+
+    def seekMessage(self, number):
+        """ Yields views starting at message number (0 based). """
+        if self.index.count == 0:
+            return
+        offset, entryNumber, _ = self.index.entryForMessage( number )
+        for view in self.viewsFrom( offset ):
+            if entryNumber >= number:
+                yield view
+            entryNumber += 1
+
+    def seekTime(self, value):
+        """ Yields views starting at the first TimeStamp at or after value. """
+        seconds = parseTime( value )
+        if self.index.count == 0:
+            return
+        offset, _, _ = self.index.entryBeforeTime( seconds )
+        timeStamp = MessageType.TimeStamp.value
+        started = False
+        for view in self.viewsFrom( offset ):
+            if not started:
+                started = view.MessageType == timeStamp and view.Seconds >= seconds
+            if started:
+                yield view
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="Build a sidecar message index for an Itch 4.1 file" )
+    parser.add_argument( "fileName" )
+    parser.add_argument( "--interval", type=int, default=defaultInterval )
+    parser.add_argument( "--output", default=None )
+    args = parser.parse_args()
+    print( "Wrote index: {}".format( buildIndex( args.fileName, args.output, args.interval ) ) )
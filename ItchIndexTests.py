@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+
+from Itch41 import *
+from ItchIndex import *
+from ItchReader import ItchReader
+
+class ItchIndex_Test(unittest.TestCase):
+    """ Tests for the sidecar message index and random access reader """
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join( self.tempDir.name, "Itch.index.dat" )
+        # 34200 = 09:30:00, one TimeStamp followed by 9 AddOrders per second
+        with open( self.fileName, 'wb' ) as fileOut:
+            for second in range( 34190, 34210 ):
+                message = ItchMessageFactory.createFromArgs( [ MessageType.TimeStamp, { Field.Seconds: second } ] )
+                fileOut.write( message.rawMessage )
+                for order in range( 9 ):
+                    message = ItchMessageFactory.createFromArgs( [ MessageType.AddOrder, {
+                                    Field.NanoSeconds : order,
+                                    Field.OrderRefNum : second * 10 + order,
+                                    Field.Side        : 'B',
+                                    Field.Shares      : 100,
+                                    Field.Stock       : "AAPL",
+                                    Field.Price       : 100.25 } ] )
+                    fileOut.write( message.rawMessage )
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_index_entries(self):
+        # WHEN
+        index = ItchIndex( buildIndex( self.fileName, interval=16 ) )
+
+        # THEN
+        self.assertEqual(  16, index.interval )
+        self.assertEqual(  13, index.count )
+        self.assertEqual( ( 0, 0, 34190 ), index.entry( 0 ) )
+        self.assertEqual( 34191, index.entry( 1 )[2] )
+        self.assertFalse( index.isStaleFor( self.fileName ) )
+        index.close()
+
+    def test_seek_message(self):
+        # GIVEN
+        with ItchReader( self.fileName ) as reader:
+            expected = [ view.rawBytes() for view in reader ]
+
+        # WHEN
+        with IndexedItchFile( self.fileName, interval=16 ) as indexed:
+            fromMiddle = [ view.rawBytes() for view in indexed.seekMessage( 137 ) ]
+            fromStart = [ view.rawBytes() for view in indexed.seekMessage( 0 ) ]
+
+        # THEN
+        self.assertEqual( expected[137:], fromMiddle )
+        self.assertEqual( expected, fromStart )
+
+    def test_seek_time(self):
+        # WHEN
+        with IndexedItchFile( self.fileName, interval=8 ) as indexed:
+            views = indexed.seekTime( "09:30" )
+            first = next( views ).detach()
+            second = next( views ).detach()
+            views.close()
+
+        # THEN
+        self.assertEqual(   'T', first.MessageType )
+        self.assertEqual( 34200, first.Seconds )
+        self.assertEqual( 342000, second.OrderRefNum )
+
+    def test_stale_index(self):
+        # GIVEN
+        IndexedItchFile( self.fileName, interval=8 ).close()
+        with open( self.fileName, 'ab' ) as fileOut:
+            fileOut.write( ItchMessageFactory.createFromArgs( [ MessageType.TimeStamp, { Field.Seconds: 40000 } ] ).rawMessage )
+
+        # WHEN / THEN
+        with self.assertRaises( StaleIndexError ):
+            IndexedItchFile( self.fileName, rebuild=False )
+        with IndexedItchFile( self.fileName, interval=8 ) as indexed:
+            self.assertEqual( 40000, next( indexed.seekTime( 39000 ) ).detach().Seconds )
+
+if __name__ == "__main__":
+    unittest.main()
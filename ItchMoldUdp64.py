@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import heapq
+import random
+import socket
+import struct
+
+from Itch41 import *
+from ItchReader import ItchReader
+
+# Session, sequence number of the first message, message count
+moldHeader = struct.Struct( '>10sQH' )
+heartbeatCount = 0
+endOfSessionCount = 0xFFFF
+defaultMaxPacketSize = 1400
+defaultRetryInterval = 0.05
+defaultMaxRequestCount = 1000
+defaultReceiveBufferSize = 1 << 23
+
+def moldPacket(session, sequence, frames=(), count=None):
+    """ Downstream packet; frames are length prefixed Itch frames, which is
+        exactly the MoldUDP64 message block layout.
+    """
+    if count is None:
+        count = len( frames )
+    return moldHeader.pack( session, sequence, count ) + b''.join( frames )
+
+def requestPacket(session, sequence, count):
+    return moldHeader.pack( session, sequence, count )
+
+def packetizeFrames(frames, maxPacketSize=defaultMaxPacketSize):
+    """ Groups frames into as few packets as fit in maxPacketSize; yields
+        ( index of first frame, frames ).
+    """
+    first = 0
+    group = [ ]
+    size = moldHeader.size
+    for index, frame in enumerate( frames ):
+        if group and size + len( frame ) > maxPacketSize:
+            yield first, group
+            first, group, size = index, [ ], moldHeader.size
+        group.append( frame )
+        size += len( frame )
+    if group:
+        yield first, group
+
+def messageConsumer(onMessage):
+    """ Frame consumer decoding through ItchMessageFactory.createFromBytes. """
+    createFromBytes = ItchMessageFactory.createFromBytes
+    def consume(buffer, offset):
+        end = offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0]
+        message = createFromBytes( bytes( buffer[ offset : end ] ) )
+        if message is not None:
+            onMessage( message )
+    return consume
+
+class MoldSequencer:
+    """ Puts MoldUDP64 messages back in sequence order; no sockets involved.
+
+        packetReceived() walks the message blocks of a packet in place and
+        hands each in-sequence message to consumer(buffer, offset) as a
+        length prefixed Itch frame, the same shape ItchReader.frames()
+        yields. Messages ahead of the next expected sequence number are
+        copied aside (up to maxBuffered) and delivered once the gap before
+        them is filled; repeats are dropped. missing() reports the gap to
+        request from a rewind server.
+
+        With nextSequence None the sequencer joins at the first message it
+        sees rather than recovering the session from 1.
+    """
+
+    def __init__(self, consumer, nextSequence=None, maxBuffered=1 << 20):
+        self.consumer = consumer
+        self.session = None
+        self.nextSequence = nextSequence
+        self.maxBuffered = maxBuffered
+        self.pending = { }
+        # Heap of pending sequence numbers, so the end of the current gap is cheap to find
+        self.pendingOrder = [ ]
+        self.highWater = nextSequence or 0
+        self.endSequence = None
+        self.delivered = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.gapsDetected = 0
+        self.packets = 0
+
+    def packetReceived(self, data):
+        session, sequence, count = moldHeader.unpack_from( data )
+        if self.session is None:
+            self.session = session
+        elif session != self.session:
+            return
+        self.packets += 1
+        if self.nextSequence is None:
+            self.nextSequence = self.highWater = sequence
+
+        if count == endOfSessionCount:
+            self.endSequence = sequence
+            self.raiseHighWater( sequence, sequence )
+            return
+        if count == heartbeatCount:
+            self.raiseHighWater( sequence, sequence )
+            return
+
+        buffer = memoryview( data )
+        offset = moldHeader.size
+        end = sequence + count
+        self.raiseHighWater( sequence, end )
+        for sequence in range( sequence, end ):
+            frameEnd = offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0]
+            if sequence == self.nextSequence:
+                self.consumer( buffer, offset )
+                self.delivered += 1
+                self.nextSequence += 1
+                if self.pending:
+                    self.drainPending()
+            elif sequence < self.nextSequence or sequence in self.pending:
+                self.duplicates += 1
+            elif len( self.pending ) < self.maxBuffered:
+                self.pending[ sequence ] = bytes( buffer[ offset : frameEnd ] )
+                heapq.heappush( self.pendingOrder, sequence )
+            else:
+                self.dropped += 1
+            offset = frameEnd
+
+    def raiseHighWater(self, first, end):
+        # Anything starting past the highest sequence seen so far means messages nobody has seen
+        if first > self.highWater:
+            self.gapsDetected += 1
+        if end > self.highWater:
+            self.highWater = end
+
+    def drainPending(self):
+        pending = self.pending
+        consumer = self.consumer
+        while self.nextSequence in pending:
+            consumer( pending.pop( self.nextSequence ), 0 )
+            self.delivered += 1
+            self.nextSequence += 1
+
+    def missing(self):
+        """ ( first missing sequence number, count ) or None. """
+        if self.nextSequence is None:
+            return None
+        if self.pending:
+            pendingOrder = self.pendingOrder
+            while pendingOrder[0] < self.nextSequence:
+                heapq.heappop( pendingOrder )
+            return self.nextSequence, pendingOrder[0] - self.nextSequence
+        if self.highWater > self.nextSequence:
+            return self.nextSequence, self.highWater - self.nextSequence
+        return None
+
+    def complete(self):
+        return self.endSequence is not None and self.nextSequence == self.endSequence
+
+class MoldUdp64Receiver(asyncio.DatagramProtocol):
+    """ Asyncio MoldUDP64 receiver with gap recovery from a rewind server.
+
+        Feeds a MoldSequencer with every datagram. Whenever a gap is open a
+        request packet for it (at most maxRequestCount messages) is sent to
+        rewindAddress: immediately when the gap is new or has moved, and
+        again every retryInterval while it stays open. wait() returns the
+        number of messages delivered once End of Session has been seen and
+        everything before it delivered.
+    """
+
+    def __init__(self, consumer, rewindAddress=None, nextSequence=None, retryInterval=defaultRetryInterval,
+                 maxRequestCount=defaultMaxRequestCount, receiveBufferSize=defaultReceiveBufferSize):
+        self.sequencer = MoldSequencer( consumer, nextSequence )
+        self.receiveBufferSize = receiveBufferSize
+        self.rewindAddress = rewindAddress
+        self.retryInterval = retryInterval
+        self.maxRequestCount = maxRequestCount
+        self.transport = None
+        self.requests = 0
+        self.lastRequested = None
+        self.lastRequestTime = 0
+        self.loop = asyncio.get_running_loop()
+        self.finished = self.loop.create_future()
+        self.retryTimer = None
+
+    @classmethod
+    async def listen(cls, host, port, consumer, rewindAddress=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        _, receiver = await loop.create_datagram_endpoint( lambda: cls( consumer, rewindAddress, **kwargs ),
+                                                           local_addr=( host, port ) )
+        return receiver
+
+    @property
+    def address(self):
+        return self.transport.get_extra_info( 'sockname' )
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.receiveBufferSize:
+            # The kernel caps this at net.core.rmem_max; a bigger buffer rides out bursts
+            transport.get_extra_info( 'socket' ).setsockopt( socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                                             self.receiveBufferSize )
+        self.retryTimer = self.loop.call_later( self.retryInterval, self.retry )
+
+    def datagram_received(self, data, addr):
+        sequencer = self.sequencer
+        sequencer.packetReceived( data )
+        if sequencer.complete():
+            self.finish()
+        elif sequencer.highWater > sequencer.nextSequence:
+            self.requestGap( False )
+
+    def retry(self):
+        self.requestGap( True )
+        if not self.finished.done():
+            self.retryTimer = self.loop.call_later( self.retryInterval, self.retry )
+
+    def requestGap(self, force):
+        if self.rewindAddress is None:
+            return
+        now = self.loop.time()
+        if not force and self.sequencer.nextSequence == self.lastRequested and \
+           now - self.lastRequestTime < self.retryInterval:
+            return
+        gap = self.sequencer.missing()
+        if gap is None:
+            return
+        self.lastRequested = gap[0]
+        self.lastRequestTime = now
+        self.requests += 1
+        self.transport.sendto( requestPacket( self.sequencer.session, gap[0], min( gap[1], self.maxRequestCount ) ),
+                               self.rewindAddress )
+
+    def finish(self):
+        if not self.finished.done():
+            self.finished.set_result( self.sequencer.delivered )
+
+    def error_received(self, exc):
+        pass
+
+    def connection_lost(self, exc):
+        if self.retryTimer is not None:
+            self.retryTimer.cancel()
+        if not self.finished.done():
+            self.finished.set_exception( exc or ConnectionError( "Receiver closed before End of Session" ) )
+
+    async def wait(self):
+        return await self.finished
+
+    def close(self):
+        if self.retryTimer is not None:
+            self.retryTimer.cancel()
+        self.transport.close()
+
+class MoldUdp64Rewind(asyncio.DatagramProtocol):
+    def __init__(self, feed):
+        self.feed = feed
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        packet = self.feed.rewindPacket( data )
+        if packet is not None and not self.feed.lose( self.feed.rewindLossRate ):
+            self.transport.sendto( packet, addr )
+
+class MoldUdp64Feed:
+    """ Local stand-in for a MoldUDP64 feed and its rewind server.
+
+        publish() sends the messages of fileName as MoldUDP64 packets of up
+        to maxPacketSize bytes over UDP (loopback unicast standing in for
+        multicast), then End of Session. Each data packet is dropped with
+        probability lossRate, and held back behind the next one with
+        probability reorderRate; End of Session is repeated endRepeats
+        times. The rewind server started by startRewind() answers request
+        packets from the same messages, losing replies with probability
+        rewindLossRate. All randomness comes from seed.
+    """
+
+    def __init__(self, fileName, session="FEED", maxPacketSize=defaultMaxPacketSize, lossRate=0.0,
+                 reorderRate=0.0, rewindLossRate=0.0, seed=0, endRepeats=3):
+        self.session = session.ljust( 10 ).encode()
+        self.maxPacketSize = maxPacketSize
+        self.lossRate = lossRate
+        self.reorderRate = reorderRate
+        self.rewindLossRate = rewindLossRate
+        self.random = random.Random( seed )
+        self.endRepeats = endRepeats
+        self.frames = self.readFrames( fileName )
+        self.rewind = None
+        self.sent = 0
+        self.lost = 0
+        self.reordered = 0
+        self.rewound = 0
+
+    def readFrames(self, fileName):
+        with ItchReader( fileName ) as reader:
+            return [ bytes( buffer[ offset : offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0] ] )
+                     for buffer, offset in reader.frames() ]
+
+    def lose(self, rate):
+        return rate and self.random.random() < rate
+
+    def packets(self):
+        for first, frames in packetizeFrames( self.frames, self.maxPacketSize ):
+            yield moldPacket( self.session, first + 1, frames )
+
+    def endOfSession(self):
+        return moldPacket( self.session, len( self.frames ) + 1, count=endOfSessionCount )
+
+    def rewindPacket(self, request):
+        session, sequence, count = moldHeader.unpack_from( request )
+        if session != self.session or sequence < 1:
+            return None
+        frames = [ ]
+        size = moldHeader.size
+        for frame in self.frames[ sequence - 1 : sequence - 1 + count ]:
+            if frames and size + len( frame ) > self.maxPacketSize:
+                break
+            frames.append( frame )
+            size += len( frame )
+        self.rewound += len( frames )
+        return moldPacket( self.session, sequence, frames )
+
+    async def startRewind(self, host='127.0.0.1', port=0):
+        loop = asyncio.get_running_loop()
+        transport, self.rewind = await loop.create_datagram_endpoint( lambda: MoldUdp64Rewind( self ),
+                                                                      local_addr=( host, port ) )
+        return transport.get_extra_info( 'sockname' )
+
+    async def publish(self, address, yieldEvery=1):
+        """ Sends every packet once, subject to loss and reordering, then End of Session. """
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint( asyncio.DatagramProtocol, remote_addr=address )
+        try:
+            held = None
+            for count, packet in enumerate( self.packets() ):
+                if self.lose( self.lossRate ):
+                    self.lost += 1
+                    continue
+                if held is None and self.lose( self.reorderRate ):
+                    held = packet
+                    self.reordered += 1
+                    continue
+                transport.sendto( packet )
+                self.sent += 1
+                if held is not None:
+                    transport.sendto( held )
+                    self.sent += 1
+                    held = None
+                if count % yieldEvery == 0:
+                    # asyncio reads one datagram per loop pass: let a receiver on the same loop keep up
+                    await asyncio.sleep( 0 )
+            if held is not None:
+                transport.sendto( held )
+                self.sent += 1
+            for _ in range( self.endRepeats ):
+                transport.sendto( self.endOfSession() )
+                await asyncio.sleep( 0 )
+        finally:
+            transport.close()
+
+    def close(self):
+        if self.rewind is not None:
+            self.rewind.transport.close()
+
+async def loopback(fileName, lossRate, reorderRate, seed):
+    counts = { }
+    def count(buffer, offset):
+        messageType = chr( buffer[ offset + 2 ] )
+        counts[ messageType ] = counts.get( messageType, 0 ) + 1
+    feed = MoldUdp64Feed( fileName, lossRate=lossRate, reorderRate=reorderRate, seed=seed )
+    rewindAddress = await feed.startRewind()
+    receiver = await MoldUdp64Receiver.listen( '127.0.0.1', 0, count, rewindAddress, nextSequence=1 )
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await feed.publish( receiver.address )
+    delivered = await receiver.wait()
+    elapsed = loop.time() - start
+    receiver.close()
+    feed.close()
+    print( "Delivered {} messages in {:.2f}s ({:,.0f} msg/s): lost {} reordered {} packets, "
+           "{} requests, {} messages rewound".format( delivered, elapsed, delivered / elapsed, feed.lost,
+                                                      feed.reordered, receiver.requests, feed.rewound ) )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="MoldUDP64 loopback test: lossy feed, rewind server and receiver" )
+    parser.add_argument( "fileName" )
+    parser.add_argument( "--loss", type=float, default=0.01, help="fraction of data packets dropped" )
+    parser.add_argument( "--reorder", type=float, default=0.01, help="fraction of data packets sent late" )
+    parser.add_argument( "--seed", type=int, default=0 )
+    args = parser.parse_args()
+    asyncio.run( loopback( args.fileName, args.loss, args.reorder, args.seed ) )
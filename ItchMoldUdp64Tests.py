@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+
+from Itch41 import *
+from ItchMoldUdp64 import *
+
+sampleFile = "SamplesMessages/T.50.itch"
+session = b"TEST      "
+
+def frame(orderRefNum):
+    return bytes( ItchMessageFactory.createFromArgs( [ MessageType.OrderDelete,
+                  { Field.NanoSeconds: orderRefNum, Field.OrderRefNum: orderRefNum } ] ).rawMessage )
+
+class Collector:
+    def __init__(self):
+        self.frames = [ ]
+
+    def __call__(self, buffer, offset):
+        self.frames.append( bytes( buffer[ offset : offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0] ] ) )
+
+class ItchMoldUdp64_Sequencer_Test(unittest.TestCase):
+    """ Tests for putting MoldUDP64 messages back in sequence """
+
+    def setUp(self):
+        self.collector = Collector()
+        self.sequencer = MoldSequencer( self.collector, nextSequence=1 )
+        self.frames = [ frame( number ) for number in range( 1, 11 ) ]
+
+    def send(self, first, last):
+        self.sequencer.packetReceived( moldPacket( session, first, self.frames[ first - 1 : last ] ) )
+
+    def test_in_order(self):
+        # GIVEN / WHEN
+        self.send( 1, 3 )
+        self.send( 4, 10 )
+
+        # THEN
+        self.assertEqual( self.collector.frames, self.frames )
+        self.assertIsNone( self.sequencer.missing() )
+
+    def test_gap_is_buffered_then_filled(self):
+        # GIVEN
+        self.send( 1, 2 )
+        self.send( 6, 8 )
+
+        # WHEN
+        gap = self.sequencer.missing()
+        self.send( 3, 5 )
+
+        # THEN
+        self.assertEqual( gap, ( 3, 3 ) )
+        self.assertEqual( self.sequencer.gapsDetected, 1 )
+        self.assertEqual( self.collector.frames, self.frames[ : 8 ] )
+        self.assertEqual( self.sequencer.pending, { } )
+
+    def test_duplicates_dropped(self):
+        # GIVEN
+        self.send( 1, 4 )
+        self.send( 7, 8 )
+
+        # WHEN
+        self.send( 3, 5 )
+        self.send( 7, 7 )
+
+        # THEN
+        self.assertEqual( self.sequencer.duplicates, 3 )
+        self.assertEqual( self.collector.frames, self.frames[ : 5 ] )
+        self.assertEqual( self.sequencer.missing(), ( 6, 1 ) )
+
+    def test_heartbeat_reveals_gap(self):
+        # GIVEN
+        self.send( 1, 2 )
+
+        # WHEN
+        self.sequencer.packetReceived( moldPacket( session, 5, count=heartbeatCount ) )
+
+        # THEN
+        self.assertEqual( self.sequencer.missing(), ( 3, 2 ) )
+
+    def test_end_of_session(self):
+        # GIVEN
+        self.send( 1, 9 )
+        self.sequencer.packetReceived( moldPacket( session, 11, count=endOfSessionCount ) )
+        self.assertFalse( self.sequencer.complete() )
+
+        # WHEN
+        self.send( 10, 10 )
+
+        # THEN
+        self.assertTrue( self.sequencer.complete() )
+
+    def test_other_session_ignored(self):
+        # GIVEN
+        self.send( 1, 1 )
+
+        # WHEN
+        self.sequencer.packetReceived( moldPacket( b"OTHER     ", 2, self.frames[ 1 : 2 ] ) )
+
+        # THEN
+        self.assertEqual( len( self.collector.frames ), 1 )
+
+    def test_join_late(self):
+        # GIVEN
+        sequencer = MoldSequencer( self.collector )
+
+        # WHEN
+        sequencer.packetReceived( moldPacket( session, 5, self.frames[ 4 : 6 ] ) )
+
+        # THEN
+        self.assertEqual( self.collector.frames, self.frames[ 4 : 6 ] )
+        self.assertIsNone( sequencer.missing() )
+
+    def test_packetize(self):
+        # GIVEN / WHEN
+        packets = list( packetizeFrames( self.frames, moldHeader.size + 3 * len( self.frames[0] ) ) )
+
+        # THEN
+        self.assertEqual( [ first for first, _ in packets ], [ 0, 3, 6, 9 ] )
+        self.assertEqual( sum( ( group for _, group in packets ), [ ] ), self.frames )
+
+class ItchMoldUdp64_Loopback_Test(unittest.IsolatedAsyncioTestCase):
+    """ Tests for recovery through the lossy feed and rewind stand-in """
+
+    async def replay(self, consumer, **feedArgs):
+        feed = MoldUdp64Feed( sampleFile, maxPacketSize=120, **feedArgs )
+        rewindAddress = await feed.startRewind()
+        receiver = await MoldUdp64Receiver.listen( '127.0.0.1', 0, consumer, rewindAddress, nextSequence=1,
+                                                   retryInterval=0.01 )
+        try:
+            await feed.publish( receiver.address )
+            delivered = await asyncio.wait_for( receiver.wait(), 10 )
+        finally:
+            receiver.close()
+            feed.close()
+        return feed, receiver, delivered
+
+    async def test_lossless(self):
+        # GIVEN
+        collector = Collector()
+
+        # WHEN
+        feed, receiver, delivered = await self.replay( collector )
+
+        # THEN
+        self.assertEqual( collector.frames, feed.frames )
+        self.assertEqual( delivered, len( feed.frames ) )
+        self.assertEqual( receiver.requests, 0 )
+
+    async def test_recovers_loss_and_reordering(self):
+        # GIVEN
+        collector = Collector()
+
+        # WHEN
+        feed, receiver, _ = await self.replay( collector, lossRate=0.3, reorderRate=0.3, rewindLossRate=0.3, seed=1 )
+
+        # THEN
+        self.assertGreater( feed.lost, 0 )
+        self.assertGreater( feed.reordered, 0 )
+        self.assertGreater( receiver.requests, 0 )
+        self.assertEqual( collector.frames, feed.frames )
+
+    async def test_decoded_messages(self):
+        # GIVEN
+        messages = [ ]
+
+        # WHEN
+        feed, _, _ = await self.replay( messageConsumer( messages.append ), lossRate=0.2, seed=2 )
+
+        # THEN
+        self.assertEqual( [ bytes( message.rawMessage ) for message in messages ], feed.frames )
+
+if __name__ == '__main__':
+    unittest.main()
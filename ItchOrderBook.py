@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+import bisect
+
+from Itch41 import *
+from ItchReader import ItchReader
+
+# Prices throughout are the raw fixed point integers from the feed (4 implied decimals)
+pricePrecision = 10000
+defaultBucketSize = 256
+
+def padStock(stock):
+    return stock.ljust( 8 ).encode()
+
+class SortedPrices:
+    """ Ascending distinct prices in a list of sorted buckets of at most
+        2 * bucketSize prices, with the last price of every bucket kept
+        alongside for a binary search.
+
+        add() and remove() are a bisect over the bucket maxima plus an insert
+        or delete within one bucket, so O(log n) with a bounded memmove;
+        first() and last() are O(1) and lowest( count ) / highest( count )
+        are O(log n + count).
+    """
+    __slots__ = ( 'buckets', 'maxima', 'count', 'bucketSize' )
+
+    def __init__(self, bucketSize=defaultBucketSize):
+        self.bucketSize = bucketSize
+        self.buckets = [ ]
+        self.maxima = [ ]
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, price):
+        buckets, maxima = self.buckets, self.maxima
+        self.count += 1
+        if not buckets:
+            buckets.append( [ price ] )
+            maxima.append( price )
+            return
+        position = bisect.bisect_left( maxima, price )
+        if position == len( maxima ):
+            position -= 1
+        bucket = buckets[ position ]
+        bisect.insort( bucket, price )
+        maxima[ position ] = bucket[-1]
+        if len( bucket ) > 2 * self.bucketSize:
+            upper = bucket[ self.bucketSize : ]
+            del bucket[ self.bucketSize : ]
+            maxima[ position ] = bucket[-1]
+            buckets.insert( position + 1, upper )
+            maxima.insert( position + 1, upper[-1] )
+
+    def remove(self, price):
+        buckets, maxima = self.buckets, self.maxima
+        position = bisect.bisect_left( maxima, price )
+        bucket = buckets[ position ]
+        del bucket[ bisect.bisect_left( bucket, price ) ]
+        self.count -= 1
+        if bucket:
+            maxima[ position ] = bucket[-1]
+        else:
+            del buckets[ position ]
+            del maxima[ position ]
+
+    def first(self):
+        return self.buckets[0][0]
+
+    def last(self):
+        return self.buckets[-1][-1]
+
+    def lowest(self, count):
+        prices = [ ]
+        for bucket in self.buckets:
+            if len( prices ) >= count:
+                break
+            prices.extend( bucket[ : count - len( prices ) ] )
+        return prices
+
+    def highest(self, count):
+        prices = [ ]
+        for bucket in reversed( self.buckets ):
+            if len( prices ) >= count:
+                break
+            prices.extend( bucket[ : -( count - len( prices ) ) - 1 : -1 ] )
+        return prices
+
+class PriceLevels:
+    """ One side of a book: aggregate shares and order count per price.
+
+        Level prices are kept in SortedPrices next to the level dict, so a
+        level is added or removed in O(log n), the best level is an O(1)
+        lookup at either end and the top count levels come out in order in
+        O(log n + count).
+    """
+    __slots__ = ( 'levels', 'prices', 'descending' )
+
+    def __init__(self, descending):
+        self.levels = { }
+        self.prices = SortedPrices()
+        self.descending = descending
+
+    def __len__(self):
+        return len( self.prices )
+
+    def add(self, price, shares):
+        level = self.levels.get( price )
+        if level is None:
+            self.levels[ price ] = [ shares, 1 ]
+            self.prices.add( price )
+        else:
+            level[0] += shares
+            level[1] += 1
+
+    def reduce(self, price, shares, orderDone):
+        level = self.levels[ price ]
+        level[0] -= shares
+        if orderDone:
+            level[1] -= 1
+            if level[1] == 0:
+                del self.levels[ price ]
+                self.prices.remove( price )
+
+    def best(self):
+        """ ( price, shares, orderCount ) of the best level, or None. """
+        if not self.prices:
+            return None
+        price = self.prices.last() if self.descending else self.prices.first()
+        level = self.levels[ price ]
+        return ( price, level[0], level[1] )
+
+    def top(self, count):
+        """ Up to count levels, best first, as ( price, shares, orderCount ). """
+        prices = self.prices.highest( count ) if self.descending else self.prices.lowest( count )
+        levels = self.levels
+        return [ ( price, levels[ price ][0], levels[ price ][1] ) for price in prices ]
+
+class OrderBook:
+    __slots__ = ( 'stock', 'bids', 'asks' )
+
+    def __init__(self, stock):
+        self.stock = stock
+        self.bids = PriceLevels( descending=True )
+        self.asks = PriceLevels( descending=False )
+
+    def bestBid(self):
+        return self.bids.best()
+
+    def bestAsk(self):
+        return self.asks.best()
+
+    def depth(self, count):
+        return self.bids.top( count ), self.asks.top( count )
+
+class OrderBookEngine:
+    """ Builds per symbol limit order books from raw Itch 4.1 frames.
+
+        Handles AddOrder, AddOrderWithMPID, OrderExecuted, OrderExecutedWithPrice,
+        OrderCancel, OrderDelete and OrderReplace; every other type is ignored
+        with a single table lookup. Messages for orders the engine has not seen
+        (other symbols when filtering, or orders from before the file started)
+        are ignored.
+    """
+
+    def __init__(self, symbols=None):
+        self.books = { }
+        self.booksByRawStock = { }
+        # orderRefNum -> [ side ( PriceLevels ), price, shares ]
+        self.orders = { }
+        self.symbols = None if symbols is None else set( padStock( symbol ) for symbol in symbols )
+        self.handlers = [ None ] * 256
+        for messageType, handler in ( ( MessageType.AddOrder,               self.addOrder ),
+                                      ( MessageType.AddOrderWithMPID,       self.addOrder ),
+                                      ( MessageType.OrderExecuted,          self.executeOrder ),
+                                      ( MessageType.OrderExecutedWithPrice, self.executeOrder ),
+                                      ( MessageType.OrderCancel,            self.executeOrder ),
+                                      ( MessageType.OrderDelete,            self.deleteOrder ),
+                                      ( MessageType.OrderReplace,           self.replaceOrder ) ):
+            self.handlers[ ord( messageType.value ) ] = handler
+
+    def bookFor(self, stock):
+        return self.books.get( stock )
+
+    def apply(self, buffer, offset=0):
+        handler = self.handlers[ buffer[ offset + 2 ] ]
+        if handler is not None:
+            handler( buffer, offset )
+
+    def applyMessage(self, message):
+        # An ItchMessage or an ItchMessageView
+        if isinstance( message, ItchMessageView ):
+            self.apply( message.buffer, message.offset )
+        else:
+            self.apply( message.rawMessage )
+
+    def applyFile(self, fileName):
+        apply = self.apply
+        with ItchReader( fileName ) as reader:
+            for buffer, offset in reader.frames():
+                apply( buffer, offset )
+
+    def rawBook(self, rawStock):
+        book = self.booksByRawStock.get( rawStock )
+        if book is None:
+            stock = rawStock.decode().strip()
+            book = self.books[ stock ] = self.booksByRawStock[ rawStock ] = OrderBook( stock )
+        return book
+
+    def addOrder(self, buffer, offset,
+                 unpackAdd=AddOrder._codec.struct.unpack_from):
+        # AddOrderWithMPID shares the AddOrder layout up to the Mpid
+        _, _, _, orderRefNum, side, shares, rawStock, price = unpackAdd( buffer, offset )
+        # A reused OrderRefNum replaces the order it names
+        previous = self.orders.pop( orderRefNum, None )
+        if previous is not None:
+            previous[0].reduce( previous[1], previous[2], True )
+        if self.symbols is not None and rawStock not in self.symbols:
+            return
+        book = self.rawBook( rawStock )
+        levels = book.bids if side == b'B' else book.asks
+        levels.add( price, shares )
+        self.orders[ orderRefNum ] = [ levels, price, shares ]
+
+    def reduceOrder(self, orderRefNum, order, shares):
+        if shares >= order[2]:
+            order[0].reduce( order[1], order[2], True )
+            del self.orders[ orderRefNum ]
+        else:
+            order[0].reduce( order[1], shares, False )
+            order[2] -= shares
+
+    def executeOrder(self, buffer, offset,
+                     unpackReduce=OrderCancel._codec.struct.unpack_from):
+        # OrderExecuted, OrderExecutedWithPrice and OrderCancel all start with
+        # NanoSeconds, OrderRefNum, Shares
+        _, _, _, orderRefNum, shares = unpackReduce( buffer, offset )
+        order = self.orders.get( orderRefNum )
+        if order is not None:
+            self.reduceOrder( orderRefNum, order, shares )
+
+    def deleteOrder(self, buffer, offset,
+                    unpackDelete=OrderDelete._codec.struct.unpack_from):
+        _, _, _, orderRefNum = unpackDelete( buffer, offset )
+        order = self.orders.pop( orderRefNum, None )
+        if order is not None:
+            order[0].reduce( order[1], order[2], True )
+
+    def replaceOrder(self, buffer, offset,
+                     unpackReplace=OrderReplace._codec.struct.unpack_from):
+        _, _, _, orderRefNum, newOrderRefNum, shares, price = unpackReplace( buffer, offset )
+        order = self.orders.pop( orderRefNum, None )
+        if order is None:
+            return
+        levels = order[0]
+        levels.reduce( order[1], order[2], True )
+        # As for AddOrder, a reused NewOrderRefNum replaces the order it names
+        previous = self.orders.pop( newOrderRefNum, None )
+        if previous is not None:
+            previous[0].reduce( previous[1], previous[2], True )
+        levels.add( price, shares )
+        self.orders[ newOrderRefNum ] = [ levels, price, shares ]
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import unittest
+
+from Itch41 import *
+from ItchOrderBook import *
+
+samplesDir = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "SamplesMessages" )
+
+def addOrder(orderRefNum, side, shares, price, stock="AAPL"):
+    return ItchMessageFactory.createFromArgs( [ MessageType.AddOrder, {
+                    Field.NanoSeconds : 1,
+                    Field.OrderRefNum : orderRefNum,
+                    Field.Side        : side,
+                    Field.Shares      : shares,
+                    Field.Stock       : stock,
+                    Field.Price       : price } ] )
+
+class ItchOrderBook_Test(unittest.TestCase):
+    """ Tests for building limit order books from Itch 4.1 messages """
+
+    def test_sample_file_1(self):
+        # GIVEN - three bids, the middle one fully executed
+        engine = OrderBookEngine()
+
+        # WHEN
+        engine.applyFile( os.path.join( samplesDir, "Itch.test1.dat" ) )
+
+        # THEN
+        book = engine.bookFor( "AAPL" )
+        self.assertEqual( ( 1005600, 400, 1 ), book.bestBid() )
+        self.assertIsNone( book.bestAsk() )
+        self.assertEqual( [ ( 1005600, 400, 1 ), ( 1005300, 200, 1 ) ], book.depth( 5 )[0] )
+        self.assertEqual( { 1, 3 }, set( engine.orders ) )
+
+    def test_sample_file_2(self):
+        # GIVEN - order 30 replaced by 40, which is then executed
+        engine = OrderBookEngine()
+
+        # WHEN
+        engine.applyFile( os.path.join( samplesDir, "Itch.test2.dat" ) )
+
+        # THEN
+        book = engine.bookFor( "AAPL" )
+        self.assertEqual( [ ( 1001200, 325, 1 ), ( 1001100, 225, 1 ) ], book.depth( 5 )[0] )
+        self.assertEqual( { 10, 20 }, set( engine.orders ) )
+
+    def test_partial_executions_cancels_and_deletes(self):
+        # GIVEN
+        engine = OrderBookEngine()
+        messages = [ addOrder( 1, 'S', 300, 10.05 ),
+                     addOrder( 2, 'S', 100, 10.05 ),
+                     addOrder( 3, 'S', 500, 10.01 ),
+                     addOrder( 4, 'B', 100,  9.99 ),
+                     ItchMessageFactory.createFromArgs( [ MessageType.OrderExecuted, {
+                         Field.NanoSeconds: 2, Field.OrderRefNum: 3, Field.Shares: 200, Field.MatchNum: 1 } ] ),
+                     ItchMessageFactory.createFromArgs( [ MessageType.OrderExecutedWithPrice, {
+                         Field.NanoSeconds: 3, Field.OrderRefNum: 3, Field.Shares: 300, Field.MatchNum: 2,
+                         Field.Printable: 'Y', Field.Price: 10.02 } ] ),
+                     ItchMessageFactory.createFromArgs( [ MessageType.OrderCancel, {
+                         Field.NanoSeconds: 4, Field.OrderRefNum: 1, Field.Shares: 50 } ] ),
+                     ItchMessageFactory.createFromArgs( [ MessageType.OrderDelete, {
+                         Field.NanoSeconds: 5, Field.OrderRefNum: 4 } ] ) ]
+
+        # WHEN
+        for message in messages:
+            engine.applyMessage( message )
+
+        # THEN
+        book = engine.bookFor( "AAPL" )
+        self.assertEqual( ( 100500, 350, 2 ), book.bestAsk() )
+        self.assertIsNone( book.bestBid() )
+        self.assertEqual( { 1, 2 }, set( engine.orders ) )
+
+    def test_symbol_filter(self):
+        # GIVEN
+        engine = OrderBookEngine( symbols=[ "MSFT" ] )
+
+        # WHEN
+        engine.applyMessage( addOrder( 1, 'B', 100, 10.0, "AAPL" ) )
+        engine.applyMessage( addOrder( 2, 'B', 100, 20.0, "MSFT" ) )
+        engine.applyMessage( ItchMessageFactory.createFromArgs( [ MessageType.OrderDelete, {
+                                 Field.NanoSeconds: 5, Field.OrderRefNum: 1 } ] ) )
+
+        # THEN
+        self.assertEqual( [ "MSFT" ], list( engine.books ) )
+        self.assertEqual( ( 200000, 100, 1 ), engine.bookFor( "MSFT" ).bestBid() )
+
+    def test_views_apply_like_messages(self):
+        # GIVEN
+        engine = OrderBookEngine()
+        rawMessages = [ addOrder( 1, 'B', 100, 10.0 ).rawMessage, addOrder( 2, 'S', 200, 10.5 ).rawMessage ]
+
+        # WHEN
+        for rawMessage in rawMessages:
+            engine.applyMessage( ItchMessageFactory.createView( rawMessage ) )
+
+        # THEN
+        book = engine.bookFor( "AAPL" )
+        self.assertEqual( ( 100000, 100, 1 ), book.bestBid() )
+        self.assertEqual( ( 105000, 200, 1 ), book.bestAsk() )
+
+    def test_reused_order_ref_num_replaces_the_order(self):
+        # GIVEN
+        engine = OrderBookEngine()
+
+        # WHEN
+        engine.applyMessage( addOrder( 1, 'B', 100, 10.0 ) )
+        engine.applyMessage( addOrder( 1, 'B', 300, 10.1 ) )
+
+        # THEN
+        book = engine.bookFor( "AAPL" )
+        self.assertEqual( [ ( 101000, 300, 1 ) ], book.depth( 5 )[0] )
+        self.assertEqual( 300, engine.orders[1][2] )
+
+    def test_levels_track_a_sorted_reference(self):
+        # GIVEN
+        rng = random.Random( 7 )
+        for descending in ( True, False ):
+            levels = PriceLevels( descending )
+            # Small buckets, so splits and emptied buckets are exercised
+            levels.prices = SortedPrices( bucketSize=4 )
+            reference = { }
+
+            # WHEN levels come and go far from the top as well as at it
+            for _ in range( 5000 ):
+                price = rng.randrange( 1, 400 )
+                if price in reference and rng.random() < 0.6:
+                    levels.reduce( price, reference.pop( price ), True )
+                elif price not in reference:
+                    reference[ price ] = rng.randrange( 1, 1000 )
+                    levels.add( price, reference[ price ] )
+
+                # THEN
+                expected = sorted( reference, reverse=descending )
+                self.assertEqual( len( expected ), len( levels ) )
+                best = levels.best()
+                self.assertEqual( expected[0] if expected else None, best and best[0] )
+            self.assertEqual( [ ( price, reference[ price ], 1 ) for price in expected[ :10 ] ], levels.top( 10 ) )
+            self.assertEqual( [ level[0] for level in levels.top( len( expected ) + 5 ) ], expected )
+            self.assertTrue( all( len( bucket ) <= 8 for bucket in levels.prices.buckets ) )
+
+    def test_replace_onto_a_live_order_ref_num(self):
+        # GIVEN
+        engine = OrderBookEngine()
+        engine.applyMessage( addOrder( 1, 'B', 100, 10.0 ) )
+        engine.applyMessage( addOrder( 2, 'B', 200, 10.1 ) )
+
+        # WHEN order 1 is replaced under the ref of live order 2
+        engine.applyMessage( ItchMessageFactory.createFromArgs( [ MessageType.OrderReplace, {
+                                 Field.NanoSeconds: 2, Field.OrderRefNum: 1, Field.NewOrderRefNum: 2,
+                                 Field.Shares: 300, Field.Price: 10.2 } ] ) )
+
+        # THEN only the replacement is left in the book
+        self.assertEqual( [ ( 102000, 300, 1 ) ], engine.bookFor( "AAPL" ).depth( 5 )[0] )
+        self.assertEqual( { 2 }, set( engine.orders ) )
+
+if __name__ == "__main__":
+    unittest.main()
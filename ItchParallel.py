@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+import collections
+import concurrent.futures
+import mmap
+import os
+
+from Itch41 import *
+from ItchIndex import ItchIndex, indexFileNameFor
+
+chunksPerProcess = 4
+# Consecutive well formed messages needed to accept a resync point
+resyncDepth = 64
+
+expectedLengths = [ codec.messageLength if codec else None for codec in ItchMessageFactory.codecs ]
+
+class ChunkBoundaryError(ValueError):
+    pass
+
+def isBoundary(buffer, offset, depth=resyncDepth):
+    """ True if depth messages starting at offset all carry a known type byte
+        with that type's fixed length (or the buffer ends cleanly first).
+    """
+    end = len( buffer )
+    unpackLength = lengthPrefix.unpack_from
+    for _ in range( depth ):
+        if offset == end:
+            return True
+        if offset + 3 > end:
+            return False
+        length = unpackLength( buffer, offset )[0]
+        if expectedLengths[ buffer[ offset + 2 ] ] != length:
+            return False
+        offset += 2 + length
+        if offset > end:
+            return False
+    return True
+
+def resync(buffer, offset):
+    """ The first offset at or after offset that passes isBoundary(), or the end. """
+    end = len( buffer )
+    while offset < end:
+        if isBoundary( buffer, offset ):
+            return offset
+        offset += 1
+    return end
+
+def indexedStart(index, target, size):
+    """ Offset of the first indexed message at or after target, or size. """
+    low, high = 0, index.count
+    while low < high:
+        middle = ( low + high ) // 2
+        if index.entry( middle )[0] < target:
+            low = middle + 1
+        else:
+            high = middle
+    return index.entry( low )[0] if low < index.count else size
+
+def chunkBoundaries(buffer, chunkCount, index=None):
+    """ Splits buffer into at most chunkCount (start, end) ranges on message boundaries.
+
+        Each split point is the first message at or after size * i // chunkCount:
+        looked up in an ItchIndex of the file when one is given (exact), or
+        found by resyncing from that byte (a few messages are read per split,
+        so splitting costs nothing like a pass over the file).
+    """
+    size = len( buffer )
+    starts = [ 0 ]
+    for position in range( 1, chunkCount ):
+        target = max( size * position // chunkCount, starts[-1] )
+        starts.append( indexedStart( index, target, size ) if index is not None else resync( buffer, target ) )
+    starts.append( size )
+    return [ ( start, end ) for start, end in zip( starts, starts[1:] ) if start < end ]
+
+def walkedBoundaries(buffer, chunkCount):
+    """ chunkBoundaries() from a serial walk of every length prefix up to the
+        last split point: exact without an index, but one pass over the file.
+    """
+    size = len( buffer )
+    unpackLength = lengthPrefix.unpack_from
+    starts = [ 0 ]
+    offset = 0
+    for position in range( 1, chunkCount ):
+        target = size * position // chunkCount
+        while offset < target:
+            if offset + 2 > size:
+                raise ValueError( "Truncated message at byte offset {}".format( offset ) )
+            nextOffset = offset + 2 + unpackLength( buffer, offset )[0]
+            if nextOffset > size:
+                raise ValueError( "Truncated message at byte offset {}".format( offset ) )
+            offset = nextOffset
+        starts.append( offset )
+    starts.append( size )
+    return [ ( start, end ) for start, end in zip( starts, starts[1:] ) if start < end ]
+
+def frames(buffer, start, end):
+    """ Yields the offset of every framed message in buffer[start:end]. """
+    unpackLength = lengthPrefix.unpack_from
+    offset = start
+    while offset + 2 <= end:
+        nextOffset = offset + 2 + unpackLength( buffer, offset )[0]
+        if nextOffset > end:
+            break
+        yield offset
+        offset = nextOffset
+    if offset != end:
+        raise ChunkBoundaryError( "Chunk [{}, {}) does not end on a message boundary".format( start, end ) )
+
+class MessageTypeCounter:
+    """ Task counting messages per MessageType.
+
+        Type bytes outside the spec follow the unknown message policy given
+        (the factory's by default, captured here so workers see it too):
+        Raise raises UnknownMessageTypeError, Skip leaves them out and Count
+        keys them by their raw type byte.
+    """
+
+    def __init__(self, unknownMessagePolicy=None):
+        self.unknownMessagePolicy = UnknownMessagePolicy( unknownMessagePolicy or
+                                                          ItchMessageFactory.unknownMessagePolicy )
+
+    def __call__(self, buffer, start, end):
+        rawCounts = collections.Counter()
+        for offset in frames( buffer, start, end ):
+            rawCounts[ buffer[ offset + 2 ] ] += 1
+        counts = collections.Counter()
+        for typeByte, count in rawCounts.items():
+            if ItchMessageFactory.codecs[ typeByte ] is not None:
+                counts[ MessageType( chr( typeByte ) ) ] = count
+            elif self.unknownMessagePolicy == UnknownMessagePolicy.Raise:
+                raise UnknownMessageTypeError( "Unknown message type byte: {0:#04x}".format( typeByte ) )
+            elif self.unknownMessagePolicy == UnknownMessagePolicy.Count:
+                counts[ typeByte ] = count
+        return counts
+
+countMessageTypes = MessageTypeCounter( UnknownMessagePolicy.Raise )
+
+def decodeMessages(buffer, start, end):
+    createFromBytes = ItchMessageFactory.createFromBytes
+    unpackLength = lengthPrefix.unpack_from
+    messages = [ ]
+    for offset in frames( buffer, start, end ):
+        message = createFromBytes( bytes( buffer[ offset : offset + 2 + unpackLength( buffer, offset )[0] ] ) )
+        if message is not None:
+            messages.append( message )
+    return messages
+
+def decodeColumns(buffer, start, end):
+    import ItchColumns
+    return ItchColumns.decodeBuffer( buffer[ start : end ] )
+
+class TypeFilter:
+    """ Task returning the framed bytes of every message of the given types. """
+
+    def __init__(self, messageTypes):
+        self.typeBytes = bytes( sorted( ord( messageType.value ) for messageType in messageTypes ) )
+
+    def __call__(self, buffer, start, end):
+        typeBytes = self.typeBytes
+        unpackLength = lengthPrefix.unpack_from
+        selected = bytearray()
+        for offset in frames( buffer, start, end ):
+            if buffer[ offset + 2 ] in typeBytes:
+                selected += buffer[ offset : offset + 2 + unpackLength( buffer, offset )[0] ]
+        return bytes( selected )
+
+def runChunk(fileName, start, end, task):
+    with open( fileName, 'rb' ) as fileIn:
+        mapped = mmap.mmap( fileIn.fileno(), 0, access=mmap.ACCESS_READ )
+    try:
+        buffer = memoryview( mapped )
+        try:
+            return task( buffer, start, end )
+        finally:
+            try:
+                buffer.release()
+            except BufferError:
+                # A result still holds a view of the chunk
+                pass
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            pass
+
+def parallelMap(fileName, task, processes=None, chunkCount=None):
+    """ Runs task(buffer, start, end) over chunks of fileName in a process pool.
+
+        task must be picklable (a module level function or an instance of a
+        module level class). Results are returned in file order.
+    """
+    if fileName.endswith( '.gz' ):
+        raise ValueError( "Parallel parsing needs an uncompressed, mappable file: {}".format( fileName ) )
+    processes = processes or os.cpu_count() or 1
+    if os.path.getsize( fileName ) == 0:
+        return [ ]
+    chunkCount = chunkCount or processes * chunksPerProcess
+    index = freshIndex( fileName )
+    with open( fileName, 'rb' ) as fileIn:
+        mapped = mmap.mmap( fileIn.fileno(), 0, access=mmap.ACCESS_READ )
+    try:
+        chunks = chunkBoundaries( mapped, chunkCount, index )
+        try:
+            return runChunks( fileName, chunks, task, processes )
+        except ChunkBoundaryError:
+            if index is not None:
+                raise
+            # A resync point landed inside a message that looked like framed
+            # data. Chunk i always starts on a message, so its worker is the
+            # one that reports it; split exactly and run again.
+            return runChunks( fileName, walkedBoundaries( mapped, chunkCount ), task, processes )
+    finally:
+        if index is not None:
+            index.close()
+        mapped.close()
+
+def freshIndex(fileName):
+    """ The ItchIndex sidecar of fileName if it exists and is current, else None. """
+    indexFileName = indexFileNameFor( fileName )
+    if not os.path.exists( indexFileName ):
+        return None
+    index = ItchIndex( indexFileName )
+    if index.isStaleFor( fileName ):
+        index.close()
+        return None
+    return index
+
+def runChunks(fileName, chunks, task, processes):
+    # Results are collected in file order, so a bad split is reported by the
+    # chunk before it ahead of any error from the misaligned chunk itself
+    if processes == 1:
+        return [ runChunk( fileName, start, end, task ) for start, end in chunks ]
+    with concurrent.futures.ProcessPoolExecutor( max_workers=processes ) as executor:
+        futures = [ executor.submit( runChunk, fileName, start, end, task ) for start, end in chunks ]
+        return [ future.result() for future in futures ]
+
+def parallelCount(fileName, processes=None):
+    """ Counter of messages per MessageType; unknown type bytes are handled
+        by the factory's unknown message policy, as a serial read would.
+    """
+    counts = sum( parallelMap( fileName, MessageTypeCounter(), processes ), collections.Counter() )
+    for typeByte in [ key for key in counts if isinstance( key, int ) ]:
+        unknownCounts = ItchMessageFactory.unknownMessageCounts
+        unknownCounts[ typeByte ] = unknownCounts.get( typeByte, 0 ) + counts.pop( typeByte )
+    return counts
+
+def parallelFilter(fileName, messageTypes, processes=None):
+    return b"".join( parallelMap( fileName, TypeFilter( messageTypes ), processes ) )
+
+def parallelColumns(fileName, processes=None):
+    import numpy as np
+    merged = { }
+    for columns in parallelMap( fileName, decodeColumns, processes ):
+        for messageType, records in columns.items():
+            merged.setdefault( messageType, [ ] ).append( records )
+    return { messageType: np.concatenate( parts ) for messageType, parts in merged.items() }
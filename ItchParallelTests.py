@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import collections
+import os
+import tempfile
+import unittest
+
+from Itch41 import *
+from ItchIndex import buildIndex
+from ItchParallel import *
+from ItchReader import ItchReader
+
+samplesDir = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "SamplesMessages" )
+
+class ItchParallel_Test(unittest.TestCase):
+    """ Tests for splitting a file at message boundaries and parsing chunks in parallel """
+
+    def setUp(self):
+        with open( os.path.join( samplesDir, "T.50.itch" ), 'rb' ) as fileIn:
+            self.data = fileIn.read() * 40
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join( self.tempDir.name, "T.2000.itch" )
+        with open( self.fileName, 'wb' ) as fileOut:
+            fileOut.write( self.data )
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_chunk_boundaries_land_on_messages(self):
+        # GIVEN
+        offsets = set( offset for offset in frames( self.data, 0, len( self.data ) ) )
+
+        # WHEN
+        chunks = chunkBoundaries( self.data, 7 )
+
+        # THEN
+        self.assertEqual( 7, len( chunks ) )
+        self.assertEqual( 0, chunks[0][0] )
+        self.assertEqual( len( self.data ), chunks[-1][1] )
+        for ( start, end ), ( nextStart, _ ) in zip( chunks, chunks[1:] ):
+            self.assertEqual( end, nextStart )
+            self.assertIn( start, offsets )
+
+    def test_misaligned_chunk_raises(self):
+        with self.assertRaises( ValueError ):
+            list( frames( self.data, 1, len( self.data ) ) )
+
+    def test_parallel_count_matches_serial(self):
+        # GIVEN
+        with ItchReader( self.fileName ) as reader:
+            serial = collections.Counter( MessageType( view.MessageType ) for view in reader )
+
+        # WHEN
+        counts = parallelCount( self.fileName, processes=2 )
+
+        # THEN
+        self.assertEqual( serial, counts )
+        self.assertEqual( 1800, sum( counts.values() ) )
+
+    def test_parallel_filter_keeps_file_order(self):
+        # WHEN
+        selected = parallelFilter( self.fileName, [ MessageType.TimeStamp ], processes=2 )
+
+        # THEN
+        with ItchReader( self.fileName ) as reader:
+            expected = b"".join( view.rawBytes() for view in reader
+                                 if view.MessageType == MessageType.TimeStamp.value )
+        self.assertEqual( expected, selected )
+
+    def test_parallel_messages_in_order(self):
+        # WHEN
+        chunks = parallelMap( self.fileName, decodeMessages, processes=1, chunkCount=5 )
+
+        # THEN
+        messages = [ message for chunk in chunks for message in chunk ]
+        with ItchReader( self.fileName ) as reader:
+            expected = [ bytes( view.rawBytes() ) for view in reader ]
+        self.assertEqual( expected, [ bytes( message.rawMessage ) for message in messages ] )
+
+    def test_decoy_split_is_redone_exactly(self):
+        # GIVEN a message whose payload looks like a run of framed messages
+        timeStamp = self.data[ : 2 + lengthPrefix.unpack_from( self.data )[0] ]
+        decoy = timeStamp * 1000
+        data = lengthPrefix.pack( len( decoy ) + 1 ) + b'Z' + decoy + self.data
+        with open( self.fileName, 'wb' ) as fileOut:
+            fileOut.write( data )
+        offsets = set( frames( data, 0, len( data ) ) )
+        expected = b"".join( data[ offset : offset + 2 + lengthPrefix.unpack_from( data, offset )[0] ]
+                             for offset in sorted( offsets ) if data[ offset + 2 ] == ord( 'T' ) )
+
+        # WHEN
+        resynced = chunkBoundaries( data, 8 )
+        selected = b"".join( parallelMap( self.fileName, TypeFilter( [ MessageType.TimeStamp ] ),
+                                          processes=1, chunkCount=8 ) )
+
+        # THEN resyncing alone is fooled, but the split is caught and redone
+        self.assertFalse( all( start in offsets for start, end in resynced ) )
+        self.assertEqual( expected, selected )
+        for start, end in walkedBoundaries( data, 8 ):
+            self.assertIn( start, offsets )
+
+    def test_index_gives_exact_boundaries(self):
+        # GIVEN
+        buildIndex( self.fileName, interval=16 )
+        offsets = set( frames( self.data, 0, len( self.data ) ) )
+
+        # WHEN
+        index = freshIndex( self.fileName )
+        try:
+            chunks = chunkBoundaries( self.data, 7, index )
+        finally:
+            index.close()
+
+        # THEN
+        self.assertEqual( 7, len( chunks ) )
+        for start, end in chunks:
+            self.assertIn( start, offsets )
+        self.assertEqual( parallelCount( self.fileName, processes=1 ), parallelCount( self.fileName, processes=2 ) )
+
+    def test_truncated_file_raises_on_walk(self):
+        with self.assertRaises( ValueError ):
+            walkedBoundaries( lengthPrefix.pack( len( self.data ) ) + self.data[ :-1 ], 4 )
+
+    def test_unknown_types_follow_policy(self):
+        # GIVEN
+        with open( self.fileName, 'ab' ) as fileOut:
+            fileOut.write( lengthPrefix.pack( 1 ) + b'Z' )
+
+        # WHEN / THEN
+        with self.assertRaises( UnknownMessageTypeError ):
+            parallelCount( self.fileName, processes=1 )
+        try:
+            ItchMessageFactory.setUnknownMessagePolicy( UnknownMessagePolicy.Count )
+            counts = parallelCount( self.fileName, processes=2 )
+            unknownCounts = ItchMessageFactory.unknownMessageCounts
+        finally:
+            ItchMessageFactory.setUnknownMessagePolicy( UnknownMessagePolicy.Raise )
+        self.assertEqual( 1800, sum( counts.values() ) )
+        self.assertEqual( { ord( 'Z' ): 1 }, unknownCounts )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+
+import argparse
+import mmap
+import struct
+
+from Itch41 import *
+from ItchMoldUdp64 import moldHeader, endOfSessionCount
+
+# Classic pcap magic numbers, as read little endian
+pcapMicroMagic = 0xa1b2c3d4
+pcapNanoMagic = 0xa1b23c4d
+pcapngBlockType = 0x0a0d0d0a
+pcapngByteOrderMagic = 0x1a2b3c4d
+
+pcapngInterfaceBlock = 0x00000001
+pcapngSimplePacketBlock = 0x00000003
+pcapngEnhancedPacketBlock = 0x00000006
+pcapngTsResolOption = 9
+
+# Link layer types
+linkNull = 0
+linkEthernet = 1
+linkRaw = 101
+linkLinuxSll = 113
+linkIpv4 = 228
+linkIpv6 = 229
+linkLinuxSll2 = 276
+
+etherTypeIpv4 = 0x0800
+etherTypeIpv6 = 0x86dd
+etherTypeVlans = ( 0x8100, 0x88a8, 0x9100 )
+ipProtocolUdp = 17
+
+etherType = struct.Struct( '>H' )
+udpHeader = struct.Struct( '>HHHH' )
+
+class PcapFormatError(ValueError):
+    pass
+
+def isPcapFile(fileName):
+    with open( fileName, 'rb' ) as fileIn:
+        head = fileIn.read( 4 )
+    if len( head ) < 4:
+        return False
+    return struct.unpack( '<I', head )[0] in ( pcapMicroMagic, pcapNanoMagic, pcapngBlockType ) or \
+           struct.unpack( '>I', head )[0] in ( pcapMicroMagic, pcapNanoMagic )
+
+def networkOffset(linkType, buffer, offset, end):
+    """ ( offset of the IP header, IP version ) inside a captured packet, or None. """
+    if linkType == linkEthernet:
+        offset += 12
+        if offset + 2 > end:
+            return None
+        proto = etherType.unpack_from( buffer, offset )[0]
+        while proto in etherTypeVlans and offset + 6 <= end:
+            offset += 4
+            proto = etherType.unpack_from( buffer, offset )[0]
+        offset += 2
+    elif linkType == linkLinuxSll:
+        if offset + 16 > end:
+            return None
+        proto = etherType.unpack_from( buffer, offset + 14 )[0]
+        offset += 16
+    elif linkType == linkLinuxSll2:
+        if offset + 20 > end:
+            return None
+        proto = etherType.unpack_from( buffer, offset )[0]
+        offset += 20
+    elif linkType == linkNull:
+        # Host byte order address family; only the IP version matters below
+        offset += 4
+        proto = None
+    elif linkType in ( linkRaw, linkIpv4, linkIpv6 ):
+        proto = None
+    else:
+        return None
+
+    if offset >= end:
+        return None
+    version = buffer[ offset ] >> 4
+    if proto is not None and proto not in ( etherTypeIpv4, etherTypeIpv6 ):
+        return None
+    return offset, version
+
+def udpPayload(linkType, buffer, offset, end):
+    """ ( source port, destination port, payload offset, payload end ) of a UDP datagram, or None. """
+    located = networkOffset( linkType, buffer, offset, end )
+    if located is None:
+        return None
+    offset, version = located
+    if version == 4:
+        if offset + 20 > end:
+            return None
+        headerLength = ( buffer[ offset ] & 0x0f ) * 4
+        # Fragments other than a whole datagram cannot be parsed on their own
+        if buffer[ offset + 9 ] != ipProtocolUdp or ( etherType.unpack_from( buffer, offset + 6 )[0] & 0x3fff ):
+            return None
+        offset += headerLength
+    elif version == 6:
+        if offset + 40 > end or buffer[ offset + 6 ] != ipProtocolUdp:
+            return None
+        offset += 40
+    else:
+        return None
+    if offset + 8 > end:
+        return None
+    sourcePort, destinationPort, length, _ = udpHeader.unpack_from( buffer, offset )
+    return sourcePort, destinationPort, offset + 8, min( offset + length, end )
+
+class PcapItchReader:
+    """ Reads Itch messages out of a pcap or pcapng capture of MoldUDP64 traffic.
+
+        The capture is memory mapped and nothing is copied: Ethernet (with
+        VLAN tags), Linux cooked, loopback and raw IP link layers, IPv4 and
+        IPv6, UDP and MoldUDP64 headers are skipped with offsets only, and
+        each MoldUDP64 message block, which is a length prefixed Itch frame,
+        is handed out as (buffer, offset) into the map, the same shape as
+        ItchReader.frames(). Packet timestamps are integer nanoseconds since
+        the epoch, from either format's timestamp resolution.
+
+        ports restricts to UDP destination ports and session to one
+        MoldUDP64 session. Non UDP traffic, IP fragments and packets too
+        short for their MoldUDP64 header are skipped; a truncated capture
+        record raises PcapFormatError.
+    """
+
+    def __init__(self, fileName, ports=None, session=None):
+        self.fileName = fileName
+        self.ports = None if ports is None else set( ports )
+        self.session = None if session is None else session.ljust( 10 ).encode()
+        self.fileIn = open( fileName, 'rb' )
+        try:
+            self.mapped = mmap.mmap( self.fileIn.fileno(), 0, access=mmap.ACCESS_READ )
+        except ValueError:
+            self.fileIn.close()
+            raise PcapFormatError( "Empty capture: {}".format( fileName ) )
+        self.buffer = memoryview( self.mapped )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return self.views()
+
+    def close(self):
+        # Views still held by callers keep the map alive until they drop them
+        self.buffer = None
+        try:
+            self.mapped.close()
+        except BufferError:
+            pass
+        self.fileIn.close()
+
+    def records(self):
+        """ ( timestamp ns, link type, offset, end ) for every captured packet. """
+        buffer = self.buffer
+        if len( buffer ) < 4:
+            raise PcapFormatError( "Not a pcap file: {}".format( self.fileName ) )
+        if struct.unpack_from( '<I', buffer )[0] == pcapngBlockType:
+            return self.pcapngRecords( buffer )
+        return self.pcapRecords( buffer )
+
+    def pcapRecords(self, buffer):
+        if len( buffer ) < 24:
+            raise PcapFormatError( "Short pcap header: {}".format( self.fileName ) )
+        for order in ( '<', '>' ):
+            magic = struct.unpack_from( order + 'I', buffer )[0]
+            if magic in ( pcapMicroMagic, pcapNanoMagic ):
+                break
+        else:
+            raise PcapFormatError( "Not a pcap file: {}".format( self.fileName ) )
+        fractionNs = 1 if magic == pcapNanoMagic else 1000
+        linkType = struct.unpack_from( order + 'I', buffer, 20 )[0] & 0x0fffffff
+        recordHeader = struct.Struct( order + 'IIII' )
+
+        offset = 24
+        end = len( buffer )
+        while offset + 16 <= end:
+            seconds, fraction, capturedLength, _ = recordHeader.unpack_from( buffer, offset )
+            offset += 16
+            if offset + capturedLength > end:
+                raise PcapFormatError( "Truncated packet record at byte offset {}".format( offset - 16 ) )
+            yield seconds * 1000000000 + fraction * fractionNs, linkType, offset, offset + capturedLength
+            offset += capturedLength
+        if offset != end:
+            raise PcapFormatError( "Truncated packet record at byte offset {}".format( offset ) )
+
+    def pcapngRecords(self, buffer):
+        end = len( buffer )
+        offset = 0
+        order = '<'
+        interfaces = [ ]
+        while offset + 12 <= end:
+            blockType = struct.unpack_from( order + 'I', buffer, offset )[0]
+            if blockType == pcapngBlockType:
+                # Section header: the byte order magic says how to read the rest of the section
+                order = '<' if struct.unpack_from( '<I', buffer, offset + 8 )[0] == pcapngByteOrderMagic else '>'
+                interfaces = [ ]
+            blockLength = struct.unpack_from( order + 'I', buffer, offset + 4 )[0]
+            if blockLength < 12 or offset + blockLength > end:
+                raise PcapFormatError( "Truncated pcapng block at byte offset {}".format( offset ) )
+            body = offset + 8
+
+            if blockType == pcapngInterfaceBlock:
+                linkType, _, snapLength = struct.unpack_from( order + 'HHI', buffer, body )
+                multiplier, divisor = self.pcapngTimeUnit( buffer, order, body + 8, offset + blockLength - 4 )
+                interfaces.append( ( linkType, multiplier, divisor, snapLength ) )
+            elif blockType == pcapngEnhancedPacketBlock:
+                if blockLength < 32:
+                    raise PcapFormatError( "Short enhanced packet block at byte offset {}".format( offset ) )
+                interface, high, low, capturedLength, _ = struct.unpack_from( order + 'IIIII', buffer, body )
+                packet = body + 20
+                if packet + capturedLength > offset + blockLength - 4:
+                    raise PcapFormatError( "Packet overruns its block at byte offset {}".format( offset ) )
+                linkType, multiplier, divisor, _ = self.pcapngInterface( interfaces, interface, offset )
+                yield ( ( high << 32 ) | low ) * multiplier // divisor, linkType, packet, packet + capturedLength
+            elif blockType == pcapngSimplePacketBlock:
+                linkType, _, _, snapLength = self.pcapngInterface( interfaces, 0, offset )
+                originalLength = struct.unpack_from( order + 'I', buffer, body )[0]
+                capturedLength = min( originalLength, snapLength or originalLength, blockLength - 16 )
+                yield None, linkType, body + 4, body + 4 + capturedLength
+            offset += blockLength
+        if offset != end:
+            raise PcapFormatError( "Truncated pcapng block at byte offset {}".format( offset ) )
+
+    @staticmethod
+    def pcapngInterface(interfaces, interface, offset):
+        if interface >= len( interfaces ):
+            raise PcapFormatError( "Packet block at byte offset {} names interface {}, but {} are described".format(
+                                       offset, interface, len( interfaces ) ) )
+        return interfaces[ interface ]
+
+    @staticmethod
+    def pcapngTimeUnit(buffer, order, offset, end):
+        # ( multiplier, divisor ) from if_tsresol ticks to ns, kept integral: 64 bit ns do not fit a float
+        resolution = 6
+        option = struct.Struct( order + 'HH' )
+        while offset + 4 <= end:
+            code, length = option.unpack_from( buffer, offset )
+            if code == 0:
+                break
+            if code == pcapngTsResolOption and length >= 1:
+                resolution = buffer[ offset + 4 ]
+            offset += 4 + ( ( length + 3 ) & ~3 )
+        if resolution & 0x80:
+            return 1000000000, 1 << ( resolution & 0x7f )
+        if resolution <= 9:
+            return 10 ** ( 9 - resolution ), 1
+        return 1, 10 ** ( resolution - 9 )
+
+    def moldPackets(self):
+        """ ( timestamp ns, sequence, count, offset of first message block ) per MoldUDP64 packet. """
+        buffer = self.buffer
+        ports = self.ports
+        session = self.session
+        for timestamp, linkType, offset, end in self.records():
+            udp = udpPayload( linkType, buffer, offset, end )
+            if udp is None:
+                continue
+            _, destinationPort, payload, payloadEnd = udp
+            if ports is not None and destinationPort not in ports:
+                continue
+            if payloadEnd - payload < moldHeader.size:
+                continue
+            packetSession, sequence, count = moldHeader.unpack_from( buffer, payload )
+            if session is not None and packetSession != session:
+                continue
+            if count == endOfSessionCount:
+                count = 0
+            yield timestamp, sequence, count, payload + moldHeader.size, payloadEnd
+
+    def timedFrames(self):
+        """ ( timestamp ns, sequence number, buffer, offset ) for every Itch message. """
+        buffer = self.buffer
+        unpackLength = lengthPrefix.unpack_from
+        for timestamp, sequence, count, offset, end in self.moldPackets():
+            for index in range( count ):
+                if offset + 2 > end:
+                    break
+                nextOffset = offset + 2 + unpackLength( buffer, offset )[0]
+                if nextOffset > end:
+                    break
+                yield timestamp, sequence + index, buffer, offset
+                offset = nextOffset
+
+    def frames(self):
+        for _, _, buffer, offset in self.timedFrames():
+            yield buffer, offset
+
+    def views(self, accept=None):
+        createView = ItchMessageFactory.createView
+        for buffer, offset in self.frames():
+            if accept is None or accept( buffer, offset ):
+                view = createView( buffer, offset )
+                if view is not None:
+                    yield view
+
+    def messages(self, accept=None):
+        createFromBytes = ItchMessageFactory.createFromBytes
+        unpackLength = lengthPrefix.unpack_from
+        for buffer, offset in self.frames():
+            if accept is None or accept( buffer, offset ):
+                end = offset + 2 + unpackLength( buffer, offset )[0]
+                message = createFromBytes( bytes( buffer[ offset : end ] ) )
+                if message is not None:
+                    yield message
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="Count Itch messages in a pcap or pcapng capture of MoldUDP64" )
+    parser.add_argument( "fileName" )
+    parser.add_argument( "--port", type=int, action="append", help="UDP destination port(s) to keep" )
+    parser.add_argument( "--session", help="MoldUDP64 session to keep" )
+    args = parser.parse_args()
+    counts = { }
+    first = last = None
+    with PcapItchReader( args.fileName, args.port, args.session ) as reader:
+        for timestamp, _, buffer, offset in reader.timedFrames():
+            messageType = chr( buffer[ offset + 2 ] )
+            counts[ messageType ] = counts.get( messageType, 0 ) + 1
+            if timestamp is not None:
+                first = timestamp if first is None else first
+                last = timestamp
+    print( "{} messages {}".format( sum( counts.values() ), counts ) )
+    if first is not None:
+        print( "Capture spans {:.6f}s".format( ( last - first ) / 1e9 ) )
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+import os
+import struct
+import tempfile
+import unittest
+
+from Itch41 import *
+from ItchMoldUdp64 import moldPacket, endOfSessionCount, packetizeFrames
+from ItchPcap import *
+
+session = b"SESSION001"
+
+def frame(orderRefNum):
+    return bytes( ItchMessageFactory.createFromArgs( [ MessageType.OrderDelete,
+                  { Field.NanoSeconds: orderRefNum, Field.OrderRefNum: orderRefNum } ] ).rawMessage )
+
+def writePcap(fileName, packets, linkType=linkEthernet, nanoseconds=False):
+    """ Writes ( timestamp ns, packet bytes ) pairs as a classic little endian pcap file. """
+    with open( fileName, 'wb' ) as fileOut:
+        fileOut.write( struct.pack( '<IHHiIII', pcapNanoMagic if nanoseconds else pcapMicroMagic, 2, 4, 0, 0,
+                                    65535, linkType ) )
+        for timestamp, packet in packets:
+            seconds, fraction = divmod( timestamp, 1000000000 )
+            if not nanoseconds:
+                fraction //= 1000
+            fileOut.write( struct.pack( '<IIII', seconds, fraction, len( packet ), len( packet ) ) )
+            fileOut.write( packet )
+
+def udpOverEthernet(payload, sourcePort=40000, destinationPort=26400, source=b'\x0a\x00\x00\x01',
+                    destination=b'\xe9\x36\x0c\x01'):
+    """ Ethernet, IPv4 and UDP headers around payload (checksums left zero, as captures often have). """
+    udp = udpHeader.pack( sourcePort, destinationPort, 8 + len( payload ), 0 ) + payload
+    ip = struct.pack( '>BBHHHBBH4s4s', 0x45, 0, 20 + len( udp ), 0, 0x4000, 64, ipProtocolUdp, 0,
+                      source, destination ) + udp
+    return b'\x01\x00\x5e\x36\x0c\x01' + b'\x02\x00\x00\x00\x00\x01' + etherType.pack( etherTypeIpv4 ) + ip
+
+
+def pcapngBlock(blockType, body):
+    body += b'\x00' * ( -len( body ) % 4 )
+    length = 12 + len( body )
+    return struct.pack( '<II', blockType, length ) + body + struct.pack( '<I', length )
+
+def writePcapng(fileName, packets, tsresol=9):
+    with open( fileName, 'wb' ) as fileOut:
+        fileOut.write( pcapngBlock( pcapngBlockType, struct.pack( '<IHHq', pcapngByteOrderMagic, 1, 0, -1 ) ) )
+        options = struct.pack( '<HHB3x', pcapngTsResolOption, 1, tsresol ) + struct.pack( '<HH', 0, 0 )
+        fileOut.write( pcapngBlock( pcapngInterfaceBlock, struct.pack( '<HHI', linkEthernet, 0, 0 ) + options ) )
+        unit = 10 ** ( 9 - tsresol )
+        for timestamp, packet in packets:
+            ticks = timestamp // unit
+            fileOut.write( pcapngBlock( pcapngEnhancedPacketBlock, struct.pack( '<IIIII', 0, ticks >> 32,
+                                        ticks & 0xffffffff, len( packet ), len( packet ) ) + packet ) )
+
+class ItchPcap_Test(unittest.TestCase):
+    """ Tests for reading Itch messages out of MoldUDP64 captures """
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join( self.tempDir.name, "capture.pcap" )
+        self.frames = [ frame( number ) for number in range( 1, 8 ) ]
+        self.packets = [ ( 1700000000123456789 + first * 1000,
+                           udpOverEthernet( moldPacket( session, first + 1, group ) ) )
+                         for first, group in packetizeFrames( self.frames, 20 + 2 * len( self.frames[0] ) ) ]
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def readFrames(self, reader):
+        return [ bytes( buffer[ offset : offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0] ] )
+                 for buffer, offset in reader.frames() ]
+
+    def test_classic_pcap_nanoseconds(self):
+        # GIVEN
+        writePcap( self.fileName, self.packets, nanoseconds=True )
+
+        # WHEN
+        with PcapItchReader( self.fileName ) as reader:
+            timed = [ ( timestamp, sequence ) for timestamp, sequence, _, _ in reader.timedFrames() ]
+            frames = self.readFrames( reader )
+
+        # THEN
+        self.assertEqual( frames, self.frames )
+        self.assertEqual( [ sequence for _, sequence in timed ], list( range( 1, 8 ) ) )
+        self.assertEqual( timed[0][0], 1700000000123456789 )
+        self.assertEqual( timed[2][0], 1700000000123456789 + 2000 )
+
+    def test_classic_pcap_microseconds(self):
+        # GIVEN
+        writePcap( self.fileName, self.packets )
+
+        # WHEN
+        with PcapItchReader( self.fileName ) as reader:
+            timestamps = [ timestamp for timestamp, _, _, _ in reader.timedFrames() ]
+
+        # THEN
+        self.assertEqual( timestamps[0], 1700000000123456000 )
+
+    def test_big_endian_pcap(self):
+        # GIVEN
+        with open( self.fileName, 'wb' ) as fileOut:
+            fileOut.write( struct.pack( '>IHHiIII', pcapMicroMagic, 2, 4, 0, 0, 65535, linkEthernet ) )
+            for timestamp, packet in self.packets:
+                fileOut.write( struct.pack( '>IIII', timestamp // 1000000000, 5, len( packet ), len( packet ) ) )
+                fileOut.write( packet )
+
+        # WHEN
+        with PcapItchReader( self.fileName ) as reader:
+            frames = self.readFrames( reader )
+
+        # THEN
+        self.assertEqual( frames, self.frames )
+
+    def test_pcapng(self):
+        # GIVEN
+        fileName = os.path.join( self.tempDir.name, "capture.pcapng" )
+        writePcapng( fileName, self.packets )
+
+        # WHEN
+        with PcapItchReader( fileName ) as reader:
+            timed = [ timestamp for timestamp, _, _, _ in reader.timedFrames() ]
+            frames = self.readFrames( reader )
+
+        # THEN
+        self.assertTrue( isPcapFile( fileName ) )
+        self.assertEqual( frames, self.frames )
+        self.assertEqual( timed[0], 1700000000123456789 )
+
+    def test_pcapng_microsecond_resolution(self):
+        # GIVEN
+        fileName = os.path.join( self.tempDir.name, "capture.pcapng" )
+        writePcapng( fileName, self.packets, tsresol=6 )
+
+        # WHEN
+        with PcapItchReader( fileName ) as reader:
+            timed = [ timestamp for timestamp, _, _, _ in reader.timedFrames() ]
+
+        # THEN
+        self.assertEqual( timed[0], 1700000000123456000 )
+
+    def test_pcapng_bad_packet_blocks(self):
+        # GIVEN
+        fileName = os.path.join( self.tempDir.name, "capture.pcapng" )
+        writePcapng( fileName, self.packets[ :1 ] )
+        with open( fileName, 'rb' ) as fileIn:
+            header = fileIn.read()
+        header = header[ : len( header ) - len( pcapngBlock( pcapngEnhancedPacketBlock,
+                                                             b'\x00' * 20 + self.packets[0][1] ) ) ]
+        packet = self.packets[0][1]
+        overrun = pcapngBlock( pcapngEnhancedPacketBlock, struct.pack( '<IIIII', 0, 0, 0, len( packet ) + 64,
+                                                                       len( packet ) ) + packet )
+        unknownInterface = pcapngBlock( pcapngEnhancedPacketBlock, struct.pack( '<IIIII', 1, 0, 0, len( packet ),
+                                                                                len( packet ) ) + packet )
+
+        for block in ( overrun, unknownInterface ):
+            with open( fileName, 'wb' ) as fileOut:
+                fileOut.write( header + block )
+
+            # WHEN / THEN
+            with PcapItchReader( fileName ) as reader:
+                with self.assertRaises( PcapFormatError ):
+                    list( reader.frames() )
+
+    def test_views_point_into_the_map(self):
+        # GIVEN
+        writePcap( self.fileName, self.packets )
+
+        # WHEN
+        with PcapItchReader( self.fileName ) as reader:
+            views = list( reader.views() )
+
+            # THEN
+            self.assertEqual( [ view.OrderRefNum for view in views ], list( range( 1, 8 ) ) )
+            self.assertIs( views[0].buffer.obj, reader.mapped )
+
+    def test_messages(self):
+        # GIVEN
+        writePcap( self.fileName, self.packets )
+
+        # WHEN
+        with PcapItchReader( self.fileName ) as reader:
+            messages = list( reader.messages() )
+
+        # THEN
+        self.assertEqual( [ bytes( message.rawMessage ) for message in messages ], self.frames )
+
+    def test_skips_other_traffic(self):
+        # GIVEN
+        vlan = udpOverEthernet( moldPacket( session, 100, [ frame( 100 ) ] ) )
+        vlan = vlan[ : 12 ] + struct.pack( '>HH', 0x8100, 5 ) + vlan[ 12 : ]
+        tcp = bytearray( udpOverEthernet( b'x' * 40 ) )
+        tcp[ 14 + 9 ] = 6
+        arp = udpOverEthernet( b'' )[ : 12 ] + struct.pack( '>H', 0x0806 ) + b'\x00' * 28
+        endOfSession = udpOverEthernet( moldPacket( session, 101, count=endOfSessionCount ) )
+        otherPort = udpOverEthernet( moldPacket( session, 200, [ frame( 200 ) ] ), destinationPort=1234 )
+        packets = self.packets + [ ( 0, vlan ), ( 0, bytes( tcp ) ), ( 0, arp ), ( 0, endOfSession ),
+                                   ( 0, otherPort ) ]
+        writePcap( self.fileName, packets )
+
+        # WHEN
+        with PcapItchReader( self.fileName ) as reader:
+            allFrames = self.readFrames( reader )
+        with PcapItchReader( self.fileName, ports=[ 26400 ] ) as reader:
+            portFrames = self.readFrames( reader )
+
+        # THEN
+        self.assertEqual( allFrames, self.frames + [ frame( 100 ), frame( 200 ) ] )
+        self.assertEqual( portFrames, self.frames + [ frame( 100 ) ] )
+
+    def test_session_filter(self):
+        # GIVEN
+        other = udpOverEthernet( moldPacket( b"OTHER     ", 1, [ frame( 99 ) ] ) )
+        writePcap( self.fileName, self.packets + [ ( 0, other ) ] )
+
+        # WHEN
+        with PcapItchReader( self.fileName, session="SESSION001" ) as reader:
+            frames = self.readFrames( reader )
+
+        # THEN
+        self.assertEqual( frames, self.frames )
+
+    def test_truncated_capture(self):
+        # GIVEN
+        writePcap( self.fileName, self.packets )
+        with open( self.fileName, 'r+b' ) as fileOut:
+            fileOut.truncate( os.path.getsize( self.fileName ) - 5 )
+
+        # WHEN / THEN
+        with PcapItchReader( self.fileName ) as reader:
+            with self.assertRaises( PcapFormatError ):
+                list( reader.frames() )
+
+    def test_not_a_capture(self):
+        # GIVEN
+        fileName = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "SamplesMessages", "T.50.itch" )
+
+        # WHEN / THEN
+        self.assertFalse( isPcapFile( fileName ) )
+        with PcapItchReader( fileName ) as reader:
+            with self.assertRaises( PcapFormatError ):
+                list( reader.frames() )
+
+if __name__ == '__main__':
+    unittest.main()
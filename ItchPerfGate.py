@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+
+from ItchBenchmark import runBenchmarks, resultKey, defaultGeneratedMessages, defaultRepeat, defaultMinTime
+
+defaultBaselineDir = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "PerfBaselines" )
+defaultThreshold = 0.10
+defaultNoiseFactor = 1.0
+
+exitOk = 0
+exitRegression = 1
+exitNoBaseline = 2
+
+# Hot paths gated by default: decode per type, encode per type, file scan, parse and book building
+defaultGatedBenchmarks = ( "createFromBytes", "createFromArgs", "getValue", "scan", "parse", "orderBook" )
+
+def machineKey(machine):
+    """ File name safe key identifying the machine and interpreter a result was taken on. """
+    key = "{}-{}-{}-{}".format( machine["hostname"], machine["machine"], machine["implementation"], machine["python"] )
+    return re.sub( r'[^A-Za-z0-9_.-]', '_', key )
+
+def baselinePath(baselineDir, machine):
+    return os.path.join( baselineDir, machineKey( machine ) + ".json" )
+
+def loadResults(fileName):
+    with open( fileName ) as fileIn:
+        return json.load( fileIn )
+
+def saveResults(results, fileName):
+    os.makedirs( os.path.dirname( fileName ) or ".", exist_ok=True )
+    with open( fileName, 'w' ) as fileOut:
+        json.dump( results, fileOut, indent=2 )
+
+def relativeSpread(times):
+    """ Range of the samples as a fraction of their median. """
+    median = statistics.median( times )
+    if median <= 0:
+        return 0.0
+    return ( max( times ) - min( times ) ) / median
+
+def secondsPerMessage(entry):
+    # Median rather than best: a single lucky baseline sample should not fail every later run
+    return statistics.median( entry["times"] ) / entry["messages"]
+
+def compareResults(baseline, current, threshold=defaultThreshold, noiseFactor=defaultNoiseFactor,
+                   benchmarks=defaultGatedBenchmarks):
+    """ Compares current against baseline benchmark by benchmark.
+
+        A benchmark regresses when its median time per message is slower than
+        the baseline by more than the allowed fraction, which is threshold or
+        noiseFactor times the sample spread (range over median) of the
+        noisier of the two runs, whichever is larger. Returns one dict per
+        benchmark present in both runs, with the median msg/s the decision
+        was made on, plus the keys missing from current.
+    """
+    baselineEntries = { resultKey( entry ): entry for entry in baseline["results"] if entry["name"] in benchmarks }
+    currentEntries = { resultKey( entry ): entry for entry in current["results"] if entry["name"] in benchmarks }
+
+    comparisons = [ ]
+    for key, baselineEntry in baselineEntries.items():
+        currentEntry = currentEntries.get( key )
+        if currentEntry is None:
+            continue
+        change = secondsPerMessage( currentEntry ) / secondsPerMessage( baselineEntry ) - 1
+        noise = max( relativeSpread( baselineEntry["times"] ), relativeSpread( currentEntry["times"] ) )
+        allowed = max( threshold, noiseFactor * noise )
+        comparisons.append( {
+            "key"       : key,
+            "baseline"  : 1 / secondsPerMessage( baselineEntry ),
+            "current"   : 1 / secondsPerMessage( currentEntry ),
+            "change"    : change,
+            "allowed"   : allowed,
+            "regressed" : change > allowed,
+        } )
+    missing = sorted( set( baselineEntries ) - set( currentEntries ) )
+    return comparisons, missing
+
+def printComparisons(comparisons, missing, stream=sys.stdout):
+    for comparison in sorted( comparisons, key=lambda comparison: comparison["key"] ):
+        print( "{:4s} {:50s} {:>12,.0f} -> {:>12,.0f} median msg/s {:+7.1%} (allowed {:+.1%})".format(
+                   "FAIL" if comparison["regressed"] else "ok", comparison["key"], comparison["baseline"],
+                   comparison["current"], comparison["change"], comparison["allowed"] ), file=stream )
+    for key in missing:
+        print( "     {:50s} missing from current run".format( key ), file=stream )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser( description="Fail on significant slowdowns against a per machine baseline" )
+    parser.add_argument( "--baseline-dir", default=defaultBaselineDir )
+    parser.add_argument( "--baseline", help="baseline file to use instead of the one for this machine" )
+    parser.add_argument( "--current", help="compare an existing ItchBenchmark JSON file instead of running" )
+    parser.add_argument( "--update-baseline", action="store_true", help="store this run as the baseline and exit" )
+    parser.add_argument( "--threshold", type=float, default=defaultThreshold,
+                         help="minimum slowdown, as a fraction, that counts as a regression" )
+    parser.add_argument( "--noise-factor", type=float, default=defaultNoiseFactor,
+                         help="multiple of the measured sample spread that is tolerated" )
+    parser.add_argument( "--messages", type=int, default=defaultGeneratedMessages )
+    parser.add_argument( "--samples", action="store_true", help="also gate the tiny SamplesMessages files" )
+    parser.add_argument( "--repeat", type=int, default=defaultRepeat )
+    parser.add_argument( "--min-time", type=float, default=defaultMinTime )
+    parser.add_argument( "--only", nargs="*", default=list( defaultGatedBenchmarks ) )
+    args = parser.parse_args( argv )
+
+    if args.current:
+        current = loadResults( args.current )
+    else:
+        current = runBenchmarks( args.samples, args.messages, repeat=args.repeat, minTime=args.min_time,
+                                 only=args.only )
+    baselineFile = args.baseline or baselinePath( args.baseline_dir, current["machine"] )
+
+    if args.update_baseline:
+        saveResults( current, baselineFile )
+        print( "Stored baseline: {}".format( baselineFile ) )
+        return exitOk
+
+    if not os.path.exists( baselineFile ):
+        print( "No baseline for this machine: {} (run with --update-baseline)".format( baselineFile ), file=sys.stderr )
+        return exitNoBaseline
+
+    comparisons, missing = compareResults( loadResults( baselineFile ), current, args.threshold, args.noise_factor,
+                                           args.only )
+    printComparisons( comparisons, missing )
+    regressions = [ comparison for comparison in comparisons if comparison["regressed"] ]
+    if regressions:
+        print( "{} of {} benchmarks regressed".format( len( regressions ), len( comparisons ) ), file=sys.stderr )
+        return exitRegression
+    return exitOk
+
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from ItchPerfGate import *
+
+machine = { "hostname": "bench host", "machine": "x86_64", "implementation": "CPython", "python": "3.11.7" }
+
+def entry(name, messageType, times, messages=1000):
+    best = min( times )
+    return { "name": name, "input": "generated", "messageType": messageType, "messages": messages,
+             "bytes": messages * 30, "times": times, "best": best, "median": sorted( times )[ len( times ) // 2 ],
+             "messagesPerSecond": messages / best, "bytesPerSecond": messages * 30 / best }
+
+def results(*entries):
+    return { "schema": 1, "machine": machine, "results": list( entries ) }
+
+class ItchPerfGate_Test(unittest.TestCase):
+    """ Tests for the performance regression gate """
+
+    def test_machine_key_is_file_safe(self):
+        # GIVEN / WHEN
+        key = machineKey( machine )
+
+        # THEN
+        self.assertEqual( key, "bench_host-x86_64-CPython-3.11.7" )
+
+    def test_slowdown_beyond_threshold_regresses(self):
+        # GIVEN
+        baseline = results( entry( "createFromBytes", "A", [ 1.0, 1.01, 1.02 ] ) )
+        current = results( entry( "createFromBytes", "A", [ 1.3, 1.31, 1.32 ] ) )
+
+        # WHEN
+        comparisons, missing = compareResults( baseline, current )
+
+        # THEN
+        self.assertEqual( len( comparisons ), 1 )
+        self.assertTrue( comparisons[0]["regressed"] )
+        self.assertAlmostEqual( comparisons[0]["change"], 0.3, places=2 )
+        self.assertEqual( missing, [ ] )
+
+    def test_small_slowdown_passes(self):
+        # GIVEN
+        baseline = results( entry( "scan", None, [ 1.0, 1.0, 1.0 ] ) )
+        current = results( entry( "scan", None, [ 1.05, 1.05, 1.05 ] ) )
+
+        # WHEN
+        comparisons, _ = compareResults( baseline, current )
+
+        # THEN
+        self.assertFalse( comparisons[0]["regressed"] )
+
+    def test_speedup_passes(self):
+        # GIVEN
+        baseline = results( entry( "parse", None, [ 2.0, 2.0 ] ) )
+        current = results( entry( "parse", None, [ 1.0, 1.0 ] ) )
+
+        # WHEN
+        comparisons, _ = compareResults( baseline, current )
+
+        # THEN
+        self.assertFalse( comparisons[0]["regressed"] )
+        self.assertLess( comparisons[0]["change"], 0 )
+
+    def test_noisy_samples_widen_allowance(self):
+        # GIVEN
+        baseline = results( entry( "orderBook", None, [ 1.0, 1.2, 1.4 ] ) )
+        current = results( entry( "orderBook", None, [ 1.3, 1.4, 1.5 ] ) )
+
+        # WHEN
+        comparisons, _ = compareResults( baseline, current )
+
+        # THEN
+        self.assertGreater( comparisons[0]["allowed"], comparisons[0]["change"] )
+        self.assertGreater( comparisons[0]["change"], defaultThreshold )
+        self.assertFalse( comparisons[0]["regressed"] )
+
+    def test_compares_per_message(self):
+        # GIVEN
+        baseline = results( entry( "scan", None, [ 1.0 ], messages=1000 ) )
+        current = results( entry( "scan", None, [ 2.0 ], messages=2000 ) )
+
+        # WHEN
+        comparisons, _ = compareResults( baseline, current )
+
+        # THEN
+        self.assertAlmostEqual( comparisons[0]["change"], 0.0 )
+
+    def test_report_shows_the_median_rate(self):
+        # GIVEN one lucky fast sample in each run
+        baseline = results( entry( "scan", None, [ 0.01, 0.02, 0.02 ] ) )
+        current = results( entry( "scan", None, [ 0.01, 0.04, 0.04 ] ) )
+        stream = io.StringIO()
+
+        # WHEN
+        comparisons, missing = compareResults( baseline, current )
+        printComparisons( comparisons, missing, stream )
+
+        # THEN the printed rates are the medians the decision used, not the best samples
+        self.assertTrue( comparisons[0]["regressed"] )
+        self.assertIn( "50,000 ->       25,000 median msg/s", stream.getvalue() )
+
+    def test_missing_and_ungated_benchmarks(self):
+        # GIVEN
+        baseline = results( entry( "scan", None, [ 1.0 ] ), entry( "parse", None, [ 1.0 ] ) )
+        current = results( entry( "scan", None, [ 1.0 ] ) )
+
+        # WHEN
+        comparisons, missing = compareResults( baseline, current, benchmarks=( "scan", "parse" ) )
+        ungated, _ = compareResults( baseline, current, benchmarks=( "parse", ) )
+
+        # THEN
+        self.assertEqual( [ comparison["key"] for comparison in comparisons ], [ "scan/generated/*" ] )
+        self.assertEqual( missing, [ "parse/generated/*" ] )
+        self.assertEqual( ungated, [ ] )
+
+    def test_main_exit_codes(self):
+        # GIVEN
+        tempDir = tempfile.TemporaryDirectory()
+        self.addCleanup( tempDir.cleanup )
+        baselineFile = os.path.join( tempDir.name, "baseline.json" )
+        fastFile = os.path.join( tempDir.name, "fast.json" )
+        slowFile = os.path.join( tempDir.name, "slow.json" )
+        saveResults( results( entry( "createFromBytes", "A", [ 1.0, 1.0 ] ) ), fastFile )
+        saveResults( results( entry( "createFromBytes", "A", [ 2.0, 2.0 ] ) ), slowFile )
+        quiet = contextlib.redirect_stdout( io.StringIO() )
+
+        # WHEN
+        with quiet, contextlib.redirect_stderr( io.StringIO() ):
+            noBaseline = main( [ "--current", fastFile, "--baseline", baselineFile ] )
+            stored = main( [ "--current", fastFile, "--baseline", baselineFile, "--update-baseline" ] )
+            same = main( [ "--current", fastFile, "--baseline", baselineFile ] )
+            slower = main( [ "--current", slowFile, "--baseline", baselineFile ] )
+
+        # THEN
+        self.assertEqual( noBaseline, exitNoBaseline )
+        self.assertEqual( stored, exitOk )
+        self.assertEqual( same, exitOk )
+        self.assertEqual( slower, exitRegression )
+
+    def test_baseline_dir_per_machine(self):
+        # GIVEN
+        tempDir = tempfile.TemporaryDirectory()
+        self.addCleanup( tempDir.cleanup )
+        currentFile = os.path.join( tempDir.name, "current.json" )
+        saveResults( results( entry( "scan", None, [ 1.0 ] ) ), currentFile )
+
+        # WHEN
+        with contextlib.redirect_stdout( io.StringIO() ):
+            main( [ "--current", currentFile, "--baseline-dir", tempDir.name, "--update-baseline" ] )
+
+        # THEN
+        self.assertTrue( os.path.exists( os.path.join( tempDir.name, machineKey( machine ) + ".json" ) ) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+import io
+import mmap
+import queue
+import threading
+import zlib
+
+from Itch41 import *
+
+defaultBlockSize = 1 << 20
+decompressBlockSize = 1 << 20
+decompressQueueDepth = 8
+gzipWindowBits = zlib.MAX_WBITS | 16
+
+class ReadAheadGzipStream:
+    """ Decompresses a gzip stream on a background thread.
+
+        Compressed input is read in large blocks and the inflated output is
+        handed over through a bounded queue, so decompression (which releases
+        the GIL) overlaps with message decoding and nothing needs to be written
+        to scratch disk.
+    """
+
+    def __init__(self, rawStream, blockSize=decompressBlockSize, queueDepth=decompressQueueDepth,
+                 ownsRawStream=True):
+        self.rawStream = rawStream
+        self.ownsRawStream = ownsRawStream
+        self.blockSize = blockSize
+        self.queue = queue.Queue(queueDepth)
+        self.closed = False
+        self.current = memoryview(b'')
+        self.position = 0
+        self.finished = False
+        self.thread = threading.Thread(target=self.decompress, daemon=True)
+        self.thread.start()
+
+    def decompress(self):
+        # zlib releases the GIL for the whole inflate call, so feed it large inputs
+        item = None
+        try:
+            decompressor = zlib.decompressobj(gzipWindowBits)
+            inMember = False
+            while not self.closed:
+                compressed = self.rawStream.read(self.blockSize)
+                if not compressed:
+                    break
+                while compressed:
+                    inMember = True
+                    block = decompressor.decompress(compressed)
+                    if block:
+                        self.put(block)
+                    if not decompressor.eof:
+                        break
+                    # Concatenated gzip members
+                    inMember = False
+                    compressed = decompressor.unused_data
+                    decompressor = zlib.decompressobj(gzipWindowBits)
+            if inMember and not self.closed:
+                raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+        except Exception as error:
+            item = error
+        self.put(item)
+
+    def put(self, item):
+        while not self.closed:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readinto(self, target):
+        if self.position == len(self.current):
+            if self.finished:
+                return 0
+            item = self.queue.get()
+            if item is None:
+                self.finished = True
+                return 0
+            if isinstance(item, Exception):
+                self.finished = True
+                raise item
+            self.current = memoryview(item)
+            self.position = 0
+        count = min(len(target), len(self.current) - self.position)
+        target[:count] = self.current[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def close(self):
+        self.closed = True
+        self.thread.join()
+        if self.ownsRawStream:
+            self.rawStream.close()
+
+class ItchReader:
+    """ Streams length prefixed Itch 4.1 messages out of a file or stream.
+
+        Regular files are memory mapped and walked in place. Anything that
+        cannot be mapped (pipes, sockets, BytesIO) is read with readinto into
+        one reusable block, and only the tail of a message that straddles two
+        blocks is moved.
+
+        Gzipped files (.gz, or gzipped=True) are decompressed on a read ahead
+        thread and streamed through the readinto path.
+
+        frames() yields (buffer, offset) pairs, where buffer[offset:offset+2]
+        is the big endian length prefix. Views handed out by frames() and
+        views() point into the shared buffer. Over a memory map they keep the
+        map alive, but on the readinto path the block is reused, so a view is
+        only valid until the next message is requested; use
+        ItchMessageView.detach() to keep one.
+    """
+
+    def __init__(self, source, blockSize=defaultBlockSize, useMmap=True, gzipped=None):
+        self.blockSize = blockSize
+        self.useMmap = useMmap
+        self.ownsStream = isinstance(source, str)
+        if self.ownsStream:
+            self.stream = open(source, 'rb')
+            if gzipped is None:
+                gzipped = source.endswith('.gz')
+        else:
+            self.stream = source
+        if gzipped:
+            self.stream = ReadAheadGzipStream(self.stream, ownsRawStream=self.ownsStream)
+            self.ownsStream = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return self.views()
+
+    def close(self):
+        if self.ownsStream:
+            self.stream.close()
+
+    def frames(self):
+        mapped = self.mapStream() if self.useMmap else None
+        if mapped is None:
+            return self.readFrames()
+        return self.mappedFrames(mapped)
+
+    def acceptedFrames(self, accept):
+        if accept is None:
+            return self.frames()
+        return (frame for frame in self.frames() if accept(*frame))
+
+    def views(self, accept=None):
+        # accept(buffer, offset) can reject messages before anything is decoded
+        createView = ItchMessageFactory.createView
+        for buffer, offset in self.acceptedFrames(accept):
+            view = createView(buffer, offset)
+            if view is not None:
+                yield view
+
+    def messages(self, accept=None):
+        createFromBytes = ItchMessageFactory.createFromBytes
+        unpackLength = lengthPrefix.unpack_from
+        for buffer, offset in self.acceptedFrames(accept):
+            end = offset + 2 + unpackLength(buffer, offset)[0]
+            message = createFromBytes(bytes(buffer[offset:end]))
+            if message is not None:
+                yield message
+
+    def mapStream(self):
+        # Only plain files: wrappers such as GzipFile expose the fileno of what they wrap
+        if not isinstance(self.stream, (io.BufferedReader, io.FileIO)):
+            return None
+        try:
+            return mmap.mmap(self.stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, io.UnsupportedOperation):
+            return None
+
+    def mappedFrames(self, mapped):
+        buffer = memoryview(mapped)
+        try:
+            end = len(buffer)
+            offset = self.stream.tell()
+            unpackLength = lengthPrefix.unpack_from
+            while offset + 2 <= end:
+                nextOffset = offset + 2 + unpackLength(buffer, offset)[0]
+                if nextOffset > end:
+                    break
+                yield buffer, offset
+                offset = nextOffset
+            if offset != end:
+                raise ValueError("Truncated message at byte offset {}".format(offset))
+        finally:
+            # Views still held by callers keep the map alive until they drop them
+            del buffer
+            try:
+                mapped.close()
+            except BufferError:
+                pass
+
+    def readFrames(self):
+        block = bytearray(self.blockSize)
+        buffer = memoryview(block)
+        readinto = self.stream.readinto
+        unpackLength = lengthPrefix.unpack_from
+        consumed = 0
+        filled = 0
+        while True:
+            count = readinto(buffer[filled:])
+            if not count:
+                break
+            filled += count
+            offset = 0
+            while offset + 2 <= filled:
+                nextOffset = offset + 2 + unpackLength(buffer, offset)[0]
+                if nextOffset > filled:
+                    break
+                yield buffer, offset
+                offset = nextOffset
+
+            # Move the partial message to the front of the block for the next read
+            consumed += offset
+            filled -= offset
+            if filled and offset:
+                buffer[:filled] = buffer[offset:offset + filled]
+            elif filled == len(block):
+                block = bytearray(2 * len(block))
+                block[:filled] = buffer
+                buffer = memoryview(block)
+        if filled:
+            raise ValueError("Truncated message at byte offset {}".format(consumed))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import gzip
+import io
+import os
+import tempfile
+import unittest
+
+from Itch41 import *
+from ItchReader import *
+
+samplesDir = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "SamplesMessages" )
+
+def sampleFile(name):
+    return os.path.join( samplesDir, name )
+
+class ItchReader_Test(unittest.TestCase):
+    """ Tests for streaming length prefixed messages out of files and streams """
+
+    def test_mmap_reads_every_message(self):
+        # GIVEN
+        fileName = sampleFile( "Itch.test1.dat" )
+
+        # WHEN
+        with ItchReader( fileName ) as reader:
+            messages = [ ( view.MessageType, view.getValue( Field.OrderRefNum ) ) for view in reader ]
+
+        # THEN
+        self.assertEqual( [ ( 'T', "" ), ( 'A', 1 ), ( 'A', 2 ), ( 'A', 3 ), ( 'E', 2 ) ], messages )
+
+    def test_readinto_matches_mmap(self):
+        # GIVEN
+        with open( sampleFile( "T.50.itch" ), 'rb' ) as fileIn:
+            data = fileIn.read()
+
+        # WHEN
+        with ItchReader( sampleFile( "T.50.itch" ) ) as reader:
+            mapped = [ view.rawBytes() for view in reader ]
+        with ItchReader( io.BytesIO( data ), blockSize=16 ) as reader:
+            streamed = [ view.rawBytes() for view in reader ]
+
+        # THEN
+        self.assertEqual( 45, len( mapped ) )
+        self.assertEqual( mapped, streamed )
+        self.assertEqual( data, b"".join( streamed ) )
+
+    def test_messages_are_full_objects(self):
+        # WHEN
+        with ItchReader( sampleFile( "Itch.test2.dat" ), useMmap=False ) as reader:
+            messages = list( reader.messages() )
+
+        # THEN
+        self.assertEqual(       6, len( messages ) )
+        self.assertEqual(    2000, messages[0].Seconds )
+        self.assertEqual(      40, messages[4].NewOrderRefNum )
+        self.assertEqual(  100.52, messages[4].Price )
+
+    def test_truncated_stream_raises(self):
+        # GIVEN
+        data = bytes( [ 0x00, 0x05, 0x54, 0x00, 0x00, 0x58, 0xb7, 0x00, 0x05, 0x54 ] )
+
+        # WHEN / THEN
+        with self.assertRaises( ValueError ):
+            list( ItchReader( io.BytesIO( data ) ).frames() )
+
+class ItchReader_Gzip_Test(unittest.TestCase):
+    """ Tests for reading gzipped files through the read ahead thread """
+
+    def setUp(self):
+        with open( sampleFile( "T.50.itch" ), 'rb' ) as fileIn:
+            self.data = fileIn.read()
+        self.tempDir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_gz_file_matches_plain_file(self):
+        # GIVEN
+        fileName = os.path.join( self.tempDir.name, "T.50.itch.gz" )
+        with gzip.open( fileName, 'wb' ) as fileOut:
+            fileOut.write( self.data )
+
+        # WHEN
+        with ItchReader( fileName ) as reader:
+            streamed = [ view.rawBytes() for view in reader ]
+
+        # THEN
+        self.assertEqual( self.data, b"".join( streamed ) )
+
+    def test_concatenated_members_and_small_blocks(self):
+        # GIVEN
+        compressed = gzip.compress( self.data[:500] ) + gzip.compress( self.data[500:] )
+        stream = ReadAheadGzipStream( io.BytesIO( compressed ), blockSize=7, queueDepth=1 )
+
+        # WHEN
+        reader = ItchReader( stream, blockSize=16 )
+        streamed = [ view.rawBytes() for view in reader ]
+        stream.close()
+
+        # THEN
+        self.assertEqual( self.data, b"".join( streamed ) )
+
+    def test_truncated_gz_raises(self):
+        # GIVEN
+        compressed = gzip.compress( self.data )[:-12]
+
+        # WHEN / THEN
+        with ItchReader( io.BytesIO( compressed ), gzipped=True ) as reader:
+            with self.assertRaises( EOFError ):
+                list( reader.frames() )
+
+    def test_close_before_end_stops_thread(self):
+        # GIVEN
+        compressed = gzip.compress( self.data * 100 )
+        stream = ReadAheadGzipStream( io.BytesIO( compressed ), blockSize=64, queueDepth=1 )
+
+        # WHEN
+        next( iter( ItchReader( stream ) ) )
+        stream.close()
+
+        # THEN
+        self.assertFalse( stream.thread.is_alive() )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+import argparse
+import socket
+import time
+
+from Itch41 import *
+from ItchMoldUdp64 import moldHeader, defaultMaxPacketSize
+from ItchReader import ItchReader
+from ItchStats import bucketCount, percentile
+from ItchTime import timedFrames
+from ItchWriter import ItchWriter
+
+# Below this much time to go the pacer spins instead of sleeping
+defaultSpinThresholdNs = 1000000
+
+class Pacer:
+    """ Waits for perf_counter_ns deadlines: sleeps while more than
+        spinThresholdNs remain, then busy spins for the rest.
+    """
+
+    def __init__(self, spinThresholdNs=defaultSpinThresholdNs):
+        self.spinThresholdNs = spinThresholdNs
+        self.sleeps = 0
+        self.spins = 0
+
+    def waitUntil(self, deadline, clock=time.perf_counter_ns):
+        remaining = deadline - clock()
+        if remaining <= 0:
+            return
+        if remaining > self.spinThresholdNs:
+            self.sleeps += 1
+            time.sleep( ( remaining - self.spinThresholdNs ) / 1e9 )
+        self.spins += 1
+        while clock() < deadline:
+            pass
+
+class PacingStats:
+    """ How late each message left against its schedule, in a log2 ns histogram. """
+
+    def __init__(self):
+        self.buckets = [ 0 ] * bucketCount
+        self.count = 0
+        self.bytes = 0
+        self.totalLateNs = 0
+        self.maxLateNs = 0
+        self.feedSpanNs = 0
+        self.elapsedNs = 0
+
+    def record(self, lateNs, size):
+        if lateNs < 0:
+            lateNs = 0
+        self.buckets[ lateNs.bit_length() ] += 1
+        self.count += 1
+        self.bytes += size
+        self.totalLateNs += lateNs
+        if lateNs > self.maxLateNs:
+            self.maxLateNs = lateNs
+
+    def snapshot(self):
+        return {
+            "messages"   : self.count,
+            "bytes"      : self.bytes,
+            "feedSpanNs" : self.feedSpanNs,
+            "elapsedNs"  : self.elapsedNs,
+            "speed"      : self.feedSpanNs / self.elapsedNs if self.elapsedNs else None,
+            "meanLateNs" : self.totalLateNs / self.count if self.count else None,
+            "p50LateNs"  : percentile( self.buckets, self.maxLateNs, 0.50 ),
+            "p99LateNs"  : percentile( self.buckets, self.maxLateNs, 0.99 ),
+            "maxLateNs"  : self.maxLateNs,
+        }
+
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, buffer, offset, end):
+        self.callback( buffer, offset )
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class FileSink:
+    """ Writes frames as a plain length prefixed Itch file. """
+
+    def __init__(self, fileName):
+        self.writer = ItchWriter( fileName )
+
+    def write(self, buffer, offset, end):
+        self.writer.writeRaw( buffer[ offset : end ] )
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+class TcpSink:
+    """ Streams length prefixed frames to a TCP listener, readable with ItchReader on the socket. """
+
+    def __init__(self, address):
+        self.socket = socket.create_connection( address )
+        self.socket.setsockopt( socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 )
+        self.pending = bytearray()
+
+    def write(self, buffer, offset, end):
+        self.pending += buffer[ offset : end ]
+
+    def flush(self):
+        if self.pending:
+            self.socket.sendall( self.pending )
+            self.pending.clear()
+
+    def close(self):
+        self.flush()
+        self.socket.close()
+
+class UdpSink:
+    """ Sends frames as MoldUDP64 packets; frames due at the same time share a packet. """
+
+    def __init__(self, address, session="REPLAY", maxPacketSize=defaultMaxPacketSize):
+        self.address = address
+        self.session = session.ljust( 10 ).encode()
+        self.maxPacketSize = maxPacketSize
+        self.socket = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+        self.sequence = 1
+        self.packet = bytearray( moldHeader.size )
+        self.count = 0
+
+    def write(self, buffer, offset, end):
+        if self.count and len( self.packet ) + end - offset > self.maxPacketSize:
+            self.flush()
+        self.packet += buffer[ offset : end ]
+        self.count += 1
+
+    def flush(self):
+        if self.count:
+            moldHeader.pack_into( self.packet, 0, self.session, self.sequence, self.count )
+            self.socket.sendto( self.packet, self.address )
+            self.sequence += self.count
+            del self.packet[ moldHeader.size : ]
+            self.count = 0
+
+    def close(self):
+        self.flush()
+        self.socket.close()
+
+class ItchReplayer:
+    """ Replays frames at their recorded cadence, or speed times faster.
+
+        Each message is due at startWall + ( feedTime - firstFeedTime ) /
+        speed, with feed time from timedFrames(). The sink is flushed before
+        every wait, so messages due at the same instant go out together and a
+        speed of None (as fast as possible) never flushes mid stream. How late
+        each message was written against its due time is kept in stats.
+
+        sink is a callable(buffer, offset) or an object with write(buffer,
+        offset, end), flush() and close(), such as FileSink, TcpSink or UdpSink.
+    """
+
+    def __init__(self, sink, speed=1.0, spinThresholdNs=defaultSpinThresholdNs):
+        self.sink = sink if hasattr( sink, 'write' ) else CallbackSink( sink )
+        self.speed = speed
+        self.pacer = Pacer( spinThresholdNs )
+        self.stats = PacingStats()
+
+    def replay(self, frames, limit=None):
+        clock = time.perf_counter_ns
+        sink = self.sink
+        record = self.stats.record
+        waitUntil = self.pacer.waitUntil
+        unpackLength = lengthPrefix.unpack_from
+        speed = self.speed
+        firstFeedTime = None
+        startWall = clock()
+        feedTime = 0
+        for count, ( feedTime, buffer, offset ) in enumerate( timedFrames( frames ) ):
+            if count == limit:
+                break
+            if firstFeedTime is None:
+                firstFeedTime = feedTime
+                startWall = clock()
+            due = startWall
+            if speed:
+                due += int( ( feedTime - firstFeedTime ) / speed )
+                if due > clock():
+                    sink.flush()
+                    waitUntil( due )
+            end = offset + 2 + unpackLength( buffer, offset )[0]
+            sink.write( buffer, offset, end )
+            record( clock() - due if speed else 0, end - offset )
+        sink.flush()
+        self.stats.feedSpanNs = feedTime - firstFeedTime if firstFeedTime is not None else 0
+        self.stats.elapsedNs = clock() - startWall
+        return self.stats
+
+    def replayFile(self, fileName, limit=None):
+        with ItchReader( fileName ) as reader:
+            return self.replay( reader.frames(), limit )
+
+def parseAddress(value):
+    host, port = value.rsplit( ':', 1 )
+    return host, int( port )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="Replay an Itch 4.1 file at its recorded pace" )
+    parser.add_argument( "fileName" )
+    parser.add_argument( "--speed", default="1", help="multiplier, e.g. 1, 2, 10, or max" )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument( "--output", help="write the replayed frames to this file" )
+    target.add_argument( "--tcp", type=parseAddress, help="host:port to stream length prefixed frames to" )
+    target.add_argument( "--udp", type=parseAddress, help="host:port to send MoldUDP64 packets to" )
+    parser.add_argument( "--limit", type=int )
+    parser.add_argument( "--spin-threshold-us", type=float, default=defaultSpinThresholdNs / 1000 )
+    args = parser.parse_args()
+
+    if args.output:
+        sink = FileSink( args.output )
+    elif args.tcp:
+        sink = TcpSink( args.tcp )
+    elif args.udp:
+        sink = UdpSink( args.udp )
+    else:
+        sink = CallbackSink( lambda buffer, offset: None )
+    speed = None if args.speed == "max" else float( args.speed )
+    replayer = ItchReplayer( sink, speed, int( args.spin_threshold_us * 1000 ) )
+    try:
+        stats = replayer.replayFile( args.fileName, args.limit ).snapshot()
+    finally:
+        sink.close()
+    print( "Replayed {messages} messages, {feedSpanNs} ns of feed in {elapsedNs} ns".format( **stats ) )
+    if speed:
+        print( "Pacing error: mean {:.0f} ns, p50 {} ns, p99 {} ns, max {} ns".format(
+                   stats["meanLateNs"], stats["p50LateNs"], stats["p99LateNs"], stats["maxLateNs"] ) )
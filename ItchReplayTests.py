@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from Itch41 import *
+from ItchMoldUdp64 import moldHeader
+from ItchReplay import *
+from ItchWriter import ItchWriter
+
+def timeStamp(seconds):
+    return [ MessageType.TimeStamp, { Field.Seconds: seconds } ]
+
+def orderDelete(nanoSeconds, orderRefNum):
+    return [ MessageType.OrderDelete, { Field.NanoSeconds: nanoSeconds, Field.OrderRefNum: orderRefNum } ]
+
+class ItchReplay_Test(unittest.TestCase):
+    """ Tests for the timestamp paced replayer """
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join( self.tempDir.name, "feed.itch" )
+        # 30 ms of feed: a delete every 5 ms across a seconds boundary
+        self.messages = [ timeStamp( 100 ), orderDelete( 985000000, 1 ), orderDelete( 990000000, 2 ),
+                          orderDelete( 995000000, 3 ), timeStamp( 101 ), orderDelete( 0, 4 ),
+                          orderDelete( 5000000, 5 ), orderDelete( 10000000, 6 ), orderDelete( 15000000, 7 ) ]
+        with ItchWriter( self.fileName ) as writer:
+            for messageArgs in self.messages:
+                writer.writeArgs( messageArgs )
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def replayed(self, speed):
+        received = [ ]
+        replayer = ItchReplayer( lambda buffer, offset: received.append(
+                                     ( time.perf_counter_ns(), ItchMessageFactory.createFromBytes( buffer[ offset: ] ) ) ),
+                                 speed )
+        stats = replayer.replayFile( self.fileName )
+        return received, stats
+
+    def test_replayMaxSpeed(self):
+        # GIVEN the file replayed with no pacing
+        received, stats = self.replayed( None )
+
+        # THEN every message arrives, in order, and the feed span is reported
+        self.assertEqual( [ message.__class__.__name__ for timestamp, message in received ],
+                          [ messageType.name for messageType, values in self.messages ] )
+        self.assertEqual( stats.count, len( self.messages ) )
+        self.assertEqual( stats.feedSpanNs, 1015000000 )
+        self.assertEqual( stats.bytes, os.path.getsize( self.fileName ) )
+
+    def test_replayPacing(self):
+        # GIVEN a file replayed at 100x, so the 1.015 s of feed takes about 10 ms
+        received, stats = self.replayed( 100 )
+
+        # THEN each message arrives no earlier than its scheduled gap from the first
+        start = received[0][0]
+        scheduled = [ 0, 9850000, 9900000, 9950000, 10000000, 10000000, 10050000, 10100000, 10150000 ]
+        for ( timestamp, message ), offset in zip( received, scheduled ):
+            self.assertGreaterEqual( timestamp - start, offset - 100000 )
+        self.assertGreaterEqual( stats.elapsedNs, 10150000 )
+
+        # AND the pacing error is reported
+        snapshot = stats.snapshot()
+        self.assertEqual( snapshot["messages"], len( self.messages ) )
+        self.assertLessEqual( snapshot["p50LateNs"], snapshot["maxLateNs"] )
+        self.assertGreater( snapshot["speed"], 0 )
+
+    def test_pacer(self):
+        # GIVEN a pacer that spins for the last 2 ms
+        pacer = Pacer( spinThresholdNs=2000000 )
+
+        # WHEN it waits for 5 ms and then 0.5 ms
+        for waitNs in ( 5000000, 500000 ):
+            deadline = time.perf_counter_ns() + waitNs
+            pacer.waitUntil( deadline )
+
+            # THEN it never returns early
+            self.assertGreaterEqual( time.perf_counter_ns(), deadline )
+
+        # AND only the long wait slept
+        self.assertEqual( pacer.sleeps, 1 )
+        self.assertEqual( pacer.spins, 2 )
+
+    def test_fileSink(self):
+        # GIVEN a replay into a file
+        outputName = os.path.join( self.tempDir.name, "out.itch" )
+        sink = FileSink( outputName )
+        ItchReplayer( sink, None ).replayFile( self.fileName )
+        sink.close()
+
+        # THEN the output is byte for byte the input
+        with open( self.fileName, 'rb' ) as expected, open( outputName, 'rb' ) as actual:
+            self.assertEqual( actual.read(), expected.read() )
+
+    def test_tcpSink(self):
+        # GIVEN a TCP listener collecting everything it receives
+        listener = socket.create_server( ( "127.0.0.1", 0 ) )
+        chunks = [ ]
+        def accept():
+            connection, address = listener.accept()
+            with connection:
+                while True:
+                    chunk = connection.recv( 65536 )
+                    if not chunk:
+                        break
+                    chunks.append( chunk )
+        thread = threading.Thread( target=accept )
+        thread.start()
+
+        # WHEN the file is replayed to it
+        sink = TcpSink( listener.getsockname() )
+        ItchReplayer( sink, 1000 ).replayFile( self.fileName )
+        sink.close()
+        thread.join( 5 )
+        listener.close()
+
+        # THEN the stream is the length prefixed file
+        with open( self.fileName, 'rb' ) as expected:
+            self.assertEqual( b''.join( chunks ), expected.read() )
+
+    def test_udpSink(self):
+        # GIVEN a UDP socket
+        receiver = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+        receiver.bind( ( "127.0.0.1", 0 ) )
+        receiver.settimeout( 5 )
+
+        # WHEN the file is replayed to it at full speed in small packets
+        sink = UdpSink( receiver.getsockname(), session="TEST", maxPacketSize=60 )
+        ItchReplayer( sink, None ).replayFile( self.fileName )
+        sink.close()
+
+        # THEN MoldUDP64 packets carry consecutive sequence numbers and every frame
+        with open( self.fileName, 'rb' ) as expected:
+            stream = expected.read()
+        payload = b''
+        nextSequence = 1
+        while len( payload ) < len( stream ):
+            packet = receiver.recv( 65536 )
+            session, sequence, count = moldHeader.unpack_from( packet )
+            self.assertEqual( session, b"TEST      " )
+            self.assertEqual( sequence, nextSequence )
+            self.assertLessEqual( len( packet ), 60 )
+            nextSequence += count
+            payload += packet[ moldHeader.size: ]
+        receiver.close()
+        self.assertEqual( payload, stream )
+        self.assertEqual( nextSequence, len( self.messages ) + 1 )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import struct
+
+from Itch41 import *
+from ItchReader import ItchReader
+
+# SoupBinTCP 3.0 packet types
+class SoupPacket:
+    Debug            = b'+'
+    LoginAccepted    = b'A'
+    LoginRejected    = b'J'
+    SequencedData    = b'S'
+    ServerHeartbeat  = b'H'
+    EndOfSession     = b'Z'
+    LoginRequest     = b'L'
+    UnsequencedData  = b'U'
+    ClientHeartbeat  = b'R'
+    LogoutRequest    = b'O'
+
+# Big endian length of everything after the length field, then the packet type
+packetHeader = struct.Struct( '>Hc' )
+sequencedDataByte = ord( SoupPacket.SequencedData )
+
+defaultHeartbeatInterval = 1.0
+defaultTimeout = 15.0
+defaultReceiveBlockSize = 1 << 16
+
+class SoupLoginRejectedError(ConnectionError):
+    pass
+
+class SoupTimeoutError(TimeoutError):
+    pass
+
+def packet(packetType, payload=b''):
+    return packetHeader.pack( len( payload ) + 1, packetType ) + payload
+
+def loginRequest(username, password, session='', sequence=1):
+    return packet( SoupPacket.LoginRequest, username.ljust( 6 ).encode() + password.ljust( 10 ).encode() +
+                                            session.rjust( 10 ).encode() + str( sequence ).rjust( 20 ).encode() )
+
+def parseLoginRequest(payload):
+    return ( payload[0:6].decode().strip(), payload[6:16].decode().strip(), payload[16:26].decode().strip(),
+             int( payload[26:46] ) )
+
+def loginAccepted(session, sequence):
+    return packet( SoupPacket.LoginAccepted, session.rjust( 10 ).encode() + str( sequence ).rjust( 20 ).encode() )
+
+def loginRejected(reason):
+    return packet( SoupPacket.LoginRejected, reason )
+
+class SoupBinTcpClient(asyncio.BufferedProtocol):
+    """ Asyncio SoupBinTCP 3.0 client handing Itch frames to a consumer in place.
+
+        Bytes are received straight into one reusable block (BufferedProtocol),
+        and each Sequenced Data packet is turned into a normal length prefixed
+        Itch frame without copying: the 3 byte Soup header [len+1]['S'] is
+        overwritten so that its last two bytes hold the Itch length prefix.
+        consumer(buffer, offset) is then called with the same (buffer, offset)
+        shape as ItchReader.frames(); like the readinto path there, the frame is
+        only valid during the call. Without a consumer, messages() decodes each
+        frame with ItchMessageFactory.createFromBytes into a bounded queue,
+        pausing the socket while the queue is full.
+
+        A Client Heartbeat is sent whenever nothing has been sent for
+        heartbeatInterval seconds; the connection is dropped with
+        SoupTimeoutError if the server says nothing for timeout seconds.
+        sequence is the sequence number of the next message expected.
+    """
+
+    def __init__(self, consumer=None, heartbeatInterval=defaultHeartbeatInterval, timeout=defaultTimeout,
+                 blockSize=defaultReceiveBlockSize, queueSize=10000):
+        self.consumer = consumer
+        self.heartbeatInterval = heartbeatInterval
+        self.timeout = timeout
+        self.block = bytearray( blockSize )
+        self.buffer = memoryview( self.block )
+        self.filled = 0
+        self.transport = None
+        self.session = None
+        self.sequence = None
+        self.messageCount = 0
+        self.heartbeats = 0
+        self.debug = [ ]
+        # Unbounded so the end sentinel always fits; queueSize is where reading pauses
+        self.queue = None if consumer is not None else asyncio.Queue()
+        self.queueSize = queueSize
+        self.paused = False
+        self.loop = asyncio.get_running_loop()
+        self.loginResult = self.loop.create_future()
+        self.finished = self.loop.create_future()
+        self.lastSent = self.lastReceived = self.loop.time()
+        self.heartbeatTask = None
+
+    @classmethod
+    async def connect(cls, host, port, username, password, session='', sequence=1, **kwargs):
+        """ Connects and logs in; returns the client once Login Accepted arrives. """
+        loop = asyncio.get_running_loop()
+        _, client = await loop.create_connection( lambda: cls( **kwargs ), host, port )
+        client.send( loginRequest( username, password, session, sequence ) )
+        try:
+            await client.loginResult
+        except BaseException:
+            client.close()
+            raise
+        return client
+
+    # BufferedProtocol
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.heartbeatTask = self.loop.create_task( self.heartbeat() )
+
+    def get_buffer(self, sizehint):
+        if self.filled == len( self.block ):
+            # A single packet larger than the block
+            self.block = self.block + bytearray( len( self.block ) )
+            self.buffer = memoryview( self.block )
+        return self.buffer[ self.filled : ]
+
+    def buffer_updated(self, nbytes):
+        self.lastReceived = self.loop.time()
+        self.filled += nbytes
+        buffer = self.buffer
+        filled = self.filled
+        offset = 0
+        while offset + 3 <= filled:
+            length, packetType = packetHeader.unpack_from( buffer, offset )
+            end = offset + 2 + length
+            if end > filled:
+                break
+            if buffer[ offset + 2 ] == sequencedDataByte:
+                # [len+1]['S'][payload] becomes [ ][len][payload]: an Itch frame at offset + 1
+                lengthPrefix.pack_into( buffer, offset + 1, length - 1 )
+                self.messageCount += 1
+                self.sequence += 1
+                self.deliver( buffer, offset + 1 )
+            else:
+                self.control( packetType, bytes( buffer[ offset + 3 : end ] ) )
+            offset = end
+        filled -= offset
+        if filled and offset:
+            buffer[ : filled ] = buffer[ offset : offset + filled ]
+        self.filled = filled
+
+    def connection_lost(self, exc):
+        if self.heartbeatTask is not None:
+            self.heartbeatTask.cancel()
+        if not self.loginResult.done():
+            self.loginResult.set_exception( exc or ConnectionError( "Connection closed before login" ) )
+        self.finish( exc )
+
+    # Packet handling
+
+    def deliver(self, buffer, offset):
+        if self.consumer is not None:
+            self.consumer( buffer, offset )
+            return
+        end = offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0]
+        message = ItchMessageFactory.createFromBytes( bytes( buffer[ offset : end ] ) )
+        if message is not None:
+            self.queue.put_nowait( message )
+            if self.queue.qsize() >= self.queueSize and not self.paused:
+                self.transport.pause_reading()
+                self.paused = True
+
+    def control(self, packetType, payload):
+        if packetType == SoupPacket.ServerHeartbeat:
+            self.heartbeats += 1
+        elif packetType == SoupPacket.LoginAccepted:
+            self.session = payload[0:10].decode().strip()
+            self.sequence = int( payload[10:30] )
+            if not self.loginResult.done():
+                self.loginResult.set_result( self.session )
+        elif packetType == SoupPacket.LoginRejected:
+            if not self.loginResult.done():
+                self.loginResult.set_exception( SoupLoginRejectedError( "Login rejected: {}".format( payload.decode() ) ) )
+            self.transport.close()
+        elif packetType == SoupPacket.EndOfSession:
+            self.transport.close()
+        elif packetType == SoupPacket.Debug:
+            self.debug.append( payload.decode( errors='replace' ) )
+
+    def finish(self, exc=None):
+        if not self.finished.done():
+            if exc is None:
+                self.finished.set_result( self.messageCount )
+            else:
+                self.finished.set_exception( exc )
+        if self.queue is not None:
+            self.queue.put_nowait( None )
+
+    def send(self, data):
+        self.lastSent = self.loop.time()
+        self.transport.write( data )
+
+    async def heartbeat(self):
+        interval = min( self.heartbeatInterval, self.timeout ) / 2
+        while True:
+            await asyncio.sleep( interval )
+            now = self.loop.time()
+            if now - self.lastReceived > self.timeout:
+                self.transport.abort()
+                self.finish( SoupTimeoutError( "No data from server for {} seconds".format( self.timeout ) ) )
+                return
+            if now - self.lastSent >= self.heartbeatInterval:
+                self.send( packet( SoupPacket.ClientHeartbeat ) )
+
+    # Public API
+
+    async def messages(self):
+        """ Decoded messages until End of Session or the connection drops. """
+        while True:
+            message = await self.queue.get()
+            if self.paused and self.queue.qsize() < self.queueSize // 2:
+                self.transport.resume_reading()
+                self.paused = False
+            if message is None:
+                break
+            yield message
+        await self.wait()
+
+    async def wait(self):
+        """ Waits for End of Session or a dropped connection; returns the message count. """
+        return await self.finished
+
+    async def logout(self):
+        if not self.transport.is_closing():
+            self.send( packet( SoupPacket.LogoutRequest ) )
+        try:
+            await asyncio.wait_for( asyncio.shield( self.finished ), self.timeout )
+        except ConnectionError:
+            pass
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+class SoupBinTcpServer:
+    """ Local SoupBinTCP server replaying an Itch file, for loopback testing.
+
+        Each login gets the messages of fileName from the requested sequence
+        number (1 based; 0 means only new messages, of which a replay has none)
+        as Sequenced Data packets, followed by End of Session when endOfSession
+        is set, or by Server Heartbeats until the client logs out. username
+        and password of None accept any credentials; a requested session other
+        than blank or session is rejected.
+    """
+
+    def __init__(self, fileName, session="REPLAY", username=None, password=None, endOfSession=True,
+                 heartbeatInterval=defaultHeartbeatInterval):
+        self.fileName = fileName
+        self.session = session
+        self.username = username
+        self.password = password
+        self.endOfSession = endOfSession
+        self.heartbeatInterval = heartbeatInterval
+        self.server = None
+        self.logins = 0
+        self.sessions = set()
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server( self.handle, host, port )
+        return self
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        self.close()
+        await self.server.wait_closed()
+        # Let sessions that are already ending see their client hang up
+        if self.sessions:
+            await asyncio.wait( self.sessions, timeout=1.0 )
+        for task in self.sessions:
+            task.cancel()
+
+    def close(self):
+        self.server.close()
+
+    async def readPacket(self, reader):
+        length, packetType = packetHeader.unpack( await reader.readexactly( packetHeader.size ) )
+        return packetType, await reader.readexactly( length - 1 )
+
+    def checkLogin(self, username, password, session):
+        if ( self.username is not None and username != self.username ) or \
+           ( self.password is not None and password != self.password ):
+            return b'A'
+        if session and session != self.session:
+            return b'S'
+        return None
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.sessions.add( task )
+        try:
+            packetType, payload = await self.readPacket( reader )
+            if packetType != SoupPacket.LoginRequest:
+                return
+            username, password, session, sequence = parseLoginRequest( payload )
+            reason = self.checkLogin( username, password, session )
+            if reason is not None:
+                writer.write( loginRejected( reason ) )
+                await writer.drain()
+                return
+            self.logins += 1
+            frames = self.readFrames()
+            if sequence == 0:
+                sequence = len( frames ) + 1
+            writer.write( loginAccepted( self.session, sequence ) )
+            clientGone = asyncio.ensure_future( self.readUntilLogout( reader ) )
+            try:
+                await self.replay( writer, frames[ sequence - 1 : ] )
+                if self.endOfSession:
+                    writer.write( packet( SoupPacket.EndOfSession ) )
+                    await writer.drain()
+                    # Half close and keep reading until the client hangs up, so
+                    # its heartbeats are not left unread and the close is not a reset
+                    writer.write_eof()
+                    await asyncio.wait( [ clientGone ], timeout=defaultTimeout )
+                else:
+                    while not clientGone.done():
+                        writer.write( packet( SoupPacket.ServerHeartbeat ) )
+                        await writer.drain()
+                        await asyncio.wait( [ clientGone ], timeout=self.heartbeatInterval )
+            finally:
+                clientGone.cancel()
+        except ( asyncio.IncompleteReadError, ConnectionError ):
+            pass
+        except asyncio.CancelledError:
+            # Server shutting down; start_server would log a cancelled handler as an error
+            pass
+        finally:
+            self.sessions.discard( task )
+            writer.close()
+
+    def readFrames(self):
+        with ItchReader( self.fileName ) as reader:
+            return [ bytes( buffer[ offset + 2 : offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0] ] )
+                     for buffer, offset in reader.frames() ]
+
+    async def replay(self, writer, payloads):
+        pending = 0
+        for payload in payloads:
+            writer.write( packetHeader.pack( len( payload ) + 1, SoupPacket.SequencedData ) + payload )
+            pending += len( payload ) + 3
+            if pending >= defaultReceiveBlockSize:
+                await writer.drain()
+                pending = 0
+
+    async def readUntilLogout(self, reader):
+        try:
+            while True:
+                packetType, _ = await self.readPacket( reader )
+                if packetType == SoupPacket.LogoutRequest:
+                    return
+        except ( asyncio.IncompleteReadError, ConnectionError ):
+            return
+
+async def serve(fileName, host, port, endOfSession):
+    server = await SoupBinTcpServer( fileName, endOfSession=endOfSession ).start( host, port )
+    print( "Replaying {} on {}:{}".format( fileName, host, server.port ) )
+    async with server.server:
+        await server.server.serve_forever()
+
+async def receive(host, port, username, password, session, sequence):
+    counts = { }
+    def count(buffer, offset):
+        messageType = chr( buffer[ offset + 2 ] )
+        counts[ messageType ] = counts.get( messageType, 0 ) + 1
+    client = await SoupBinTcpClient.connect( host, port, username, password, session, sequence, consumer=count )
+    total = await client.wait()
+    print( "Session {}: {} messages {}".format( client.session, total, counts ) )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="SoupBinTCP replay server and client for Itch 4.1" )
+    commands = parser.add_subparsers( dest="command", required=True )
+    serveParser = commands.add_parser( "serve", help="replay a file to every client that logs in" )
+    serveParser.add_argument( "fileName" )
+    serveParser.add_argument( "--host", default="127.0.0.1" )
+    serveParser.add_argument( "--port", type=int, default=0 )
+    serveParser.add_argument( "--heartbeat-only", action="store_true", help="keep sessions open after the replay" )
+    receiveParser = commands.add_parser( "receive", help="log in and count the messages received" )
+    receiveParser.add_argument( "host" )
+    receiveParser.add_argument( "port", type=int )
+    receiveParser.add_argument( "--username", default="" )
+    receiveParser.add_argument( "--password", default="" )
+    receiveParser.add_argument( "--session", default="" )
+    receiveParser.add_argument( "--sequence", type=int, default=1 )
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run( serve( args.fileName, args.host, args.port, not args.heartbeat_only ) )
+    else:
+        asyncio.run( receive( args.host, args.port, args.username, args.password, args.session, args.sequence ) )
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+
+from Itch41 import *
+from ItchReader import ItchReader
+from ItchSoupBinTcp import *
+
+sampleFile = "SamplesMessages/T.50.itch"
+
+def fileFrames(fileName):
+    with ItchReader( fileName ) as reader:
+        return [ bytes( buffer[ offset : offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0] ] )
+                 for buffer, offset in reader.frames() ]
+
+class Collector:
+    def __init__(self):
+        self.frames = [ ]
+
+    def __call__(self, buffer, offset):
+        self.frames.append( bytes( buffer[ offset : offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0] ] ) )
+
+class ItchSoupBinTcp_Packet_Test(unittest.TestCase):
+    """ Tests for SoupBinTCP packet encoding """
+
+    def test_login_request_round_trip(self):
+        # GIVEN
+        request = loginRequest( "user", "secret", "SESSION1", 42 )
+
+        # WHEN
+        length, packetType = packetHeader.unpack_from( request )
+        fields = parseLoginRequest( request[3:] )
+
+        # THEN
+        self.assertEqual( length, 47 )
+        self.assertEqual( packetType, SoupPacket.LoginRequest )
+        self.assertEqual( fields, ( "user", "secret", "SESSION1", 42 ) )
+
+    def test_login_accepted_layout(self):
+        # GIVEN / WHEN
+        accepted = loginAccepted( "REPLAY", 7 )
+
+        # THEN
+        self.assertEqual( accepted[:3], b'\x00\x1fA' )
+        self.assertEqual( accepted[3:13], b'    REPLAY' )
+        self.assertEqual( int( accepted[13:] ), 7 )
+
+class ItchSoupBinTcp_Session_Test(unittest.IsolatedAsyncioTestCase):
+    """ Tests for the SoupBinTCP client against the local replay server """
+
+    async def asyncSetUp(self):
+        self.server = await SoupBinTcpServer( sampleFile, username="user", password="pw" ).start()
+        self.expected = fileFrames( sampleFile )
+
+    async def asyncTearDown(self):
+        await self.server.__aexit__( None, None, None )
+
+    async def test_consumer_gets_itch_frames(self):
+        # GIVEN
+        collector = Collector()
+
+        # WHEN
+        client = await SoupBinTcpClient.connect( '127.0.0.1', self.server.port, "user", "pw", consumer=collector )
+        count = await client.wait()
+
+        # THEN
+        self.assertEqual( client.session, "REPLAY" )
+        self.assertEqual( count, len( self.expected ) )
+        self.assertEqual( collector.frames, self.expected )
+        self.assertEqual( client.sequence, len( self.expected ) + 1 )
+
+    async def test_small_receive_block(self):
+        # GIVEN
+        collector = Collector()
+
+        # WHEN
+        client = await SoupBinTcpClient.connect( '127.0.0.1', self.server.port, "user", "pw", consumer=collector,
+                                                 blockSize=8 )
+        await client.wait()
+
+        # THEN
+        self.assertEqual( collector.frames, self.expected )
+
+    async def test_messages_are_decoded(self):
+        # GIVEN
+        client = await SoupBinTcpClient.connect( '127.0.0.1', self.server.port, "user", "pw", queueSize=4 )
+
+        # WHEN
+        messages = [ message async for message in client.messages() ]
+
+        # THEN
+        self.assertEqual( [ bytes( message.rawMessage ) for message in messages ], self.expected )
+        self.assertEqual( messages[0].MessageType, chr( self.expected[0][2] ) )
+
+    async def test_requested_sequence(self):
+        # GIVEN
+        collector = Collector()
+
+        # WHEN
+        client = await SoupBinTcpClient.connect( '127.0.0.1', self.server.port, "user", "pw", sequence=40,
+                                                 consumer=collector )
+        await client.wait()
+
+        # THEN
+        self.assertEqual( collector.frames, self.expected[39:] )
+
+    async def test_bad_password_rejected(self):
+        # GIVEN / WHEN / THEN
+        with self.assertRaises( SoupLoginRejectedError ):
+            await SoupBinTcpClient.connect( '127.0.0.1', self.server.port, "user", "wrong", consumer=Collector() )
+
+    async def test_unknown_session_rejected(self):
+        # GIVEN / WHEN / THEN
+        with self.assertRaises( SoupLoginRejectedError ):
+            await SoupBinTcpClient.connect( '127.0.0.1', self.server.port, "user", "pw", session="OTHER",
+                                            consumer=Collector() )
+
+class ItchSoupBinTcp_Heartbeat_Test(unittest.IsolatedAsyncioTestCase):
+    """ Tests for SoupBinTCP heartbeats, logout and timeouts """
+
+    async def test_heartbeats_until_logout(self):
+        # GIVEN
+        server = await SoupBinTcpServer( sampleFile, endOfSession=False, heartbeatInterval=0.02 ).start()
+        collector = Collector()
+        client = await SoupBinTcpClient.connect( '127.0.0.1', server.port, "", "", consumer=collector,
+                                                 heartbeatInterval=0.02 )
+
+        # WHEN
+        await asyncio.sleep( 0.2 )
+        await client.logout()
+
+        # THEN
+        self.assertGreater( client.heartbeats, 2 )
+        self.assertEqual( len( collector.frames ), len( fileFrames( sampleFile ) ) )
+        self.assertTrue( client.finished.done() )
+        await server.__aexit__( None, None, None )
+
+    async def test_silent_server_times_out(self):
+        # GIVEN
+        async def silent(reader, writer):
+            await reader.read( 49 )
+            writer.write( loginAccepted( "SILENT", 1 ) )
+            await asyncio.sleep( 1 )
+            writer.close()
+        server = await asyncio.start_server( silent, '127.0.0.1', 0 )
+        port = server.sockets[0].getsockname()[1]
+
+        # WHEN
+        client = await SoupBinTcpClient.connect( '127.0.0.1', port, "", "", consumer=Collector(),
+                                                 heartbeatInterval=0.02, timeout=0.1 )
+
+        # THEN
+        with self.assertRaises( SoupTimeoutError ):
+            await client.wait()
+        server.close()
+        await server.wait_closed()
+
+if __name__ == '__main__':
+    unittest.main()
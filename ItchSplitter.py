@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import argparse
+import collections
+import os
+import struct
+
+from Itch41 import *
+from ItchFilter import rawStock, rawOrderRefNum, stockOffsets, orderRefNumOffsets, newOrderRefNumOffsets, \
+                       sharesOffsets, addOrderBytes, orderReplaceByte, orderDeleteByte
+from ItchReader import ItchReader
+
+# '@' never appears in a stock symbol, and is replaced if a malformed one
+# carries it, so no symbol shard can take the shared shard's file
+sharedShardName = "@shared"
+defaultShardBufferSize = 1 << 16
+defaultMaxOpenFiles = 256
+
+# OrderRefNum and Shares in one unpack, per type byte of the messages that have both
+refAndShares = [ None if refOffset is None or sharesOffset is None else
+                 struct.Struct( '>q{}xi'.format( sharesOffset - refOffset - 8 ) )
+                 for refOffset, sharesOffset in zip( orderRefNumOffsets, sharesOffsets ) ]
+
+class Shard:
+    __slots__ = ( 'fileName', 'buffer', 'messages' )
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.buffer = bytearray()
+        self.messages = 0
+
+class ItchSplitter:
+    """ Splits a stream of framed messages into one Itch file per symbol.
+
+        Messages carrying a Stock field go to that symbol's shard. Order level
+        messages follow their OrderRefNum (through OrderReplace) to the shard
+        of the add that created the order, until it is deleted or its
+        shares are all executed or cancelled. Everything else (TimeStamp,
+        SystemEvent, BrokenTrade, and orders added before the file started)
+        goes to the shared shard. Output keeps the same length prefixed
+        framing as the input and ItchMessage.saveToFile.
+
+        Each shard buffers bufferSize bytes in memory; at most maxOpenFiles
+        handles are kept open, least recently flushed closed first.
+    """
+
+    def __init__(self, outputDir, bufferSize=defaultShardBufferSize, maxOpenFiles=defaultMaxOpenFiles):
+        self.outputDir = outputDir
+        self.bufferSize = bufferSize
+        self.maxOpenFiles = maxOpenFiles
+        self.shardsByRawStock = { }
+        self.orders = { }
+        self.openFiles = collections.OrderedDict()
+        self.created = set()
+        os.makedirs( outputDir, exist_ok=True )
+        self.shared = self.newShard( sharedShardName )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def newShard(self, name):
+        return Shard( os.path.join( self.outputDir, name + ".itch" ) )
+
+    def shardFor(self, rawStockBytes):
+        shard = self.shardsByRawStock.get( rawStockBytes )
+        if shard is None:
+            name = rawStockBytes.decode().strip().replace( os.sep, '_' ).replace( '@', '_' )
+            shard = self.shardsByRawStock[ rawStockBytes ] = self.newShard( name )
+        return shard
+
+    def write(self, buffer, offset):
+        typeByte = buffer[ offset + 2 ]
+        stockOffset = stockOffsets[ typeByte ]
+        refOffset = orderRefNumOffsets[ typeByte ]
+        if stockOffset is not None:
+            shard = self.shardFor( rawStock.unpack_from( buffer, offset + stockOffset )[0] )
+            if typeByte in addOrderBytes:
+                orderRefNum, shares = refAndShares[ typeByte ].unpack_from( buffer, offset + refOffset )
+                self.orders[ orderRefNum ] = [ shard, shares ]
+        elif refOffset is not None:
+            orderRefNum = rawOrderRefNum.unpack_from( buffer, offset + refOffset )[0]
+            order = self.orders.get( orderRefNum )
+            if order is None:
+                shard = self.shared
+            elif typeByte == orderDeleteByte:
+                shard = order[0]
+                del self.orders[ orderRefNum ]
+            elif typeByte == orderReplaceByte:
+                shard = order[0]
+                del self.orders[ orderRefNum ]
+                newOrderRefNum = rawOrderRefNum.unpack_from( buffer, offset + newOrderRefNumOffsets[ typeByte ] )[0]
+                self.orders[ newOrderRefNum ] = [ shard, refAndShares[ typeByte ].unpack_from( buffer, offset + refOffset )[1] ]
+            else:
+                # OrderExecuted, OrderExecutedWithPrice and OrderCancel: an
+                # order whose shares are all gone is forgotten
+                shard = order[0]
+                order[1] -= refAndShares[ typeByte ].unpack_from( buffer, offset + refOffset )[1]
+                if order[1] <= 0:
+                    del self.orders[ orderRefNum ]
+        else:
+            shard = self.shared
+
+        end = offset + 2 + lengthPrefix.unpack_from( buffer, offset )[0]
+        shard.buffer += buffer[ offset : end ]
+        shard.messages += 1
+        if len( shard.buffer ) >= self.bufferSize:
+            self.flush( shard )
+
+    def splitFile(self, fileName):
+        write = self.write
+        with ItchReader( fileName ) as reader:
+            for buffer, offset in reader.frames():
+                write( buffer, offset )
+
+    def flush(self, shard):
+        if not shard.buffer:
+            return
+        fileOut = self.openFiles.pop( shard.fileName, None )
+        if fileOut is None:
+            if len( self.openFiles ) >= self.maxOpenFiles:
+                self.openFiles.popitem( last=False )[1].close()
+            openMode = 'ab' if shard.fileName in self.created else 'wb'
+            self.created.add( shard.fileName )
+            fileOut = open( shard.fileName, openMode )
+        self.openFiles[ shard.fileName ] = fileOut
+        fileOut.write( shard.buffer )
+        shard.buffer.clear()
+
+    def shards(self):
+        return [ self.shared ] + list( self.shardsByRawStock.values() )
+
+    def close(self):
+        for shard in self.shards():
+            self.flush( shard )
+        for fileOut in self.openFiles.values():
+            fileOut.close()
+        self.openFiles.clear()
+
+    def counts(self):
+        return { os.path.basename( shard.fileName ): shard.messages for shard in self.shards() }
+
+def splitFile(fileName, outputDir, bufferSize=defaultShardBufferSize, maxOpenFiles=defaultMaxOpenFiles):
+    with ItchSplitter( outputDir, bufferSize, maxOpenFiles ) as splitter:
+        splitter.splitFile( fileName )
+    return splitter.counts()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="Split an Itch 4.1 file into one file per symbol" )
+    parser.add_argument( "fileName" )
+    parser.add_argument( "outputDir" )
+    parser.add_argument( "--buffer-size", type=int, default=defaultShardBufferSize )
+    parser.add_argument( "--max-open-files", type=int, default=defaultMaxOpenFiles )
+    args = parser.parse_args()
+    counts = splitFile( args.fileName, args.outputDir, args.buffer_size, args.max_open_files )
+    print( "Wrote {} shards, {} messages".format( len( counts ), sum( counts.values() ) ) )
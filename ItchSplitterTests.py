@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+
+from Itch41 import *
+from ItchSplitter import *
+from ItchReader import ItchReader
+from ItchTestHelpers import frame, addOrder
+
+class ItchSplitter_Test(unittest.TestCase):
+    """ Tests for splitting a day file into per symbol files """
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join( self.tempDir.name, "day.itch" )
+        self.outputDir = os.path.join( self.tempDir.name, "shards" )
+        self.frames = {
+            "T"    : frame( MessageType.TimeStamp, Seconds=100 ),
+            "S"    : frame( MessageType.SystemEvent, NanoSeconds=1, EventCode='O' ),
+            "R"    : frame( MessageType.StockDirectory, NanoSeconds=2, Stock="MSFT", MarketCategory='Q',
+                            FinancialStatus=' ', RoundLotSize=100, RoundLotsOnly='N' ),
+            "A1"   : addOrder( 1, "AAPL" ),
+            "A2"   : addOrder( 2, "MSFT" ),
+            "A3"   : addOrder( 3, "IBM" ),
+            "U1"   : frame( MessageType.OrderReplace, NanoSeconds=3, OrderRefNum=1, NewOrderRefNum=10,
+                            Shares=50, Price=10.5 ),
+            "E10"  : frame( MessageType.OrderExecuted, NanoSeconds=4, OrderRefNum=10, Shares=50, MatchNum=1 ),
+            "X2"   : frame( MessageType.OrderCancel, NanoSeconds=5, OrderRefNum=2, Shares=10 ),
+            "D3"   : frame( MessageType.OrderDelete, NanoSeconds=6, OrderRefNum=3 ),
+            "D99"  : frame( MessageType.OrderDelete, NanoSeconds=7, OrderRefNum=99 ),
+        }
+        order = [ "T", "S", "R", "A1", "A2", "A3", "U1", "E10", "X2", "D3", "D99" ]
+        with open( self.fileName, 'wb' ) as fileOut:
+            for name in order:
+                fileOut.write( self.frames[ name ] )
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def shardBytes(self, name):
+        with open( os.path.join( self.outputDir, name + ".itch" ), 'rb' ) as fileIn:
+            return fileIn.read()
+
+    def expected(self, *names):
+        return b"".join( self.frames[ name ] for name in names )
+
+    def test_split_follows_orders(self):
+        # WHEN
+        counts = splitFile( self.fileName, self.outputDir, bufferSize=1, maxOpenFiles=2 )
+
+        # THEN
+        self.assertEqual( { "@shared.itch": 3, "AAPL.itch": 3, "MSFT.itch": 3, "IBM.itch": 2 }, counts )
+        self.assertEqual( self.expected( "T", "S", "D99" ), self.shardBytes( "@shared" ) )
+        self.assertEqual( self.expected( "A1", "U1", "E10" ), self.shardBytes( "AAPL" ) )
+        self.assertEqual( self.expected( "R", "A2", "X2" ), self.shardBytes( "MSFT" ) )
+        self.assertEqual( self.expected( "A3", "D3" ), self.shardBytes( "IBM" ) )
+
+    def test_symbols_cannot_take_the_shared_shard(self):
+        # GIVEN
+        with open( self.fileName, 'ab' ) as fileOut:
+            fileOut.write( addOrder( 4, "_shared" ) )
+
+        # WHEN
+        counts = splitFile( self.fileName, self.outputDir )
+
+        # THEN
+        self.assertEqual( 3, counts[ sharedShardName + ".itch" ] )
+        self.assertEqual( self.expected( "T", "S", "D99" ), self.shardBytes( sharedShardName ) )
+        self.assertEqual( addOrder( 4, "_shared" ), self.shardBytes( "_shared" ) )
+
+    def test_filled_orders_are_forgotten(self):
+        # GIVEN
+        with open( self.fileName, 'ab' ) as fileOut:
+            fileOut.write( frame( MessageType.OrderCancel, NanoSeconds=8, OrderRefNum=2, Shares=90 ) )
+            fileOut.write( frame( MessageType.OrderExecuted, NanoSeconds=9, OrderRefNum=10, Shares=1, MatchNum=2 ) )
+
+        # WHEN
+        with ItchSplitter( self.outputDir ) as splitter:
+            splitter.splitFile( self.fileName )
+            orders = dict( splitter.orders )
+
+        # THEN nothing is left live, and a late execution goes to the shared shard
+        self.assertEqual( { }, orders )
+        self.assertEqual( 4, splitter.shared.messages )
+
+    def test_shards_are_readable_itch_files(self):
+        # WHEN
+        splitFile( self.fileName, self.outputDir )
+
+        # THEN
+        with ItchReader( os.path.join( self.outputDir, "AAPL.itch" ) ) as reader:
+            self.assertEqual( [ 'A', 'U', 'E' ], [ view.MessageType for view in reader ] )
+
+    def test_rerun_truncates_previous_output(self):
+        # WHEN
+        splitFile( self.fileName, self.outputDir, bufferSize=1 )
+        splitFile( self.fileName, self.outputDir, bufferSize=1 )
+
+        # THEN
+        self.assertEqual( self.expected( "A3", "D3" ), self.shardBytes( "IBM" ) )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+import atexit
+import sys
+import time
+
+from Itch41 import *
+from ItchReader import ItchReader
+
+bucketCount = 64
+
+def percentile(buckets, maxNs, fraction):
+    """ Upper bound of the bucket holding the given fraction of samples,
+        where bucket n counts latencies below 2**n and at least 2**(n-1).
+    """
+    total = sum( buckets )
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for bucket, count in enumerate( buckets ):
+        seen += count
+        if count and seen >= rank:
+            return min( ( 1 << bucket ) - 1, maxNs )
+    return maxNs
+
+class StageStats:
+    """ Counters for one stage, kept in flat per type byte lists so the hot
+        path is a handful of list index updates.
+    """
+    __slots__ = ( 'bytes', 'totalNs', 'maxNs', 'buckets' )
+
+    def __init__(self):
+        self.bytes = [ 0 ] * 256
+        self.totalNs = [ 0 ] * 256
+        self.maxNs = [ 0 ] * 256
+        self.buckets = [ 0 ] * ( 256 * bucketCount )
+
+    def typeBuckets(self, typeByte):
+        return self.buckets[ typeByte * bucketCount : ( typeByte + 1 ) * bucketCount ]
+
+    def count(self, typeByte):
+        return sum( self.typeBuckets( typeByte ) )
+
+    def typeBytes(self):
+        return [ typeByte for typeByte in range( 256 ) if self.count( typeByte ) ]
+
+    def snapshot(self, typeByte):
+        buckets = self.typeBuckets( typeByte )
+        count = sum( buckets )
+        maxNs = self.maxNs[ typeByte ]
+        return {
+            "count"     : count,
+            "bytes"     : self.bytes[ typeByte ],
+            "totalNs"   : self.totalNs[ typeByte ],
+            "maxNs"     : maxNs,
+            "meanNs"    : self.totalNs[ typeByte ] / count,
+            "p50Ns"     : percentile( buckets, maxNs, 0.50 ),
+            "p99Ns"     : percentile( buckets, maxNs, 0.99 ),
+            "p999Ns"    : percentile( buckets, maxNs, 0.999 ),
+            # Upper bound (exclusive) of each non empty bucket, in ns
+            "histogram" : { 1 << bucket: count for bucket, count in enumerate( buckets ) if count },
+        }
+
+def typeName(typeByte):
+    try:
+        return MessageType( chr( typeByte ) ).name
+    except ValueError:
+        return "Unknown"
+
+class ItchInstrumentation:
+    """ Per message type counters and latency histograms for the decoder and reader.
+
+        While enabled, ItchMessageFactory.createFromBytes and ItchReader.frames
+        are replaced by timing wrappers: the "decode" stage records count,
+        bytes and decode time per type byte; the "read" stage records count,
+        bytes and the time spent inside the reader producing each frame.
+        disable() puts the original functions back, so a disabled build pays
+        nothing. Code that bound createFromBytes to a local before enable()
+        keeps calling the uninstrumented function.
+
+        snapshot() returns plain dicts and may be polled while running;
+        summary() formats the same numbers as a table. reset() only affects
+        readers started after it.
+    """
+    stages = ( "decode", "read" )
+
+    def __init__(self):
+        self.enabled = False
+        self.atExitRegistered = False
+        self.reset()
+
+    def reset(self):
+        self.stageStats = { stage: StageStats() for stage in ItchInstrumentation.stages }
+        self.started = time.perf_counter()
+
+    def enable(self, dumpAtExit=False, stream=None):
+        if not self.enabled:
+            ItchMessageFactory.createFromBytes = staticmethod( instrumentedCreateFromBytes )
+            ItchReader.frames = instrumentedFrames
+            self.enabled = True
+        if dumpAtExit and not self.atExitRegistered:
+            atexit.register( self.dump, stream )
+            self.atExitRegistered = True
+
+    def disable(self):
+        if self.enabled:
+            ItchMessageFactory.createFromBytes = originalCreateFromBytes
+            ItchReader.frames = originalFrames
+            self.enabled = False
+
+    def snapshot(self):
+        snapshot = { "enabled": self.enabled, "elapsed": time.perf_counter() - self.started }
+        for stage, stats in self.stageStats.items():
+            snapshot[ stage ] = { chr( typeByte ): stats.snapshot( typeByte ) for typeByte in stats.typeBytes() }
+        return snapshot
+
+    def summary(self):
+        lines = [ ]
+        for stage, stats in self.stageStats.items():
+            rows = [ ( typeByte, stats.snapshot( typeByte ) ) for typeByte in stats.typeBytes() ]
+            if not rows:
+                continue
+            lines.append( "{:6s} {:1s} {:25s} {:>12s} {:>14s} {:>9s} {:>9s} {:>9s} {:>10s}".format(
+                              stage, "", "MessageType", "count", "bytes", "mean ns", "p50 ns", "p99 ns", "max ns" ) )
+            for typeByte, row in rows:
+                lines.append( "{:6s} {:1s} {:25s} {:>12,d} {:>14,d} {:>9,.0f} {:>9,d} {:>9,d} {:>10,d}".format(
+                                  "", chr( typeByte ), typeName( typeByte ), row["count"], row["bytes"],
+                                  row["meanNs"], row["p50Ns"], row["p99Ns"], row["maxNs"] ) )
+        return "\n".join( lines )
+
+    def dump(self, stream=None):
+        summary = self.summary()
+        if summary:
+            print( summary, file=stream or sys.stderr )
+
+instrumentation = ItchInstrumentation()
+
+# The exact class attributes, so disable() restores them untouched
+originalCreateFromBytes = ItchMessageFactory.__dict__[ 'createFromBytes' ]
+originalFrames = ItchReader.frames
+
+def instrumentedCreateFromBytes(rawMessage, createFromBytes=originalCreateFromBytes.__func__,
+                                clock=time.perf_counter_ns):
+    start = clock()
+    message = createFromBytes( rawMessage )
+    ns = clock() - start
+    stats = instrumentation.stageStats[ "decode" ]
+    typeByte = rawMessage[2]
+    stats.buckets[ typeByte * bucketCount + ns.bit_length() ] += 1
+    stats.bytes[ typeByte ] += len( rawMessage )
+    stats.totalNs[ typeByte ] += ns
+    if ns > stats.maxNs[ typeByte ]:
+        stats.maxNs[ typeByte ] = ns
+    return message
+
+def instrumentedFrames(reader):
+    frames = originalFrames( reader )
+    clock = time.perf_counter_ns
+    stats = instrumentation.stageStats[ "read" ]
+    buckets, sizes, totalNs, maxNs = stats.buckets, stats.bytes, stats.totalNs, stats.maxNs
+    unpackLength = lengthPrefix.unpack_from
+    try:
+        while True:
+            start = clock()
+            try:
+                buffer, offset = next( frames )
+            except StopIteration:
+                return
+            ns = clock() - start
+            typeByte = buffer[ offset + 2 ]
+            buckets[ typeByte * bucketCount + ns.bit_length() ] += 1
+            sizes[ typeByte ] += 2 + unpackLength( buffer, offset )[0]
+            totalNs[ typeByte ] += ns
+            if ns > maxNs[ typeByte ]:
+                maxNs[ typeByte ] = ns
+            yield buffer, offset
+    finally:
+        frames.close()
+
+def enable(dumpAtExit=False, stream=None):
+    instrumentation.enable( dumpAtExit, stream )
+
+def disable():
+    instrumentation.disable()
+
+def snapshot():
+    return instrumentation.snapshot()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import os
+import unittest
+
+from Itch41 import *
+from ItchReader import ItchReader
+import ItchStats
+from ItchStats import *
+
+sampleFile = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "SamplesMessages", "Itch.test1.dat" )
+
+class ItchStats_Test(unittest.TestCase):
+    """ Tests for the optional decode and reader instrumentation """
+
+    def setUp(self):
+        instrumentation.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled_leaves_originals_in_place(self):
+        # GIVEN / WHEN
+        enable()
+        disable()
+
+        # THEN
+        self.assertIs( ItchMessageFactory.__dict__[ 'createFromBytes' ], ItchStats.originalCreateFromBytes )
+        self.assertIs( ItchReader.frames, ItchStats.originalFrames )
+
+    def test_nothing_recorded_while_disabled(self):
+        # GIVEN / WHEN
+        with ItchReader( sampleFile ) as reader:
+            list( reader.messages() )
+
+        # THEN
+        self.assertEqual( snapshot()[ "decode" ], { } )
+        self.assertEqual( snapshot()[ "read" ], { } )
+        self.assertEqual( instrumentation.summary(), "" )
+
+    def test_counts_per_type(self):
+        # GIVEN
+        enable()
+
+        # WHEN
+        with ItchReader( sampleFile ) as reader:
+            messages = list( reader.messages() )
+        current = snapshot()
+
+        # THEN
+        self.assertEqual( len( messages ), 5 )
+        self.assertTrue( current[ "enabled" ] )
+        for stage in ( "decode", "read" ):
+            self.assertEqual( sorted( current[ stage ] ), [ 'A', 'E', 'T' ] )
+            self.assertEqual( current[ stage ][ 'A' ][ "count" ], 3 )
+            self.assertEqual( current[ stage ][ 'A' ][ "bytes" ], 3 * len( messages[1].rawMessage ) )
+            self.assertEqual( current[ stage ][ 'T' ][ "count" ], 1 )
+        json.dumps( current )
+
+    def test_direct_create_from_bytes(self):
+        # GIVEN
+        frame = ItchMessageFactory.createFromArgs( [ MessageType.OrderDelete,
+                                                     { Field.NanoSeconds: 1, Field.OrderRefNum: 7 } ] ).rawMessage
+        enable()
+
+        # WHEN
+        message = ItchMessageFactory.createFromBytes( frame )
+
+        # THEN
+        self.assertEqual( message.OrderRefNum, 7 )
+        decode = snapshot()[ "decode" ][ 'D' ]
+        self.assertEqual( decode[ "count" ], 1 )
+        self.assertEqual( sum( decode[ "histogram" ].values() ), 1 )
+        self.assertLessEqual( decode[ "p50Ns" ], decode[ "maxNs" ] )
+
+    def test_percentile(self):
+        # GIVEN
+        buckets = [ 0 ] * bucketCount
+        buckets[ 4 ] = 90
+        buckets[ 10 ] = 10
+
+        # WHEN / THEN
+        self.assertEqual( percentile( buckets, 1000, 0.5 ), 15 )
+        self.assertEqual( percentile( buckets, 1000, 0.9 ), 15 )
+        self.assertEqual( percentile( buckets, 1000, 0.99 ), 1000 )
+        self.assertEqual( percentile( buckets, 2000, 0.99 ), 1023 )
+        self.assertIsNone( percentile( [ 0 ] * bucketCount, 0, 0.5 ) )
+
+    def test_summary_and_dump(self):
+        # GIVEN
+        enable()
+        with ItchReader( sampleFile ) as reader:
+            list( reader.messages() )
+        stream = io.StringIO()
+
+        # WHEN
+        instrumentation.dump( stream )
+
+        # THEN
+        summary = stream.getvalue()
+        self.assertIn( "decode", summary )
+        self.assertIn( "read", summary )
+        self.assertIn( "AddOrder", summary )
+        self.assertIn( "OrderExecuted", summary )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+
+""" Message builders shared by the unit tests. """
+
+from Itch41 import *
+
+def frame(messageType, **fields):
+    """ Framed bytes (length prefix included) of one message built from field values. """
+    return bytes( ItchMessageFactory.createFromArgs( [ messageType, fields ] ).rawMessage )
+
+def addOrder(orderRefNum, stock, side='B', shares=100, price=10.0, nanoSeconds=1):
+    return frame( MessageType.AddOrder, NanoSeconds=nanoSeconds, OrderRefNum=orderRefNum, Side=side,
+                  Shares=shares, Stock=stock, Price=price )
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+import argparse
+import array
+import mmap
+import struct
+
+import numpy as np
+
+from Itch41 import *
+from ItchFilter import fieldOffsets
+from ItchIndex import IndexedItchFile
+from ItchParallel import parallelMap
+from ItchReader import ItchReader
+
+nanoSecondsOffsets = fieldOffsets( Field.NanoSeconds )
+timeStampByte = ord( MessageType.TimeStamp.value )
+secondsOffset = fieldOffsets( Field.Seconds )[ timeStampByte ]
+rawTime = struct.Struct( '>I' )
+nanoSecondsPerSecond = 1000000000
+
+def parseTimeNs(value):
+    """ Nanoseconds past midnight from an int (already in ns) or an
+        "HH:MM[:SS[.fraction]]" string.
+    """
+    if isinstance( value, int ):
+        return value
+    parts = value.split( ':' )
+    parts += [ '0' ] * ( 3 - len( parts ) )
+    whole, _, fraction = parts[2].partition( '.' )
+    return ( ( int( parts[0] ) * 3600 + int( parts[1] ) * 60 + int( whole ) ) * nanoSecondsPerSecond
+             + int( ( fraction + '000000000' )[ :9 ] ) )
+
+def formatTimeNs(timeNs):
+    seconds, nanoSeconds = divmod( timeNs, nanoSecondsPerSecond )
+    return "{:02d}:{:02d}:{:02d}.{:09d}".format( seconds // 3600, seconds // 60 % 60, seconds % 60, nanoSeconds )
+
+class FeedClock:
+    """ The TimeStamp / NanoSeconds join for consumers that are handed one
+        frame at a time, e.g. SoupBinTcpClient or MoldUdp64Receiver consumers.
+
+        timeOf(buffer, offset) must see every frame in feed order. It returns
+        the absolute time of the message in ns past midnight: the Seconds of
+        the last TimeStamp plus the message's own NanoSeconds. TimeStamp
+        messages themselves are at the start of their second.
+    """
+
+    def __init__(self, seconds=0):
+        self.seconds = seconds
+
+    def timeOf(self, buffer, offset):
+        typeByte = buffer[ offset + 2 ]
+        if typeByte == timeStampByte:
+            self.seconds = rawTime.unpack_from( buffer, offset + secondsOffset )[0]
+            return self.seconds * nanoSecondsPerSecond
+        nanoSecondsOffset = nanoSecondsOffsets[ typeByte ]
+        if nanoSecondsOffset is None:
+            return self.seconds * nanoSecondsPerSecond
+        return self.seconds * nanoSecondsPerSecond + rawTime.unpack_from( buffer, offset + nanoSecondsOffset )[0]
+
+def timedFrames(frames, seconds=0):
+    """ ( time in ns past midnight, buffer, offset ) for each ( buffer, offset ) frame.
+
+        seconds is the TimeStamp in effect before the first frame, for
+        streams that start mid file.
+    """
+    now = seconds = seconds * nanoSecondsPerSecond
+    unpackTime = rawTime.unpack_from
+    for buffer, offset in frames:
+        typeByte = buffer[ offset + 2 ]
+        if typeByte == timeStampByte:
+            now = seconds = unpackTime( buffer, offset + secondsOffset )[0] * nanoSecondsPerSecond
+        else:
+            nanoSecondsOffset = nanoSecondsOffsets[ typeByte ]
+            now = seconds if nanoSecondsOffset is None else seconds + unpackTime( buffer, offset + nanoSecondsOffset )[0]
+        yield now, buffer, offset
+
+def timedViews(frames, seconds=0):
+    """ ( time in ns past midnight, view ) for each frame; see timedFrames. """
+    createView = ItchMessageFactory.createView
+    for timeNs, buffer, offset in timedFrames( frames, seconds ):
+        view = createView( buffer, offset )
+        if view is not None:
+            yield timeNs, view
+
+def windowFrames(timed, start, end):
+    """ The ( time, buffer, offset ) entries of timed with start <= time < end.
+
+        Feed time never goes backwards, so iteration stops at the first
+        message at or past end instead of scanning the rest of the input.
+    """
+    start = parseTimeNs( start )
+    end = parseTimeNs( end )
+    for entry in timed:
+        timeNs = entry[0]
+        if timeNs >= end:
+            return
+        if timeNs >= start:
+            yield entry
+
+def queryWindow(fileName, start, end, useIndex=True):
+    """ Yields ( time, view ) for every message of fileName in [start, end).
+
+        With useIndex the ItchIndex sidecar (built if missing or stale) is used
+        to seek to the last indexed message before the start second, so only
+        the window and up to one index interval ahead of it are read. Gzipped
+        files cannot be seeked and are read from the start.
+    """
+    start = parseTimeNs( start )
+    end = parseTimeNs( end )
+    gzipped = fileName.endswith( '.gz' )
+    offset = 0
+    seconds = 0
+    if useIndex and not gzipped:
+        with IndexedItchFile( fileName ) as indexed:
+            if indexed.index.count:
+                offset, _, seconds = indexed.index.entryBeforeTime( start // nanoSecondsPerSecond )
+    with open( fileName, 'rb' ) as fileIn:
+        if offset:
+            fileIn.seek( offset )
+        with ItchReader( fileIn, gzipped=gzipped ) as reader:
+            createView = ItchMessageFactory.createView
+            for timeNs, buffer, frameOffset in windowFrames( timedFrames( reader.frames(), seconds ), start, end ):
+                view = createView( buffer, frameOffset )
+                if view is not None:
+                    yield timeNs, view
+
+def frameOffsets(buffer, start, end):
+    offsets = array.array( 'q' )
+    unpackLength = lengthPrefix.unpack_from
+    offset = start
+    while offset + 2 <= end:
+        nextOffset = offset + 2 + unpackLength( buffer, offset )[0]
+        if nextOffset > end:
+            break
+        offsets.append( offset )
+        offset = nextOffset
+    if offset != end:
+        raise ValueError( "Truncated message at byte offset {}".format( offset ) )
+    return np.frombuffer( offsets, dtype=np.int64 )
+
+def gatherTimes(raw, positions):
+    """ Big endian 4 byte integers at the given positions of raw, as int64. """
+    gathered = raw[ positions[ :, None ] + np.arange( 4 ) ].astype( np.int64 )
+    return ( gathered[ :, 0 ] << 24 ) | ( gathered[ :, 1 ] << 16 ) | ( gathered[ :, 2 ] << 8 ) | gathered[ :, 3 ]
+
+def timeColumnChunk(buffer, start, end):
+    """ Absolute times for the messages in buffer[start:end], plus what is
+        needed to stitch chunks together: ( times, leading, lastSeconds ).
+
+        The leading messages before the chunk's first TimeStamp are given a
+        seconds of 0; the caller adds the seconds carried from earlier chunks.
+        lastSeconds is the last TimeStamp in the chunk, or None.
+    """
+    offsets = frameOffsets( buffer, start, end )
+    raw = np.frombuffer( buffer, dtype=np.uint8 )
+    typeBytes = raw[ offsets + 2 ]
+    times = np.zeros( len( offsets ), dtype=np.int64 )
+
+    isTimeStamp = typeBytes == timeStampByte
+    timeStampRows = np.flatnonzero( isTimeStamp )
+    if len( timeStampRows ):
+        times[ timeStampRows ] = gatherTimes( raw, offsets[ timeStampRows ] + secondsOffset ) * nanoSecondsPerSecond
+        # Forward fill the second of the last TimeStamp onto every later row
+        lastTimeStamp = np.where( isTimeStamp, np.arange( len( offsets ) ), -1 )
+        np.maximum.accumulate( lastTimeStamp, out=lastTimeStamp )
+        seconds = np.where( lastTimeStamp >= 0, times[ np.maximum( lastTimeStamp, 0 ) ], 0 )
+        leading = int( timeStampRows[0] )
+        lastSeconds = int( times[ timeStampRows[-1] ] ) // nanoSecondsPerSecond
+    else:
+        seconds = np.zeros( len( offsets ), dtype=np.int64 )
+        leading = len( offsets )
+        lastSeconds = None
+
+    for typeByte in np.unique( typeBytes ).tolist():
+        nanoSecondsOffset = nanoSecondsOffsets[ typeByte ]
+        if nanoSecondsOffset is not None:
+            rows = np.flatnonzero( typeBytes == typeByte )
+            times[ rows ] = gatherTimes( raw, offsets[ rows ] + nanoSecondsOffset )
+    times[ ~isTimeStamp ] += seconds[ ~isTimeStamp ]
+    return times, leading, lastSeconds
+
+def stitchTimeColumns(chunks, seconds=0):
+    parts = [ ]
+    for times, leading, lastSeconds in chunks:
+        times[ :leading ] += seconds * nanoSecondsPerSecond
+        if lastSeconds is not None:
+            seconds = lastSeconds
+        parts.append( times )
+    return np.concatenate( parts ) if parts else np.zeros( 0, dtype=np.int64 )
+
+def timeColumnBuffer(buffer, seconds=0):
+    """ int64 array of absolute ns times, one per framed message of buffer, in order. """
+    return stitchTimeColumns( [ timeColumnChunk( buffer, 0, len( buffer ) ) ], seconds )
+
+def timeColumn(fileName, processes=None):
+    """ Bulk time column for fileName, parallel to the message order.
+
+        processes=1 runs in this process; otherwise chunks are decoded in a
+        process pool by ItchParallel and stitched by carrying each chunk's last
+        TimeStamp into the next. Row i lines up with the i'th message, and so
+        with np.concatenate of per chunk columns from ItchColumns.
+    """
+    if processes == 1:
+        with open( fileName, 'rb' ) as fileIn:
+            try:
+                mapped = mmap.mmap( fileIn.fileno(), 0, access=mmap.ACCESS_READ )
+            except ValueError:
+                # Empty files cannot be mapped
+                return np.zeros( 0, dtype=np.int64 )
+            try:
+                return timeColumnBuffer( mapped )
+            finally:
+                mapped.close()
+    return stitchTimeColumns( parallelMap( fileName, timeColumnChunk, processes ) )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser( description="Print the Itch 4.1 messages in a [start, end) time window" )
+    parser.add_argument( "fileName" )
+    parser.add_argument( "start", help="HH:MM[:SS[.fraction]]" )
+    parser.add_argument( "end", help="HH:MM[:SS[.fraction]], exclusive" )
+    parser.add_argument( "--count", action="store_true", help="only count the messages" )
+    parser.add_argument( "--no-index", action="store_true", help="scan from the start of the file" )
+    args = parser.parse_args( argv )
+
+    count = 0
+    for timeNs, view in queryWindow( args.fileName, args.start, args.end, not args.no_index ):
+        count += 1
+        if not args.count:
+            print( formatTimeNs( timeNs ) )
+            view.toMessage().dumpPretty()
+    print( "{} messages".format( count ) )
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit( main() )
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import contextlib
+import gzip
+import io
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from Itch41 import *
+from ItchGenerator import ItchGenerator
+from ItchReader import ItchReader
+from ItchParallel import parallelMap
+from ItchTime import *
+
+class ItchTime_Test(unittest.TestCase):
+    """ Tests for absolute message times and time window queries """
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join( self.tempDir.name, "feed.itch" )
+        # About 3 seconds of feed, so several TimeStamp messages
+        ItchGenerator( seed=7, messagesPerSecond=1000 ).writeFile( self.fileName, 4000 )
+
+        # Reference times from fully decoded messages
+        self.expected = [ ]
+        seconds = 0
+        with ItchReader( self.fileName ) as reader:
+            messages = list( reader.messages() )
+        for message in messages:
+            if message.MessageType == MessageType.TimeStamp.value:
+                seconds = message.Seconds
+                self.expected.append( seconds * 1000000000 )
+            else:
+                self.expected.append( seconds * 1000000000 + message.NanoSeconds )
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_parseTimeNs(self):
+        self.assertEqual( parseTimeNs( "09:30" ), 34200 * 1000000000 )
+        self.assertEqual( parseTimeNs( "09:30:01.5" ), 34201500000000 )
+        self.assertEqual( parseTimeNs( "09:30:01.000000007" ), 34201000000007 )
+        self.assertEqual( parseTimeNs( 12 ), 12 )
+        self.assertEqual( formatTimeNs( 34201000000007 ), "09:30:01.000000007" )
+
+    def test_timedFrames(self):
+        # WHEN the frames are timed as a stream
+        with ItchReader( self.fileName ) as reader:
+            times = [ timeNs for timeNs, buffer, offset in timedFrames( reader.frames() ) ]
+
+        # THEN each message gets its TimeStamp seconds plus its own nanoseconds
+        self.assertEqual( times, self.expected )
+        self.assertGreater( self.expected[-1] - self.expected[0], 2000000000 )
+
+    def test_feedClock(self):
+        # GIVEN a clock fed one frame at a time
+        clock = FeedClock()
+
+        # WHEN
+        with ItchReader( self.fileName ) as reader:
+            times = [ clock.timeOf( buffer, offset ) for buffer, offset in reader.frames() ]
+
+        # THEN
+        self.assertEqual( times, self.expected )
+
+    def test_timeColumn(self):
+        # WHEN the bulk column is built in process and across chunks
+        column = timeColumn( self.fileName, processes=1 )
+        chunked = stitchTimeColumns( parallelMap( self.fileName, timeColumnChunk, processes=1, chunkCount=7 ) )
+
+        # THEN both match the streaming join row for row
+        self.assertEqual( column.dtype, np.int64 )
+        self.assertEqual( column.tolist(), self.expected )
+        self.assertEqual( chunked.tolist(), self.expected )
+
+    def test_windowFrames(self):
+        # GIVEN a window in the middle of the feed
+        start = self.expected[ 1000 ]
+        end = self.expected[ 2000 ]
+
+        # WHEN the timed stream is queried, counting what is consumed
+        consumed = [ 0 ]
+        def counted(timed):
+            for entry in timed:
+                consumed[0] += 1
+                yield entry
+        with ItchReader( self.fileName ) as reader:
+            window = [ timeNs for timeNs, buffer, offset in
+                       windowFrames( counted( timedFrames( reader.frames() ) ), start, end ) ]
+
+        # THEN exactly the messages in [start, end) come back
+        self.assertEqual( window, [ timeNs for timeNs in self.expected if start <= timeNs < end ] )
+
+        # AND the scan stopped at the first message past the window
+        self.assertEqual( consumed[0], self.expected.index( end ) + 1 )
+
+    def test_queryWindow(self):
+        # GIVEN a window that starts part way through a second
+        start = formatTimeNs( self.expected[0] + 1500000000 )
+        end = formatTimeNs( self.expected[0] + 2250000000 )
+        expected = [ timeNs for timeNs in self.expected if parseTimeNs( start ) <= timeNs < parseTimeNs( end ) ]
+
+        # WHEN it is queried with and without the sidecar index
+        indexed = [ ( timeNs, view.rawBytes() ) for timeNs, view in queryWindow( self.fileName, start, end ) ]
+        scanned = [ ( timeNs, view.rawBytes() ) for timeNs, view in queryWindow( self.fileName, start, end, False ) ]
+
+        # THEN both return the same messages with the right times
+        self.assertTrue( expected )
+        self.assertEqual( [ timeNs for timeNs, rawBytes in indexed ], expected )
+        self.assertEqual( indexed, scanned )
+
+    def test_queryWindow_gzipped(self):
+        # GIVEN a gzipped copy of the feed
+        gzipName = self.fileName + ".gz"
+        with open( self.fileName, 'rb' ) as fileIn, gzip.open( gzipName, 'wb' ) as fileOut:
+            fileOut.write( fileIn.read() )
+        start = self.expected[ 500 ]
+        end = self.expected[ 2500 ]
+
+        # WHEN
+        window = [ ( timeNs, view.rawBytes() ) for timeNs, view in queryWindow( gzipName, start, end ) ]
+
+        # THEN it matches the window of the plain file
+        self.assertEqual( [ timeNs for timeNs, rawBytes in window ],
+                          [ timeNs for timeNs in self.expected if start <= timeNs < end ] )
+        self.assertEqual( window, [ ( timeNs, view.rawBytes() ) for timeNs, view in
+                                    queryWindow( self.fileName, start, end ) ] )
+
+    def test_main_prints_the_window(self):
+        # GIVEN
+        start = formatTimeNs( self.expected[0] + 1000000000 )
+        end = formatTimeNs( self.expected[0] + 1001000000 )
+        expected = [ timeNs for timeNs in self.expected if parseTimeNs( start ) <= timeNs < parseTimeNs( end ) ]
+
+        # WHEN the command line runs without --count
+        output = io.StringIO()
+        with contextlib.redirect_stdout( output ):
+            exitCode = main( [ self.fileName, start, end ] )
+
+        # THEN every message is printed with its time
+        lines = output.getvalue().splitlines()
+        self.assertEqual( 0, exitCode )
+        self.assertTrue( expected )
+        self.assertEqual( "{} messages".format( len( expected ) ), lines[-1] )
+        for timeNs in expected:
+            self.assertIn( formatTimeNs( timeNs ), lines )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+from Itch41 import *
+
+defaultWriteBlockSize = 1 << 20
+
+class ItchWriter:
+    """ Writes length prefixed Itch 4.1 messages to a file in large blocks.
+
+        Messages are packed with pack_into straight into a preallocated block,
+        which is written out whenever the next message would not fit. The file
+        stays open until close(). Nothing is printed unless verbose is set.
+    """
+
+    def __init__(self, fileName, openMode='wb', blockSize=defaultWriteBlockSize, verbose=False):
+        self.fileName = fileName
+        self.fileOut = open(fileName, openMode)
+        self.block = bytearray(blockSize)
+        self.filled = 0
+        self.messages = 0
+        self.bytesWritten = 0
+        self.verbose = verbose
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def reserve(self, size):
+        if self.filled + size > len(self.block):
+            self.flush()
+            if size > len(self.block):
+                self.block = bytearray(size)
+
+    def writeArgs(self, messageArgs):
+        """ Encodes [ MessageType, { Field: value } ] without building an ItchMessage. """
+        codec = ItchMessageFactory.codecs[ ord( messageArgs[0].value ) ]
+        self.writeValues(codec, codec.encodeValues( messageArgs[1] ))
+
+    def writeValues(self, codec, values):
+        """ Packs values already in struct form (see ItchCodec.encodeValues). """
+        size = codec.struct.size
+        if self.filled + size > len(self.block):
+            self.reserve(size)
+        codec.packInto(self.block, self.filled, values)
+        self.filled += size
+        self.messages += 1
+
+    def writeMessage(self, message):
+        self.writeRaw(message.rawMessage)
+
+    def writeRaw(self, frame):
+        size = len(frame)
+        if self.filled + size > len(self.block):
+            self.reserve(size)
+        self.block[self.filled:self.filled + size] = frame
+        self.filled += size
+        self.messages += 1
+
+    def flush(self):
+        if self.filled:
+            self.fileOut.write(memoryview(self.block)[:self.filled])
+            self.bytesWritten += self.filled
+            if self.verbose:
+                print("Flushed {0} bytes to file: {1}".format(self.filled, self.fileName))
+            self.filled = 0
+
+    def close(self):
+        if self.fileOut.closed:
+            return
+        self.flush()
+        self.fileOut.close()
+        if self.verbose:
+            print("Wrote {0} messages, {1} bytes to file: {2}".format(self.messages, self.bytesWritten, self.fileName))
+
+def writeMessageArgs(messages, fileName, openMode='wb', verbose=False):
+    with ItchWriter(fileName, openMode, verbose=verbose) as writer:
+        for messageArgs in messages:
+            writer.writeArgs(messageArgs)
+    return writer.messages
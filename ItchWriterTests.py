@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+
+from Itch41 import *
+from ItchWriter import *
+
+samplesDir = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "SamplesMessages" )
+
+class ItchWriter_Test(unittest.TestCase):
+    """ Tests for the batched encoder and block writer """
+
+    def setUp(self):
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join( self.tempDir.name, "out.itch" )
+        self.messages = [ ]
+        self.messages.append( [          MessageType.TimeStamp, {     Field.Seconds: 1000 } ] )
+        self.messages.append( [           MessageType.AddOrder, { Field.NanoSeconds:   10, Field.OrderRefNum: 1, Field.Side: 'B', Field.Shares: 200, Field.Stock: "AAPL", Field.Price: 100.53 } ] )
+        self.messages.append( [           MessageType.AddOrder, { Field.NanoSeconds:   20, Field.OrderRefNum: 2, Field.Side: 'B', Field.Shares: 300, Field.Stock: "AAPL", Field.Price: 100.55 } ] )
+        self.messages.append( [           MessageType.AddOrder, { Field.NanoSeconds:   30, Field.OrderRefNum: 3, Field.Side: 'B', Field.Shares: 400, Field.Stock: "AAPL", Field.Price: 100.56 } ] )
+        self.messages.append( [      MessageType.OrderExecuted, { Field.NanoSeconds:   40, Field.OrderRefNum: 2, Field.Shares: 300, Field.MatchNum: 1001 } ] )
+        with open( os.path.join( samplesDir, "Itch.test1.dat" ), 'rb' ) as fileIn:
+            self.expected = fileIn.read()
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def written(self):
+        with open( self.fileName, 'rb' ) as fileIn:
+            return fileIn.read()
+
+    def test_write_args_matches_sample_file(self):
+        # WHEN
+        count = writeMessageArgs( self.messages, self.fileName )
+
+        # THEN
+        self.assertEqual( 5, count )
+        self.assertEqual( self.expected, self.written() )
+
+    def test_small_blocks_flush_between_messages(self):
+        # WHEN
+        with ItchWriter( self.fileName, blockSize=40 ) as writer:
+            for messageArgs in self.messages:
+                writer.writeArgs( messageArgs )
+
+        # THEN
+        self.assertEqual( len( self.expected ), writer.bytesWritten )
+        self.assertEqual( self.expected, self.written() )
+
+    def test_write_messages_and_raw_frames(self):
+        # GIVEN
+        messages = [ ItchMessageFactory.createFromArgs( messageArgs ) for messageArgs in self.messages ]
+
+        # WHEN
+        with ItchWriter( self.fileName, blockSize=8 ) as writer:
+            for message in messages[:2]:
+                writer.writeMessage( message )
+            for message in messages[2:]:
+                writer.writeRaw( bytes( message.rawMessage ) )
+
+        # THEN
+        self.assertEqual( self.expected, self.written() )
+
+if __name__ == "__main__":
+    unittest.main()
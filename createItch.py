@@ -1,25 +1,13 @@
 #!/usr/bin/env python3
 
 from Itch41 import *
+from ItchWriter import writeMessageArgs
 
 
-def generateMessages(messages):
-    genMessages = [ ]
-    for message in messages:
-        msg = ItchMessageFactory.createFromArgs(message)
-        if msg:
-            genMessages.append(msg)
-    return genMessages
-
-def saveMessagesToFile(messages, fileName):
+def saveMessagesToFile(messages, fileName, verbose=False):
+    # messages are [ MessageType, { Field: value } ] args, encoded in one batch
     print("Creating file: {}".format(fileName))
-    import os
-    if os.path.exists(fileName):
-        os.remove(fileName)
-    for message in messages:
-        print("-- Dumping message to file {0} --".format(fileName))
-        message.dumpPretty()
-        message.appendToFile(fileName)
+    return writeMessageArgs(messages, fileName, verbose=verbose)
 
 def create_Test_1():
     # Create 3 Add Order Messages
@@ -34,7 +22,7 @@ def create_Test_1():
     messages.append( [           MessageType.AddOrder, { Field.NanoSeconds:   30, Field.OrderRefNum: 3, Field.Side: 'B', Field.Shares: 400, Field.Stock: "AAPL", Field.Price: 100.56 } ] )
     messages.append( [      MessageType.OrderExecuted, { Field.NanoSeconds:   40, Field.OrderRefNum: 2, Field.Shares: 300, Field.MatchNum: 1001 } ] )
 
-    saveMessagesToFile( generateMessages( messages ), outFile )
+    saveMessagesToFile( messages, outFile )
 
 def create_Test_2():
     # Create 3 Add Order Messages
@@ -51,7 +39,7 @@ def create_Test_2():
     messages.append( [       MessageType.OrderReplace, { Field.NanoSeconds:   45, Field.OrderRefNum: 30, Field.NewOrderRefNum: 40, Field.Shares: 200, Field.Price: 100.52 } ] )
     messages.append( [      MessageType.OrderExecuted, { Field.NanoSeconds:   55, Field.OrderRefNum: 40, Field.Shares: 200, Field.MatchNum: 1001 } ] )
 
-    saveMessagesToFile( generateMessages( messages ), outFile )
+    saveMessagesToFile( messages, outFile )
 
 #messages.append( [ MessageType.OrderExecutedPrice, { Field.NanoSeconds:   1, Field.OrderRefNum: 1, Field.Shares: 200, Field.MatchNum: 101, Field.Printable: 'Y', Field.Price: 100.52 } ] )
 #messages.append( [        MessageType.OrderCancel, { Field.NanoSeconds:   1, Field.OrderRefNum: 1, Field.Shares: 200 } ] )
@@ -3,6 +3,9 @@
 
 import struct
 from Itch41 import *
+from ItchReader import ItchReader
+from ItchPcap import PcapItchReader, isPcapFile
+from ItchOrderBook import OrderBookEngine, pricePrecision
 
 #### Parameters for Execution
 # Download from here: ftp://emi.nasdaq.com/ITCH/11092013.NASDAQ_ITCH41.gz
@@ -41,31 +44,24 @@ def createUnitTestCode(message, rawBytes):
 
 global counter
 counter = 0
-global orderBook
-orderBook = { }
+orderBookEngine = OrderBookEngine( symbols=[ "AAPL" ] )
 
 def OrderBook(itchMessage):
     global counter
-    global orderBook
     counter += 1
 
     ticker = "AAPL"
 
-    messageType = MessageType( itchMessage.getValue( Field.MessageType ))
-    if messageType == MessageType.AddOrder or messageType == MessageType.AddOrderWithMPID:
-        if itchMessage.getValue( Field.Stock ) == ticker:
-            orderRefNum = itchMessage.getValue(Field.OrderRefNum)
-            if orderRefNum in orderBook:
-                print("Already exists")
-            orderBook[orderRefNum] = itchMessage
+    orderBookEngine.applyMessage( itchMessage )
     if counter == 1500000:
-        print("Number of messages in orderbook: {}".format( len(orderBook.keys() )))
-        for orderRefNum in orderBook.keys():
-            #orderRefNum = order.getValue(Field.OrderRefNum)
-            order = orderBook[orderRefNum]
-            price = order.getValue(Field.Price)
-            shares = order.getValue(Field.Shares)
-            #print("OrderRefNum: {}, Price: {}, Shares: {}".format( orderRefNum, price, shares))
+        print("Number of orders in orderbook: {}".format( len(orderBookEngine.orders) ))
+        book = orderBookEngine.bookFor( ticker )
+        if book is not None:
+            bids, asks = book.depth( 5 )
+            for price, shares, orders in bids:
+                print("Bid Price: {}, Shares: {}, Orders: {}".format( price / pricePrecision, shares, orders ))
+            for price, shares, orders in asks:
+                print("Ask Price: {}, Shares: {}, Orders: {}".format( price / pricePrecision, shares, orders ))
         return True
     return False
 
@@ -86,46 +82,9 @@ def dumpOneOfEach(itchMessage):
 
 #fptr = OrderBook
 fptr = dumpOneOfEach
-cacheSize = 1024
-fin = open(fileName, "rb")
-
-
-buffer = fin.read(cacheSize)
-bufferLen = len(buffer)
-ptr = 0
-haveData = True
-while haveData:
-    byte = buffer[ptr:ptr+1]
-    ptr += 1
-    if ptr == bufferLen:
-        ptr = 0
-        buffer = fin.read(cacheSize)
-    bufferLen = len(buffer)
-    if len(byte) == 0:
-        print("BREAK-len(byte) == 0")
-        break
-    if byte == b'\x00':
-        length = ord(buffer[ptr:ptr+1])
-        ptr += 1
-        if (ptr+length) > bufferLen:
-            temp = buffer[ptr:bufferLen]
-            buffer = temp + fin.read(cacheSize)
-            bufferLen = len(buffer)
-            ptr = 0
-        message = buffer[ptr:ptr+length]
-        ptr += length
-
-        import struct
-        preamble = struct.pack("!h", length)
-        rawMessage = preamble + message
-
-        itchMessage = ItchMessageFactory.createFromBytes(rawMessage)
+# pcap / pcapng captures of MoldUDP64 are read in place, plain Itch files as before
+readerClass = PcapItchReader if isPcapFile(fileName) else ItchReader
+with readerClass(fileName) as reader:
+    for itchMessage in reader.messages():
         if fptr(itchMessage):
             break
-
-        if ptr == bufferLen:
-            ptr = 0
-            buffer = fin.read(cacheSize)
-            bufferLen = len(buffer)
-fin.close()
-